@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ASS增量生成 - 按每条 Dialogue 的内容哈希判断字幕修改了哪些部分
+特点：
+- 输出文件旁保存清单 <输出>.manifest.json：文件头哈希 + 每条事件的 (哈希, 开始毫秒, 结束毫秒)
+- 事件逐条写入临时文件并计算哈希（内存中只保留哈希和时间），写完后与清单比较：
+  内容没有变化则丢弃临时文件（修改时间不变，下游可以跳过渲染）；
+  有变化时替换输出文件，并返回变化的时间范围（新增、删除、修改过的事件，相邻范围合并）
+- 文件头（样式、水印）变化、清单缺失或输出文件被外部改过时视为全部变化
+- preview_ranges 只渲染变化范围（前后各留余量）的预览片段，不必重新渲染整个视频
+
+使用方法:
+python ass_build_cache.py english.srt chinese.srt output.ass                       # 生成双语ASS并打印变化范围
+python ass_build_cache.py english.srt chinese.srt output.ass --preview video.mp4   # 同时渲染变化范围的预览片段
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+from collections import Counter
+
+from subtitle_core import write_atomic
+
+MANIFEST_SUFFIX = '.manifest.json'
+MANIFEST_VERSION = 1
+
+
+def content_hash(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+
+def merge_ranges(ranges, gap=0):
+    """按开始时间合并重叠或间隔不超过 gap 的范围"""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + gap:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [tuple(span) for span in merged]
+
+
+def load_manifest(output_path):
+    try:
+        with open(output_path + MANIFEST_SUFFIX, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('version') != MANIFEST_VERSION:
+        return None
+    try:
+        stat = os.stat(output_path)
+    except OSError:
+        return None
+    if [stat.st_size, stat.st_mtime_ns] != manifest.get('file'):
+        return None  # 输出文件被外部修改过
+    return manifest
+
+
+def build_ass(output_path, header, events):
+    """生成ASS文件；events 为逐条产出 (开始毫秒, 结束毫秒, Dialogue 行) 的可迭代对象
+
+    返回 {'path', 'written', 'full', 'events', 'added', 'removed', 'ranges'}：
+    ranges 为变化的时间范围（秒），full 为 True 时表示整个文件都应视为变化
+    """
+    header_hash = content_hash(header)
+    entries = []  # [哈希, 开始毫秒, 结束毫秒]
+    tmp_path = output_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(header)
+        for start, end, line in events:
+            f.write(line + '\n')
+            entries.append([content_hash(line), int(start), int(end)])
+    previous = load_manifest(output_path)
+
+    result = {'path': output_path, 'events': len(entries), 'written': True, 'full': previous is None,
+              'added': len(entries), 'removed': 0, 'ranges': []}
+    if previous is not None and previous['header'] != header_hash:
+        result['full'] = True
+
+    if not result['full']:
+        old_events = previous['events']
+        if old_events == entries:
+            os.remove(tmp_path)
+            result.update(written=False, added=0)
+            return result
+
+        # 按哈希做多重集合差：只在一边出现的事件就是新增/删除（修改 = 删除旧行 + 新增新行）
+        remaining = Counter(entry[0] for entry in old_events)
+        added = []
+        for digest, start, end in entries:
+            if remaining[digest] > 0:
+                remaining[digest] -= 1
+            else:
+                added.append((start, end))
+        removed = []
+        for digest, start, end in old_events:
+            if remaining[digest] > 0:
+                remaining[digest] -= 1
+                removed.append((start, end))
+        result.update(added=len(added), removed=len(removed),
+                      ranges=[(start / 1000, end / 1000) for start, end in merge_ranges(added + removed)])
+
+    os.replace(tmp_path, output_path)
+    stat = os.stat(output_path)
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'header': header_hash,
+        'file': [stat.st_size, stat.st_mtime_ns],
+        'events': entries,
+    }
+    write_atomic(output_path + MANIFEST_SUFFIX, [json.dumps(manifest, separators=(',', ':'))])
+    return result
+
+
+def describe(result, limit=5):
+    name = os.path.basename(result['path'])
+    if not result['written']:
+        return f"✅ {name} 内容未变化（{result['events']} 条事件），跳过写入"
+    if result['full']:
+        return f"✅ {name} 已完整生成（{result['events']} 条事件）"
+    spans = ', '.join(f"{start:.1f}-{end:.1f}秒" for start, end in result['ranges'][:limit])
+    more = f" 等 {len(result['ranges'])} 段" if len(result['ranges']) > limit else ''
+    return (f"✅ {name} 已更新: 新增 {result['added']} / 删除 {result['removed']} 条事件，"
+            f"变化范围 {spans or '无（仅顺序变化）'}{more}")
+
+
+def preview_ranges(video_path, ass_path, ranges, output_dir, padding=2.0):
+    """为每个变化范围渲染一个带字幕的预览片段，返回片段路径列表
+
+    输入端 -ss 快速定位后时间戳从0开始，先 setpts 加回偏移再交给 ass 滤镜，字幕时间才对得上
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    escaped = ass_path.replace('\\', '/').replace(':', '\\:').replace("'", "\\'")
+    clips = []
+    for index, (start, end) in enumerate(merge_ranges(ranges, gap=2 * padding), 1):
+        clip_start = max(0.0, start - padding)
+        clip_path = os.path.join(output_dir, f"preview_{index:03d}_{clip_start:.0f}s.mp4")
+        cmd = [
+            "ffmpeg", "-y",
+            "-ss", f"{clip_start:.3f}",
+            "-i", video_path,
+            "-t", f"{end + padding - clip_start:.3f}",
+            "-vf", f"setpts=PTS+{clip_start:.3f}/TB,ass='{escaped}',setpts=PTS-STARTPTS",
+            "-c:v", "libx264", "-preset", "veryfast", "-crf", "23",
+            "-c:a", "aac", "-b:a", "128k",
+            clip_path,
+        ]
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        if result.returncode == 0:
+            clips.append(clip_path)
+        else:
+            print(f"❌ 预览片段生成失败 ({start:.1f}-{end:.1f}秒): {result.stderr[-200:]}")
+    return clips
+
+
+def main():
+    parser = argparse.ArgumentParser(description='增量生成双语ASS字幕并报告变化范围')
+    parser.add_argument('english', help='英文SRT')
+    parser.add_argument('chinese', help='中文SRT')
+    parser.add_argument('output', help='输出ASS文件')
+    parser.add_argument('--preview', default=None, help='视频文件：为变化范围渲染预览片段')
+    args = parser.parse_args()
+
+    from subtitle_config import build_perfect_bilingual_ass
+
+    result = build_perfect_bilingual_ass(args.english, args.chinese, args.output)
+    if args.preview and result['written']:
+        if result['full']:
+            print("⚠️ 整个文件都有变化，请直接渲染完整视频")
+            return
+        output_dir = os.path.join(os.path.dirname(os.path.abspath(args.output)), 'preview')
+        clips = preview_ranges(args.preview, args.output, result['ranges'], output_dir)
+        print(f"🎬 已生成 {len(clips)} 个预览片段: {output_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+项目级音频文件 - 每个媒体文件只解码一次，之后所有环节共用同一份16kHz单声道PCM
+特点：
+- ffmpeg 输出直接经管道分块写入 .f32 原始文件（float32），不经过临时WAV/MP3
+- 采样值与 whisper.load_audio 完全一致（同样经s16量化），转录缓存的PCM哈希保持不变
+- 以内存映射方式加载，转录、VAD、响度分析、弹幕时间点共用同一块页缓存
+- 滤波版本（如人声带通）由已解码的PCM生成，不再重新解码视频
+- 旁边的 .json 记录源文件大小/修改时间，源文件变化时自动重建
+
+文件位置: <项目目录>/.audio/<文件名>.f32 及 <文件名>.json，滤波版本为 <文件名>.<名称>.f32
+
+使用方法:
+python audio_artifact.py video.mp4              # 生成（或复用）并显示信息
+python audio_artifact.py video.mp4 --variant speech
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import threading
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+BLOCK_BYTES = 1024 * 1024
+
+# 滤波版本：名称 → ffmpeg音频滤镜
+FILTERS = {
+    'speech': 'highpass=f=200,lowpass=f=3000',  # 去掉低频轰鸣和高频噪声，提高识别质量
+}
+
+
+class AudioArtifact:
+    """一个媒体文件对应的解码后PCM（及其滤波版本）"""
+
+    def __init__(self, source, directory=None):
+        self.source = os.path.abspath(source)
+        self.directory = directory or os.path.join(os.path.dirname(self.source), '.audio')
+        self.name = os.path.splitext(os.path.basename(self.source))[0]
+
+    def raw_path(self, variant=None):
+        suffix = f".{variant}" if variant else ''
+        return os.path.join(self.directory, f"{self.name}{suffix}.f32")
+
+    def meta_path(self, variant=None):
+        return os.path.splitext(self.raw_path(variant))[0] + '.json'
+
+    def source_signature(self):
+        stat = os.stat(self.source)
+        return {'source': self.source, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+    def read_meta(self, variant=None):
+        try:
+            with open(self.meta_path(variant), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def is_fresh(self, variant=None):
+        meta = self.read_meta(variant)
+        if not meta or not os.path.exists(self.raw_path(variant)):
+            return False
+        signature = self.source_signature()
+        return all(meta.get(key) == value for key, value in signature.items()) and \
+            meta.get('filter') == FILTERS.get(variant) and \
+            os.path.getsize(self.raw_path(variant)) == meta.get('samples', -1) * 4
+
+    def decode_command(self, variant=None):
+        if variant is None:
+            # 与 whisper.load_audio 相同的参数，结果逐样本一致
+            return ['ffmpeg', '-nostdin', '-threads', '0', '-i', self.source,
+                    '-f', 's16le', '-ac', '1', '-acodec', 'pcm_s16le', '-ar', str(SAMPLE_RATE), '-'], np.int16
+        return ['ffmpeg', '-nostdin', '-threads', '0',
+                '-f', 'f32le', '-ar', str(SAMPLE_RATE), '-ac', '1', '-i', self.raw_path(),
+                '-af', FILTERS[variant], '-f', 'f32le', '-ac', '1', '-ar', str(SAMPLE_RATE), '-'], np.float32
+
+    def build(self, variant=None):
+        """解码并写入PCM文件（原子替换），返回文件路径"""
+        if variant is not None and variant not in FILTERS:
+            raise ValueError(f"未知的滤波版本: {variant}")
+        if variant is not None and not self.is_fresh():
+            self.build()
+        os.makedirs(self.directory, exist_ok=True)
+
+        raw_path = self.raw_path(variant)
+        tmp_path = f"{raw_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        command, dtype = self.decode_command(variant)
+        samples = 0
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        # stderr 在后台读取，避免ffmpeg输出大量日志时管道写满而阻塞
+        errors = []
+        reader = threading.Thread(target=lambda: errors.append(process.stderr.read()), daemon=True)
+        reader.start()
+        try:
+            with open(tmp_path, 'wb') as f:
+                pending = b''
+                while True:
+                    block = process.stdout.read(BLOCK_BYTES)
+                    if not block:
+                        break
+                    block = pending + block
+                    usable = len(block) - len(block) % np.dtype(dtype).itemsize
+                    pending = block[usable:]
+                    pcm = np.frombuffer(block[:usable], dtype=dtype)
+                    if dtype is np.int16:
+                        pcm = pcm.astype(np.float32) / 32768.0
+                    f.write(pcm.astype(np.float32, copy=False).tobytes())
+                    samples += len(pcm)
+                f.flush()
+                os.fsync(f.fileno())
+            process.wait()
+            reader.join()
+            if process.returncode != 0:
+                stderr = b''.join(errors).decode('utf-8', errors='replace')
+                raise RuntimeError(f"音频解码失败: {stderr.strip()[-200:]}")
+            os.replace(tmp_path, raw_path)
+        except BaseException:
+            process.kill()
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        meta = dict(self.source_signature(), samples=samples, sample_rate=SAMPLE_RATE,
+                    variant=variant, filter=FILTERS.get(variant))
+        meta_tmp = self.meta_path(variant) + '.tmp'
+        with open(meta_tmp, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        os.replace(meta_tmp, self.meta_path(variant))
+        print(f"🔊 音频已解码: {raw_path} ({samples / SAMPLE_RATE:.0f}秒{', ' + variant if variant else ''})")
+        return raw_path
+
+    def ensure(self, variant=None):
+        if not self.is_fresh(variant):
+            self.build(variant)
+        return self.raw_path(variant)
+
+    def load(self, variant=None):
+        """内存映射方式加载（写时复制：可直接交给 whisper/torch，不会改动文件）"""
+        path = self.ensure(variant)
+        if os.path.getsize(path) == 0:
+            return np.zeros(0, dtype=np.float32)
+        return np.memmap(path, dtype=np.float32, mode='c')
+
+    def remove(self):
+        """删除解码文件及所有滤波版本（源文件是用完即删的临时文件时调用）"""
+        for variant in [None, *FILTERS]:
+            for path in (self.raw_path(variant), self.meta_path(variant)):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def duration(self):
+        self.ensure()
+        return self.read_meta()['samples'] / SAMPLE_RATE
+
+
+def load_audio(source, variant=None, directory=None):
+    """返回16kHz单声道float32音频；source 已是数组时原样返回"""
+    if not isinstance(source, str):
+        return source
+    return AudioArtifact(source, directory).load(variant)
+
+
+def loudness_profile(audio, window=1.0):
+    """每 window 秒的响度(dBFS)"""
+    size = int(SAMPLE_RATE * window)
+    count = len(audio) // size
+    if count == 0:
+        return np.zeros(0, dtype=np.float32)
+    profile = np.empty(count, dtype=np.float32)
+    for index in range(count):
+        block = np.asarray(audio[index * size:(index + 1) * size], dtype=np.float64)
+        profile[index] = 20 * np.log10(np.sqrt(np.mean(block ** 2)) + 1e-12)
+    return profile
+
+
+def highlight_times(audio, count, window=1.0):
+    """把音频均分为 count 段，每段取响度最高的时刻（笑声、掌声、情绪高点），返回秒数列表"""
+    profile = loudness_profile(audio, window)
+    if len(profile) < count or count <= 0:
+        return []
+    bounds = np.linspace(0, len(profile), count + 1).astype(int)
+    return [float((begin + int(np.argmax(profile[begin:end]))) * window + window / 2)
+            for begin, end in zip(bounds, bounds[1:]) if end > begin]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='项目级音频文件（只解码一次）')
+    parser.add_argument('media', help='视频或音频文件')
+    parser.add_argument('--variant', default=None, choices=sorted(FILTERS), help='滤波版本')
+    parser.add_argument('--rebuild', action='store_true', help='强制重新解码')
+    args = parser.parse_args()
+
+    artifact = AudioArtifact(args.media)
+    path = artifact.build(args.variant) if args.rebuild else artifact.ensure(args.variant)
+    audio = artifact.load(args.variant)
+    profile = loudness_profile(audio)
+    print(f"✅ {path}")
+    print(f"   时长 {len(audio) / SAMPLE_RATE:.1f}秒, 大小 {os.path.getsize(path) / (1024 * 1024):.1f}MB")
+    if len(profile):
+        print(f"   响度 平均 {float(np.mean(profile)):.1f} dBFS, 最高 {float(np.max(profile)):.1f} dBFS")
+
+
+if __name__ == "__main__":
+    main()
@@ -21,6 +21,11 @@ from typing import List, Dict, Optional, Tuple
 import argparse
 import glob
 
+from audio_artifact import highlight_times, load_audio
+from bilingual_merge import describe as describe_merge, merge_files
+from media_store import MediaStore
+from subtitle_core import format_ms, write_ass
+
 class AutoVideoProcessor:
     def __init__(self):
         self.base_dir = Path("output")
@@ -36,26 +41,22 @@ class AutoVideoProcessor:
         project_dir = self.base_dir / f"{clean_name}_processed"
         project_dir.mkdir(exist_ok=True, parents=True)
         
-        # 复制原视频到项目目录
+        # 从全局媒体库链接原视频到项目目录（硬链接/reflink，不复制数据）
         original_video = project_dir / f"original_{Path(video_path).name}"
         if not original_video.exists():
-            shutil.copy2(video_path, original_video)
+            store = MediaStore(str(self.base_dir / ".media_store"))
+            content_hash = store.ingest(video_path)
+            store.link_into(content_hash, str(original_video))
         
         return project_dir, original_video
     
-    def extract_audio(self, video_path: str, output_path: str) -> bool:
-        """提取音频用于转录"""
+    def extract_audio(self, video_path: str):
+        """项目级16kHz PCM（只解码一次，转录与弹幕时间点共用）；解码失败返回None"""
         try:
-            cmd = [
-                'ffmpeg', '-i', video_path,
-                '-vn', '-acodec', 'libmp3lame',
-                '-ar', '16000', '-ac', '1',
-                '-y', output_path
-            ]
-            subprocess.run(cmd, capture_output=True, check=True)
-            return True
-        except:
-            return False
+            return load_audio(video_path)
+        except Exception as e:
+            print(f"⚠️ 音频解码失败: {e}")
+            return None
     
     def find_subtitle_files(self, project_dir: Path, video_name: str) -> Tuple[Optional[str], Optional[str]]:
         """查找英文和中文字幕文件"""
@@ -102,66 +103,17 @@ class AutoVideoProcessor:
     def create_dual_subtitles(self, english_srt: str, chinese_srt: str, output_path: str) -> bool:
         """创建双语字幕"""
         try:
-            with open(english_srt, 'r', encoding='utf-8') as f:
-                english_lines = f.readlines()
-            
-            with open(chinese_srt, 'r', encoding='utf-8') as f:
-                chinese_lines = f.readlines()
-            
-            with open(output_path, 'w', encoding='utf-8') as f:
-                i = 0
-                while i < len(english_lines):
-                    line = english_lines[i].strip()
-                    
-                    if line.isdigit():
-                        subtitle_num = line
-                        f.write(f"{subtitle_num}\n")
-                        
-                        # 时间轴
-                        i += 1
-                        if i < len(english_lines):
-                            time_line = english_lines[i].strip()
-                            f.write(f"{time_line}\n")
-                        
-                        # 英文内容
-                        i += 1
-                        english_content = []
-                        while i < len(english_lines) and english_lines[i].strip():
-                            english_content.append(english_lines[i].strip())
-                            i += 1
-                        
-                        # 查找对应中文
-                        chinese_content = self.find_matching_chinese(subtitle_num, chinese_lines)
-                        
-                        # 写入双语字幕
-                        if english_content:
-                            f.write(" ".join(english_content) + "\n")
-                        if chinese_content:
-                            f.write(chinese_content + "\n")
-                        
-                        f.write("\n")
-                    
-                    i += 1
+            # 按时间重叠对齐：译文合并/拆分过字幕时按组输出，时间轴沿用英文
+            report = merge_files(english_srt, chinese_srt, output_path, by='time')
+            print(describe_merge(report))
             
             return True
         except Exception as e:
             print(f"创建双语字幕失败: {e}")
             return False
     
-    def find_matching_chinese(self, subtitle_num: str, chinese_lines: List[str]) -> str:
-        """查找匹配的中文字幕"""
-        for i, line in enumerate(chinese_lines):
-            if line.strip() == subtitle_num:
-                i += 2  # 跳过时间轴
-                chinese_content = []
-                while i < len(chinese_lines) and chinese_lines[i].strip():
-                    chinese_content.append(chinese_lines[i].strip())
-                    i += 1
-                return " ".join(chinese_content)
-        return ""
-    
-    def generate_smart_danmaku(self, video_path: str, duration: float, output_path: str) -> bool:
-        """智能生成弹幕"""
+    def generate_smart_danmaku(self, video_path: str, duration: float, output_path: str, audio=None) -> bool:
+        """智能生成弹幕（有音频时弹幕放在各段响度最高处：笑声、掌声、情绪高点）"""
         
         # 政治视频弹幕模板
         political_templates = [
@@ -180,9 +132,14 @@ class AutoVideoProcessor:
         # 根据视频长度生成弹幕
         num_danmaku = min(max(int(duration / 10), 3), 8)  # 3-8条弹幕
         
+        highlights = highlight_times(audio, num_danmaku) if audio is not None else []
+        
         danmaku_list = []
         for i in range(num_danmaku):
-            time_ms = int((duration * 1000 / (num_danmaku + 1)) * (i + 1))
+            if len(highlights) == num_danmaku:
+                time_ms = int(highlights[i] * 1000)
+            else:
+                time_ms = int((duration * 1000 / (num_danmaku + 1)) * (i + 1))
             
             danmaku = {
                 "time": time_ms,
@@ -215,7 +172,7 @@ class AutoVideoProcessor:
             with open(danmaku_json, 'r', encoding='utf-8') as f:
                 danmaku_data = json.load(f)
             
-            ass_content = [
+            header = '\n'.join([
                 "[Script Info]",
                 "Title: Auto Generated Danmaku",
                 "ScriptType: v4.00+",
@@ -226,35 +183,26 @@ class AutoVideoProcessor:
                 "",
                 "[Events]",
                 "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text"
-            ]
+            ]) + '\n'
             
-            for danmaku in danmaku_data["danmaku_list"]:
-                start_ms = danmaku["time"]
-                start_time = self.ms_to_ass_time(start_ms)
-                end_time = self.ms_to_ass_time(start_ms + 8000)
-                
-                move_effect = "{\\move(1920,540,0,540)}"
-                text = f"{move_effect}{danmaku['text']}"
-                
-                ass_line = f"Dialogue: 0,{start_time},{end_time},Danmaku,,0,0,0,,{text}"
-                ass_content.append(ass_line)
+            def dialogue_lines():
+                for danmaku in danmaku_data["danmaku_list"]:
+                    start_ms = danmaku["time"]
+                    start_time = format_ms(start_ms, 'ass')
+                    end_time = format_ms(start_ms + 8000, 'ass')
+                    
+                    move_effect = "{\\move(1920,540,0,540)}"
+                    text = f"{move_effect}{danmaku['text']}"
+                    
+                    yield f"Dialogue: 0,{start_time},{end_time},Danmaku,,0,0,0,,{text}"
             
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.write('\n'.join(ass_content))
+            # 逐条生成、逐条写出
+            write_ass(output_path, header, dialogue_lines())
             
             return True
         except:
             return False
     
-    def ms_to_ass_time(self, ms: int) -> str:
-        """毫秒转ASS时间格式"""
-        total_seconds = ms / 1000
-        hours = int(total_seconds // 3600)
-        minutes = int((total_seconds % 3600) // 60)
-        seconds = int(total_seconds % 60)
-        centiseconds = int((ms % 1000) / 10)
-        return f"{hours}:{minutes:02d}:{seconds:02d}.{centiseconds:02d}"
-    
     def get_video_duration(self, video_path: str) -> float:
         """获取视频时长"""
         try:
@@ -343,7 +291,8 @@ class AutoVideoProcessor:
         danmaku_json = project_dir / "danmaku.json"
         danmaku_ass = project_dir / "danmaku.ass"
         
-        if not self.generate_smart_danmaku(str(original_video), duration, str(danmaku_json)):
+        audio = self.extract_audio(str(original_video))
+        if not self.generate_smart_danmaku(str(original_video), duration, str(danmaku_json), audio=audio):
             print("❌ 弹幕生成失败")
             return None
         
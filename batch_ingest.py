@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量视频导入 - 非交互式处理URL清单
+流程: 下载(I/O线程池，N路并发) → 音频解码(按CPU核数排队) → 转录(单一工作线程，共享Whisper模型) → 翻译提示词
+     已有合格的YouTube英文字幕时，下载后直接生成翻译提示词（跳过解码与转录）
+
+清单格式:
+  JSON: ["url1", {"url": "url2", "start": "2m36s", "end": "5m59s", "id": "clip2"}]
+        或 {"jobs": [...]}
+  CSV:  表头包含 url,start,end(,id)
+
+使用方法:
+python batch_ingest.py manifest.json --workers 3
+或
+python optimized_video_automation.py --batch manifest.json
+"""
+
+import argparse
+import csv
+import datetime
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from audio_artifact import load_audio
+from optimized_video_automation import OptimizedVideoAutomation
+
+
+def manifest_field(entry, key):
+    """清单字段统一转为去空白的字符串（JSON 中 start/end/id 可能是数字）"""
+    value = entry.get(key)
+    return '' if value is None else str(value).strip()
+
+
+def load_manifest(manifest_path):
+    """读取JSON/CSV清单，返回标准化的任务列表"""
+    if manifest_path.lower().endswith('.csv'):
+        with open(manifest_path, 'r', encoding='utf-8', newline='') as f:
+            entries = [row for row in csv.DictReader(f)]
+    else:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            entries = json.load(f)
+        if isinstance(entries, dict):
+            entries = entries.get('jobs', [])
+
+    jobs = []
+    for index, entry in enumerate(entries, 1):
+        if isinstance(entry, str):
+            entry = {'url': entry}
+
+        url = manifest_field(entry, 'url')
+        if not url:
+            print(f"⚠️ 清单第 {index} 项缺少URL，已跳过")
+            continue
+
+        start_time = manifest_field(entry, 'start') or None
+        end_time = manifest_field(entry, 'end') or None
+        if bool(start_time) != bool(end_time):
+            print(f"⚠️ 清单第 {index} 项切片时间不完整，按完整视频处理")
+            start_time = end_time = None
+
+        jobs.append({
+            'id': manifest_field(entry, 'id') or f"job{index:03d}",
+            'url': url,
+            'start': start_time,
+            'end': end_time,
+            'status': 'pending',
+            'project_dir': None,
+            'video_path': None,
+            'english_srt': None,
+            'subtitle_source': None,
+            'prompt_file': None,
+            'bytes': 0,
+            'audio_seconds': 0.0,
+            'timings': {},
+            'error': None,
+        })
+    return jobs
+
+
+class BatchIngestRunner:
+    """批量导入调度器"""
+
+    def __init__(self, jobs, download_workers=3, cpu_workers=None, queue_size=4):
+        self.jobs = jobs
+        self.download_workers = download_workers
+        self.cpu_workers = cpu_workers or os.cpu_count() or 1
+        # 已解码但未转录的音频会占用内存，用有界队列限制积压
+        self.transcribe_queue = queue.Queue(maxsize=queue_size)
+        self.lock = threading.Lock()
+
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.batch_dir = os.path.join("output", f"batch_{timestamp}")
+        self.state_file = os.path.join(self.batch_dir, "batch_state.json")
+        self.started_at = None
+
+    def update_job(self, job, **changes):
+        """更新任务状态并持久化到 batch_state.json"""
+        with self.lock:
+            job.update(changes)
+            self.save_state()
+
+    def save_state(self):
+        os.makedirs(self.batch_dir, exist_ok=True)
+        state = {
+            'started_at': self.started_at,
+            'download_workers': self.download_workers,
+            'cpu_workers': self.cpu_workers,
+            'jobs': self.jobs,
+        }
+        temp_file = self.state_file + '.tmp'
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False, indent=2)
+        os.replace(temp_file, self.state_file)
+
+    def record_timing(self, job, stage, started):
+        with self.lock:
+            job['timings'][stage] = round(time.time() - started, 2)
+
+    def download_job(self, job, cpu_pool):
+        """I/O线程：下载单个任务，完成后交给CPU池解码音频
+
+        任何异常都只让这一个任务失败，不会中断整批（run 中 future.result() 会重新抛出未捕获的异常）
+        """
+        try:
+            return self.fetch_job(job, cpu_pool)
+        except Exception as e:
+            self.update_job(job, status='failed', error=f"ingest failed: {e}")
+            return None
+
+    def fetch_job(self, job, cpu_pool):
+        automation = OptimizedVideoAutomation()
+        self.update_job(job, status='downloading')
+        started = time.time()
+        try:
+            video_path, video_title = automation.download_video_with_incremental_retry(
+                job['url'], job['start'], job['end']
+            )
+        except Exception as e:
+            video_path, video_title = None, None
+            self.update_job(job, error=str(e))
+        self.record_timing(job, 'download', started)
+
+        if not video_path:
+            self.update_job(job, status='failed', error=job['error'] or 'download failed')
+            return
+
+        self.update_job(
+            job,
+            status='downloaded',
+            project_dir=automation.current_project_dir,
+            video_path=video_path,
+            video_title=video_title,
+            bytes=os.path.getsize(video_path)
+        )
+
+        # 已有合格的YouTube英文字幕时跳过解码与转录
+        started = time.time()
+        captions = automation.extract_english_subtitles_from_captions(job['url'], video_path, job['start'], job['end'])
+        self.record_timing(job, 'captions', started)
+        self.update_job(job, subtitle_source=automation.subtitle_source['type'])
+        if captions:
+            english_srt, segments = captions
+            self.update_job(job, english_srt=english_srt)
+            return cpu_pool.submit(self.finish_job, job, automation, english_srt, segments)
+        return cpu_pool.submit(self.decode_job, job, automation)
+
+    def decode_job(self, job, automation):
+        """CPU任务：解码16kHz音频为项目级PCM文件，转录线程不再阻塞在ffmpeg上"""
+        self.update_job(job, status='decoding')
+        started = time.time()
+        try:
+            audio = load_audio(job['video_path'])
+        except Exception as e:
+            self.record_timing(job, 'decode', started)
+            self.update_job(job, status='failed', error=f"audio decode failed: {e}")
+            return
+        self.record_timing(job, 'decode', started)
+        self.update_job(job, status='queued_transcription', audio_seconds=round(len(audio) / 16000, 2))
+        self.transcribe_queue.put((job, automation, audio))
+
+    def transcription_worker(self, cpu_pool):
+        """单一转录线程：整批只加载一次Whisper模型"""
+        transcriber = OptimizedVideoAutomation()
+        try:
+            transcriber.load_whisper_model()
+            load_error = None
+        except Exception as e:
+            load_error = f"whisper model load failed: {e}"
+            print(f"❌ Whisper模型加载失败: {e}")
+
+        while True:
+            item = self.transcribe_queue.get()
+            if item is None:
+                break
+
+            job, automation, audio = item
+            if load_error:
+                self.update_job(job, status='failed', error=load_error)
+                continue
+            self.update_job(job, status='transcribing')
+            started = time.time()
+            try:
+                transcriber.current_project_dir = job['project_dir']
+                english_srt, segments = transcriber.extract_english_subtitles_fast(job['video_path'], audio=audio)
+            except Exception as e:
+                self.record_timing(job, 'transcribe', started)
+                self.update_job(job, status='failed', error=f"transcription failed: {e}")
+                continue
+            finally:
+                del audio
+            self.record_timing(job, 'transcribe', started)
+            self.update_job(job, english_srt=english_srt)
+            cpu_pool.submit(self.finish_job, job, automation, english_srt, segments)
+
+    def finish_job(self, job, automation, english_srt, segments):
+        """生成翻译提示词并写入项目状态"""
+        started = time.time()
+        try:
+            prompt_file, translation_file = automation.create_translation_prompt_fast(segments)
+            automation.save_automation_state(
+                job['video_path'], job.get('video_title'), english_srt, translation_file, len(segments)
+            )
+        except Exception as e:
+            self.record_timing(job, 'prompt', started)
+            self.update_job(job, status='failed', error=f"prompt generation failed: {e}")
+            return
+        self.record_timing(job, 'prompt', started)
+        self.update_job(job, status='waiting_translation', prompt_file=prompt_file)
+
+    def run(self):
+        """执行整批任务"""
+        self.started_at = time.time()
+        self.save_state()
+        print(f"🚀 批量导入开始: {len(self.jobs)} 个任务")
+        print(f"   下载并发: {self.download_workers}, CPU并发: {self.cpu_workers}")
+        print(f"   状态文件: {self.state_file}")
+
+        with ThreadPoolExecutor(max_workers=self.cpu_workers) as cpu_pool:
+            worker = threading.Thread(target=self.transcription_worker, args=(cpu_pool,), daemon=True)
+            worker.start()
+
+            with ThreadPoolExecutor(max_workers=self.download_workers) as io_pool:
+                futures = [io_pool.submit(self.download_job, job, cpu_pool) for job in self.jobs]
+                decode_futures = [future.result() for future in futures]
+
+            # 等待所有解码任务入队后，再通知转录线程退出
+            for future in decode_futures:
+                if future is not None:
+                    future.result()
+            self.transcribe_queue.put(None)
+            worker.join()
+
+        return self.write_summary()
+
+    def write_summary(self):
+        """汇总吞吐量报告"""
+        wall_time = time.time() - self.started_at
+        completed = [job for job in self.jobs if job['status'] == 'waiting_translation']
+        failed = [job for job in self.jobs if job['status'] == 'failed']
+        total_mb = sum(job['bytes'] for job in self.jobs) / (1024 * 1024)
+        audio_seconds = sum(job['audio_seconds'] for job in completed)
+
+        stage_totals = {}
+        for job in self.jobs:
+            for stage, seconds in job['timings'].items():
+                stage_totals[stage] = stage_totals.get(stage, 0.0) + seconds
+
+        lines = [
+            "# 批量导入报告",
+            "",
+            f"- **任务总数**: {len(self.jobs)}",
+            f"- **成功**: {len(completed)}",
+            f"- **失败**: {len(failed)}",
+            f"- **总耗时**: {wall_time:.1f}秒",
+            f"- **吞吐量**: {len(completed) / wall_time * 3600:.1f} 个/小时",
+            f"- **下载总量**: {total_mb:.1f}MB ({total_mb / wall_time:.2f}MB/s)",
+            f"- **音频总时长**: {audio_seconds:.1f}秒 (处理速度 {audio_seconds / wall_time:.2f}x 实时)",
+            "",
+            "## 各阶段累计耗时（并行重叠，可大于总耗时）",
+        ]
+        for stage, seconds in stage_totals.items():
+            lines.append(f"- {stage}: {seconds:.1f}秒")
+
+        lines.extend(["", "## 任务明细", "", "| ID | 状态 | 字幕来源 | 大小(MB) | 音频(秒) | 耗时 | 项目目录 |",
+                      "|---|---|---|---|---|---|---|"])
+        for job in self.jobs:
+            timings = ', '.join(f"{stage}={seconds}s" for stage, seconds in job['timings'].items())
+            status = job['status'] if not job['error'] else f"{job['status']} ({job['error'][:40]})"
+            lines.append(
+                f"| {job['id']} | {status} | {job['subtitle_source'] or '-'} | {job['bytes'] / (1024 * 1024):.1f} | "
+                f"{job['audio_seconds']} | {timings} | {job['project_dir'] or '-'} |"
+            )
+
+        summary_file = os.path.join(self.batch_dir, "batch_summary.md")
+        with open(summary_file, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+
+        print("\n🎉 批量导入完成")
+        print(f"✅ 成功: {len(completed)}  ❌ 失败: {len(failed)}  ⏱️  总耗时: {wall_time:.1f}秒")
+        print(f"📊 报告: {summary_file}")
+        return summary_file
+
+
+def main():
+    parser = argparse.ArgumentParser(description='批量视频导入（下载 + 转录 + 翻译提示词）')
+    parser.add_argument('manifest', help='JSON或CSV格式的URL清单')
+    parser.add_argument('--workers', type=int, default=3, help='并发下载数')
+    parser.add_argument('--cpu-workers', type=int, default=None, help='CPU任务并发数（默认为核数）')
+    args = parser.parse_args()
+
+    jobs = load_manifest(args.manifest)
+    if not jobs:
+        print("❌ 清单中没有有效任务")
+        return
+
+    runner = BatchIngestRunner(jobs, download_workers=args.workers, cpu_workers=args.cpu_workers)
+    runner.run()
+
+
+if __name__ == "__main__":
+    main()
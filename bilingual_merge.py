@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+双语字幕合并 - 英文字幕与译文一次配对，生成双语字幕
+特点：
+- 译文按字幕序号建立一次索引，每条英文字幕 O(1) 查找，整体耗时与字幕条数成正比
+  （旧实现对每条英文字幕都从头扫描整份中文字幕，整集视频是平方级）
+- 任一方没有序号行（如VTT）时按位置配对
+- 报告没有译文的英文字幕、多出来的译文字幕和重复序号，不再静默输出缺行的双语字幕
+- 按时间对齐（--by time）：人工或AI翻译常把几条字幕合并或拆开，序号就对不上了。
+  两份字幕各按开始时间排序，二分查找只展开真正重叠的字幕对，整体 O((n+m) log(n+m) + 重叠对数)；
+  先按重叠比例一对一配对，剩下的字幕至少一半时长被某条已配对字幕覆盖时才并入那一组，
+  识别出合并（多条英文对一条译文）与拆分（一条英文对多条译文），组不会连成一长串
+
+使用方法:
+python bilingual_merge.py english.srt chinese.srt --output dual.srt
+python bilingual_merge.py english.srt chinese.srt --chinese-first --output dual.srt
+python bilingual_merge.py english.srt chinese.srt --by time --output dual.srt    # 译文合并/拆分过字幕时
+"""
+
+import argparse
+
+import numpy as np
+
+from subtitle_core import CueStore
+
+
+def match_by_position(primary, translation):
+    """第 i 条配第 i 条；返回 (下标数组, 重复序号)"""
+    matches = np.arange(len(primary), dtype=np.int64)
+    matches[len(translation):] = -1
+    return matches, []
+
+
+def match_by_number(primary, translation):
+    """按字幕序号配对；返回 (与 primary 等长的译文下标数组，没有对应时为 -1, 译文中重复的序号)"""
+    if (primary.numbers < 0).any() or (translation.numbers < 0).any():
+        return match_by_position(primary, translation)
+
+    index = {}
+    duplicates = []
+    for position, number in enumerate(translation.numbers.tolist()):
+        if number in index:
+            duplicates.append(number)  # 同一序号出现多次时采用第一条
+        else:
+            index[number] = position
+    matches = np.fromiter((index.get(number, -1) for number in primary.numbers.tolist()),
+                          dtype=np.int64, count=len(primary))
+    return matches, duplicates
+
+
+def cue_labels(store):
+    """报告中使用的字幕序号：文件中的序号，没有序号行时为从1起的位置"""
+    if len(store) and (store.numbers >= 0).all():
+        return store.numbers
+    return np.arange(1, len(store) + 1, dtype=np.int64)
+
+
+def merge_report(primary, translation, matches, duplicates=()):
+    """配对统计：unmatched 为没有译文的英文字幕序号，extra 为没有用到的译文字幕序号"""
+    used = np.zeros(len(translation), dtype=bool)
+    used[matches[matches >= 0]] = True
+    return {
+        'primary': len(primary),
+        'translation': len(translation),
+        'matched': int((matches >= 0).sum()),
+        'unmatched': cue_labels(primary)[matches < 0].tolist(),
+        'extra': cue_labels(translation)[~used].tolist(),
+        'duplicates': list(duplicates),
+    }
+
+
+# ---------- 按时间对齐 ----------
+
+MIN_OVERLAP = 0.3  # 重叠时长至少占两条字幕中较短一条的比例，低于此值不算对应
+MIN_COVER = 0.5    # 没配上对的字幕要并入对方所在组（合并/拆分），至少一半时长被对方覆盖
+
+
+def expand_ranges(low, high):
+    """把每个 [low, high) 展开：返回 (所属范围下标, 位置) 两个数组"""
+    counts = np.maximum(high - low, 0)
+    owners = np.repeat(np.arange(len(low)), counts)
+    positions = np.repeat(low, counts) + np.arange(int(counts.sum())) - np.repeat(np.cumsum(counts) - counts, counts)
+    return owners, positions
+
+
+def overlap_pairs(primary, translation):
+    """所有时间上重叠的字幕对，返回 (英文下标, 译文下标, 重叠毫秒) 三个数组
+
+    重叠的两条字幕中，要么译文开始于英文字幕之内，要么英文开始于译文之内（且晚于译文开始），两种情况互斥。
+    两份字幕各按开始时间排序，各做一次二分查找，展开的就只有真正重叠的字幕对：
+    O((n+m) log(n+m) + 重叠对数)，个别很长或时间错误的字幕只增加它自己实际重叠的字幕对
+    """
+    empty = np.zeros(0, dtype=np.int64)
+    if not len(primary) or not len(translation):
+        return empty, empty, empty
+    translation_order = np.argsort(translation.start, kind='stable')
+    primary_order = np.argsort(primary.start, kind='stable')
+    translation_starts = translation.start[translation_order]
+    primary_starts = primary.start[primary_order]
+
+    # 译文开始于英文字幕内: primary.start <= translation.start < primary.end
+    owners, positions = expand_ranges(np.searchsorted(translation_starts, primary.start, 'left'),
+                                      np.searchsorted(translation_starts, primary.end, 'left'))
+    first, second = [owners], [translation_order[positions]]
+    # 英文开始于译文内: translation.start < primary.start < translation.end
+    owners, positions = expand_ranges(np.searchsorted(primary_starts, translation.start, 'right'),
+                                      np.searchsorted(primary_starts, translation.end, 'left'))
+    first.append(primary_order[positions])
+    second.append(owners)
+
+    first, second = np.concatenate(first), np.concatenate(second)
+    overlap = np.minimum(primary.end[first], translation.end[second]) - \
+        np.maximum(primary.start[first], translation.start[second])
+    keep = overlap > 0
+    return first[keep], second[keep], overlap[keep]
+
+
+def best_links(owner, other, score, size):
+    """每个 owner 取得分最高的 other，返回 (other 下标, 得分)；没有候选时为 -1 / 0"""
+    best = np.full(size, -1, dtype=np.int64)
+    best_score = np.zeros(size, dtype=np.float64)
+    if len(owner):
+        order = np.lexsort((score, owner))
+        last = np.append(owner[order][1:] != owner[order][:-1], True)
+        best[owner[order][last]] = other[order][last]
+        best_score[owner[order][last]] = score[order][last]
+    return best, best_score
+
+
+def group_kind(primary_indices, translation_indices):
+    if not translation_indices:
+        return 'unmatched'
+    if not primary_indices:
+        return 'extra'
+    if len(primary_indices) == 1:
+        return 'match' if len(translation_indices) == 1 else 'split'
+    return 'merge' if len(translation_indices) == 1 else 'regroup'
+
+
+def align_by_time(primary, translation, min_overlap=MIN_OVERLAP, min_cover=MIN_COVER):
+    """按时间重叠把两份字幕分组
+
+    先按重叠比例从高到低一对一配对（每条字幕只用一次）；剩下的字幕只有至少 min_cover 的时长被对方
+    一条配好对的字幕覆盖时，才并入那一组，否则单独成组。组只会是一对配好的字幕加上直接挂在它们上的字幕，
+    时间错开半条的两份字幕也不会连成一整串。
+
+    返回按时间排序的 [{'primary': [下标], 'translation': [下标], 'kind': ...}]，kind 为
+    match（一对一）/ merge（多条英文对一条译文）/ split（一条英文对多条译文）/ regroup（多对多）/
+    unmatched（英文没有译文）/ extra（译文没有对应英文）
+    """
+    first, second, overlap = overlap_pairs(primary, translation)
+    primary_length = np.maximum(primary.end - primary.start, 1)
+    translation_length = np.maximum(translation.end - translation.start, 1)
+    ratio = overlap / np.minimum(primary_length[first], translation_length[second])
+    keep = ratio >= min_overlap
+    first, second, overlap, ratio = first[keep], second[keep], overlap[keep], ratio[keep]
+
+    # 一对一配对：重叠比例高的字幕对优先
+    paired_primary = [-1] * len(primary)
+    paired_translation = [-1] * len(translation)
+    order = np.lexsort((second, first, -ratio))
+    for p, t in zip(first[order].tolist(), second[order].tolist()):
+        if paired_primary[p] < 0 and paired_translation[t] < 0:
+            paired_primary[p], paired_translation[t] = t, p
+    members = {p: ([p], [t]) for p, t in enumerate(paired_primary) if t >= 0}  # 以配对的英文下标为键
+    singles = []
+
+    # 没配上对的字幕：与它重叠最多的对方字幕一定已经配对（否则两者会配成一对），被覆盖够多时并入那一组
+    best_translation, primary_cover = best_links(first, second, overlap / primary_length[first], len(primary))
+    best_primary, translation_cover = best_links(second, first, overlap / translation_length[second],
+                                                 len(translation))
+    for p, t in enumerate(paired_primary):
+        if t < 0:
+            partner = best_translation[p]
+            if partner >= 0 and primary_cover[p] >= min_cover and paired_translation[partner] >= 0:
+                members[paired_translation[partner]][0].append(p)
+            else:
+                singles.append(([p], []))
+    for t, p in enumerate(paired_translation):
+        if p < 0:
+            partner = best_primary[t]
+            if partner >= 0 and translation_cover[t] >= min_cover and paired_primary[partner] >= 0:
+                members[partner][1].append(t)
+            else:
+                singles.append(([], [t]))
+
+    groups = []
+    for primary_indices, translation_indices in [*members.values(), *singles]:
+        primary_indices.sort(key=lambda index: primary.start[index])
+        translation_indices.sort(key=lambda index: translation.start[index])
+        starts = [primary.start[index] for index in primary_indices] or \
+                 [translation.start[index] for index in translation_indices]
+        groups.append({'primary': primary_indices, 'translation': translation_indices,
+                       'kind': group_kind(primary_indices, translation_indices), 'start': int(min(starts))})
+    groups.sort(key=lambda group: group['start'])
+    return groups
+
+
+def alignment_report(primary, translation, groups):
+    primary_labels, translation_labels = cue_labels(primary).tolist(), cue_labels(translation).tolist()
+
+    def labels(group):
+        return '+'.join(str(primary_labels[index]) for index in group['primary'])
+
+    return {
+        'primary': len(primary),
+        'translation': len(translation),
+        'matched': sum(len(group['primary']) for group in groups if group['translation']),
+        'unmatched': [primary_labels[group['primary'][0]] for group in groups if group['kind'] == 'unmatched'],
+        'extra': [translation_labels[index] for group in groups if group['kind'] == 'extra'
+                  for index in group['translation']],
+        'duplicates': [],
+        'merges': [labels(group) for group in groups if group['kind'] == 'merge'],
+        'splits': [labels(group) for group in groups if group['kind'] == 'split'],
+        'regroups': [labels(group) for group in groups if group['kind'] == 'regroup'],
+    }
+
+
+def group_span(primary, translation, group):
+    """一组字幕的显示时间：有英文时为英文字幕的范围，否则为译文的范围"""
+    store, indices = (primary, group['primary']) if group['primary'] else (translation, group['translation'])
+    return int(store.start[indices].min()), int(store.end[indices].max())
+
+
+def aligned_bilingual(primary, translation, groups, translation_first=False, separator='\n'):
+    """每组输出一条双语字幕：英文各条合并、译文各条合并"""
+    primary_texts, translated = primary.texts(), translation.texts()
+    starts, ends, texts = [], [], []
+    for group in groups:
+        start, end = group_span(primary, translation, group)
+        pair = [' '.join(primary_texts[index] for index in group['primary']),
+                ' '.join(translated[index] for index in group['translation'])]
+        if translation_first:
+            pair.reverse()
+        starts.append(start)
+        ends.append(end)
+        texts.append(separator.join(part for part in pair if part))
+    return CueStore.from_texts(starts, ends, texts)
+
+
+def snap_translation(primary, translation, groups):
+    """译文字幕的时间对齐到所在组的英文字幕：每组第一条译文从英文开始时出现、最后一条到英文结束时消失，
+    组内拆分的译文之间保留各自的切换时间；没有对应英文的译文保持原时间"""
+    translated = translation.texts()
+    starts, ends, texts = [], [], []
+    for group in groups:
+        indices = group['translation']
+        if not indices:
+            continue
+        span_start, span_end = group_span(primary, translation, group)
+        for position, index in enumerate(indices):
+            start = span_start if position == 0 else min(max(int(translation.start[index]), span_start), span_end)
+            end = span_end if position == len(indices) - 1 else min(max(int(translation.end[index]), start), span_end)
+            starts.append(start)
+            ends.append(end)
+            texts.append(translated[index])
+    return CueStore.from_texts(starts, ends, texts)
+
+
+def describe(report, limit=10):
+    def sample(numbers):
+        shown = ', '.join(map(str, numbers[:limit]))
+        return shown + (f" 等 {len(numbers)} 条" if len(numbers) > limit else '')
+
+    lines = [f"📊 双语配对: {report['matched']}/{report['primary']} 条英文字幕有译文（译文 {report['translation']} 条）"]
+    if report['unmatched']:
+        lines.append(f"⚠️ 没有译文的英文字幕: 第 {sample(report['unmatched'])}")
+    if report['extra']:
+        lines.append(f"⚠️ 未使用的译文字幕: 第 {sample(report['extra'])}")
+    if report['duplicates']:
+        lines.append(f"⚠️ 译文中重复的序号: {sample(report['duplicates'])}")
+    if report.get('merges'):
+        lines.append(f"🔗 译文合并了英文字幕: 第 {sample(report['merges'])}")
+    if report.get('splits'):
+        lines.append(f"✂️ 译文拆分了英文字幕: 第 {sample(report['splits'])}")
+    if report.get('regroups'):
+        lines.append(f"🔀 译文重新分组的英文字幕: 第 {sample(report['regroups'])}")
+    return '\n'.join(lines)
+
+
+def merge_bilingual(primary, translation, translation_first=False, separator='\n', by='number'):
+    """返回 (双语 CueStore, 配对统计)；时间轴沿用英文，没有译文的字幕只保留英文
+
+    by='time' 时按时间重叠分组，合并/拆分过的字幕每组输出一条，没有对应英文的译文按原时间保留
+    """
+    if by == 'time':
+        groups = align_by_time(primary, translation)
+        return (aligned_bilingual(primary, translation, groups, translation_first, separator),
+                alignment_report(primary, translation, groups))
+
+    matches, duplicates = match_by_number(primary, translation)
+    translated = translation.texts()
+    texts = []
+    for text, match in zip(primary.texts(), matches.tolist()):
+        pair = [text, translated[match] if match >= 0 else '']
+        if translation_first:
+            pair.reverse()
+        texts.append(separator.join(part for part in pair if part))
+    return primary.with_texts(texts), merge_report(primary, translation, matches, duplicates)
+
+
+def merge_files(english_srt, translation_srt, output_path, translation_first=False, by='number'):
+    """合并两个SRT文件（各条字幕的多行文本先合并为一行），返回配对统计"""
+    merged, report = merge_bilingual(CueStore.read(english_srt, line_sep=' '),
+                                     CueStore.read(translation_srt, line_sep=' '),
+                                     translation_first=translation_first, by=by)
+    merged.write_srt(output_path)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='英文字幕与译文合并为双语SRT')
+    parser.add_argument('english', help='英文SRT')
+    parser.add_argument('translation', help='译文SRT')
+    parser.add_argument('--output', required=True)
+    parser.add_argument('--chinese-first', action='store_true', help='译文在上、英文在下')
+    parser.add_argument('--by', choices=['number', 'time'], default='number', help='按序号或按时间重叠配对')
+    args = parser.parse_args()
+
+    report = merge_files(args.english, args.translation, args.output, args.chinese_first, args.by)
+    print(describe(report))
+    print(f"✅ 双语字幕已保存: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -28,6 +28,10 @@ from datetime import datetime
 import shutil
 from pathlib import Path
 
+from bilingual_merge import describe as describe_merge, match_by_number, merge_report
+from retry_policy import RetryPolicy
+from subtitle_core import CueStore, write_srt
+
 def print_step(step_num, title, description=""):
     """打印步骤信息"""
     print(f"\n{'='*60}")
@@ -74,23 +78,26 @@ def download_video(url, project_dir):
     
     print(f"🔄 执行命令: {' '.join(cmd)}")
     
+    def run_download(attempt):
+        return subprocess.run(cmd, capture_output=True, text=True, timeout=300, check=True)
+    
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
-        if result.returncode == 0:
-            # 查找下载的视频文件
-            for file in os.listdir(project_dir):
-                if file.endswith('.mp4'):
-                    video_path = os.path.join(project_dir, file)
-                    print(f"✅ 视频下载成功: {file}")
-                    
-                    # 显示文件信息
-                    file_size = os.path.getsize(video_path) / (1024 * 1024)
-                    print(f"📊 文件大小: {file_size:.1f}MB")
-                    
-                    return video_path
-        else:
-            print(f"❌ 下载失败: {result.stderr}")
-            return None
+        # 按错误类别退避重试（429时与其他任务共享主机熔断）
+        RetryPolicy(max_attempts=3).run(run_download, url, "视频下载")
+        # 查找下载的视频文件
+        for file in os.listdir(project_dir):
+            if file.endswith('.mp4'):
+                video_path = os.path.join(project_dir, file)
+                print(f"✅ 视频下载成功: {file}")
+                
+                # 显示文件信息
+                file_size = os.path.getsize(video_path) / (1024 * 1024)
+                print(f"📊 文件大小: {file_size:.1f}MB")
+                
+                return video_path
+    except subprocess.CalledProcessError as e:
+        print(f"❌ 下载失败: {e.stderr}")
+        return None
     except subprocess.TimeoutExpired:
         print("❌ 下载超时")
         return None
@@ -106,24 +113,16 @@ def extract_subtitles(video_path, project_dir):
     subtitle_path = f"{project_dir}/subtitles/{video_name}_english.srt"
     
     try:
-        import whisper
+        from whisper_service import load_whisper_model
         
         print("🔄 加载Whisper模型...")
-        model = whisper.load_model("base")
+        model = load_whisper_model("base")  # 常驻服务运行时直接复用
         
         print("🔄 转录音频...")
         result = model.transcribe(video_path, language="en")
         
         # 保存SRT格式
-        with open(subtitle_path, 'w', encoding='utf-8') as f:
-            for i, segment in enumerate(result["segments"]):
-                start_time = format_timestamp(segment["start"])
-                end_time = format_timestamp(segment["end"])
-                text = segment["text"].strip()
-                
-                f.write(f"{i+1}\n")
-                f.write(f"{start_time} --> {end_time}\n")
-                f.write(f"{text}\n\n")
+        write_srt(subtitle_path, result["segments"])
         
         print(f"✅ 英文字幕已保存: {subtitle_path}")
         print(f"📊 字幕段数: {len(result['segments'])}")
@@ -137,29 +136,12 @@ def extract_subtitles(video_path, project_dir):
         print(f"❌ 字幕提取失败: {e}")
         return None
 
-def format_timestamp(seconds):
-    """格式化时间戳为SRT格式"""
-    hours = int(seconds // 3600)
-    minutes = int((seconds % 3600) // 60)
-    secs = int(seconds % 60)
-    millis = int((seconds % 1) * 1000)
-    return f"{hours:02d}:{minutes:02d}:{secs:02d},{millis:03d}"
-
 def generate_translation_prompt(english_subtitle_path, project_dir):
     """生成翻译提示文件"""
     print_step(3, "生成翻译提示", "为Sider.AI准备翻译内容")
     
-    # 读取英文字幕
-    with open(english_subtitle_path, 'r', encoding='utf-8') as f:
-        content = f.read()
-    
-    # 提取纯文本
-    lines = content.split('\n')
-    texts = []
-    for line in lines:
-        line = line.strip()
-        if line and not line.isdigit() and '-->' not in line:
-            texts.append(line)
+    # 读取英文字幕，提取纯文本（每条字幕一行）
+    texts = CueStore.read(english_subtitle_path, line_sep=' ').texts()
     
     # 生成翻译提示
     prompt_content = f"""请将以下英文字幕翻译成中文，要求：
@@ -268,15 +250,9 @@ def create_bilingual_videos(video_path, english_subtitle_path, chinese_subtitle_
 
 def create_bilingual_ass_subtitle(english_path, chinese_path, project_dir):
     """创建双语ASS字幕"""
-    # 读取字幕
-    with open(english_path, 'r', encoding='utf-8') as f:
-        eng_content = f.read()
-    with open(chinese_path, 'r', encoding='utf-8') as f:
-        chi_content = f.read()
-    
-    # 解析SRT格式
-    eng_subs = parse_srt(eng_content)
-    chi_subs = parse_srt(chi_content)
+    # 读取并解析SRT字幕（多行文本合并为一行）
+    eng_subs = CueStore.read(english_path, line_sep=' ')
+    chi_subs = CueStore.read(chinese_path, line_sep=' ')
     
     # 创建ASS字幕 - 使用经过验证的最佳配置
     ass_content = """[Script Info]
@@ -297,14 +273,17 @@ Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
     ass_content += "Dialogue: 0,0:00:00.00,9:59:59.99,Watermark,,0,0,0,,董卓主演脱口秀\n"
     
     # 添加字幕
-    for i, (eng_sub, chi_sub) in enumerate(zip(eng_subs, chi_subs)):
-        start_time = convert_to_ass_time(eng_sub['start'])
-        end_time = convert_to_ass_time(eng_sub['end'])
-        
+    # 中文按序号一次建索引后配对，时间轴沿用英文
+    matches, duplicates = match_by_number(eng_subs, chi_subs)
+    print(describe_merge(merge_report(eng_subs, chi_subs, matches, duplicates)))
+    chi_texts = chi_subs.texts()
+    starts, ends = eng_subs.timestamps('ass')
+    for start_time, end_time, eng_text, match in zip(starts, ends, eng_subs.texts(), matches.tolist()):
         # 中文字幕（上方）
-        ass_content += f"Dialogue: 0,{start_time},{end_time},Chinese,,0,0,0,,{chi_sub['text']}\n"
+        if match >= 0:
+            ass_content += f"Dialogue: 0,{start_time},{end_time},Chinese,,0,0,0,,{chi_texts[match]}\n"
         # 英文字幕（下方）
-        ass_content += f"Dialogue: 0,{start_time},{end_time},English,,0,0,0,,{eng_sub['text']}\n"
+        ass_content += f"Dialogue: 0,{start_time},{end_time},English,,0,0,0,,{eng_text}\n"
     
     # 保存ASS文件
     ass_path = f"{project_dir}/subtitles/bilingual.ass"
@@ -315,10 +294,7 @@ Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
 
 def create_chinese_ass_subtitle(chinese_path, project_dir):
     """创建纯中文ASS字幕"""
-    with open(chinese_path, 'r', encoding='utf-8') as f:
-        chi_content = f.read()
-    
-    chi_subs = parse_srt(chi_content)
+    chi_subs = CueStore.read(chinese_path, line_sep=' ')
     
     ass_content = """[Script Info]
 Title: Chinese Subtitles
@@ -337,10 +313,8 @@ Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
     ass_content += "Dialogue: 0,0:00:00.00,9:59:59.99,Watermark,,0,0,0,,董卓主演脱口秀\n"
     
     # 添加中文字幕
-    for sub in chi_subs:
-        start_time = convert_to_ass_time(sub['start'])
-        end_time = convert_to_ass_time(sub['end'])
-        ass_content += f"Dialogue: 0,{start_time},{end_time},Chinese,,0,0,0,,{sub['text']}\n"
+    for line in chi_subs.ass_events('Chinese'):
+        ass_content += line + "\n"
     
     ass_path = f"{project_dir}/subtitles/chinese.ass"
     with open(ass_path, 'w', encoding='utf-8') as f:
@@ -348,45 +322,6 @@ Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
     
     return ass_path
 
-def parse_srt(content):
-    """解析SRT字幕格式"""
-    blocks = content.strip().split('\n\n')
-    subtitles = []
-    
-    for block in blocks:
-        lines = block.strip().split('\n')
-        if len(lines) >= 3:
-            # 时间行
-            time_line = lines[1]
-            if ' --> ' in time_line:
-                start_str, end_str = time_line.split(' --> ')
-                # 文本行
-                text = ' '.join(lines[2:])
-                
-                subtitles.append({
-                    'start': parse_srt_time(start_str),
-                    'end': parse_srt_time(end_str),
-                    'text': text
-                })
-    
-    return subtitles
-
-def parse_srt_time(time_str):
-    """解析SRT时间格式为秒数"""
-    time_str = time_str.replace(',', '.')
-    parts = time_str.split(':')
-    hours = int(parts[0])
-    minutes = int(parts[1])
-    seconds = float(parts[2])
-    return hours * 3600 + minutes * 60 + seconds
-
-def convert_to_ass_time(seconds):
-    """转换秒数为ASS时间格式 - 精确同步"""
-    hours = int(seconds // 3600)
-    minutes = int((seconds % 3600) // 60)
-    secs = seconds % 60
-    return f"{hours:01d}:{minutes:02d}:{secs:05.2f}"
-
 def generate_thumbnail(video_path, project_dir):
     """生成B站封面"""
     print_step(6, "生成B站封面", "创建带人物照片的专业封面")
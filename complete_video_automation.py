@@ -11,19 +11,24 @@ import json
 import re
 from pathlib import Path
 import yt_dlp
-import whisper
+
+from download_metrics import DownloadMetrics
+from retry_policy import RetryPolicy
+from subtitle_core import write_srt
+from whisper_service import load_whisper_model
 
 class CompleteVideoAutomation:
     def __init__(self):
         self.base_output_dir = "output"
         self.current_project_dir = None
         self.whisper_model = None
+        self.retry_policy = RetryPolicy(max_attempts=3)
         
     def load_whisper_model(self):
         """加载Whisper模型"""
         if not self.whisper_model:
             print("🔄 加载Whisper模型...")
-            self.whisper_model = whisper.load_model("base")
+            self.whisper_model = load_whisper_model("base")  # 常驻服务运行时直接复用
             print("✅ Whisper模型加载完成")
     
     def create_project_directory(self, video_title):
@@ -109,10 +114,14 @@ class CompleteVideoAutomation:
         
         # 先获取视频信息来创建项目目录
         temp_ydl_opts = {'quiet': True}
-        try:
+        
+        def extract(attempt):
             with yt_dlp.YoutubeDL(temp_ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-                video_title = info.get('title', 'video')
+                return ydl.extract_info(url, download=False)
+        
+        try:
+            info = self.retry_policy.run(extract, url, "获取视频信息")
+            video_title = info.get('title', 'video')
         except Exception as e:
             print(f"⚠️ 无法获取视频信息，使用默认名称: {e}")
             video_title = "unknown_video"
@@ -135,27 +144,43 @@ class CompleteVideoAutomation:
                 '-to', end_time
             ]
         
+        # 记录吞吐量、首字节时间、重试和合并耗时到 download_metrics.jsonl
+        metrics = DownloadMetrics(project_dir, url)
+        metrics.attach(ydl_opts)
+        
+        def attempt_download(attempt):
+            metrics.start_attempt('yt-dlp')
+            try:
+                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                    info = ydl.extract_info(url, download=True)
+            except Exception as e:
+                metrics.end_attempt('failed', error=e)
+                raise
+            title = info.get('title', 'video')
+            video_path = f"{project_dir}/{title}.mp4"
+            
+            # 处理文件名
+            if not os.path.exists(video_path):
+                # 查找实际下载的文件
+                video_path = next(
+                    (f"{project_dir}/{file}" for file in os.listdir(project_dir) if file.endswith('.mp4')), None
+                )
+            if not video_path:
+                metrics.end_attempt('no_file')
+                raise RuntimeError("下载完成但未找到视频文件")
+            metrics.end_attempt('ok')
+            return video_path, title
+        
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=True)
-                title = info.get('title', 'video')
-                video_path = f"{project_dir}/{title}.mp4"
-                
-                # 处理文件名
-                if os.path.exists(video_path):
-                    print(f"✅ 视频下载成功: {video_path}")
-                    return video_path, title
-                else:
-                    # 查找实际下载的文件
-                    for file in os.listdir(project_dir):
-                        if file.endswith('.mp4'):
-                            actual_path = f"{project_dir}/{file}"
-                            print(f"✅ 视频下载成功: {actual_path}")
-                            return actual_path, title
-                    
+            video_path, title = self.retry_policy.run(
+                attempt_download, url, "视频下载",
+                on_retry=lambda kind, delay, e: metrics.record('retry', kind=kind, delay=round(delay, 2))
+            )
         except Exception as e:
             print(f"❌ 下载失败: {e}")
             return None, None
+        print(f"✅ 视频下载成功: {video_path}")
+        return video_path, title
     
     def extract_english_subtitles(self, video_path):
         """提取英文字幕"""
@@ -176,11 +201,7 @@ class CompleteVideoAutomation:
         video_name = Path(video_path).stem
         english_srt = f"{self.current_project_dir}/subtitles/{video_name}_english.srt"
         
-        with open(english_srt, 'w', encoding='utf-8') as f:
-            for i, segment in enumerate(segments, 1):
-                start_time = self.seconds_to_srt_time(segment["start"])
-                end_time = self.seconds_to_srt_time(segment["end"])
-                f.write(f"{i}\n{start_time} --> {end_time}\n{segment['text']}\n\n")
+        write_srt(english_srt, segments)
         
         print(f"✅ 英文字幕提取完成: {english_srt}")
         print(f"📊 共 {len(segments)} 个片段")
@@ -289,14 +310,6 @@ class CompleteVideoAutomation:
         print(f"✅ B站元数据已生成: {metadata_file}")
         return metadata
     
-    def seconds_to_srt_time(self, seconds):
-        """转换秒数为SRT时间格式"""
-        hours = int(seconds // 3600)
-        minutes = int((seconds % 3600) // 60)
-        secs = int(seconds % 60)
-        millisecs = int((seconds % 1) * 1000)
-        return f"{hours:02d}:{minutes:02d}:{secs:02d},{millisecs:03d}"
-    
     def process_video(self, url, start_time=None, end_time=None):
         """完整视频处理流程"""
         print("🎯 完整视频处理自动化开始")
@@ -449,6 +462,11 @@ def main():
                     print()
             else:
                 print("📁 暂无项目")
+        elif sys.argv[1] == "--batch":
+            # 非交互式批量模式
+            from batch_ingest import main as batch_main
+            sys.argv = [sys.argv[0]] + sys.argv[2:]
+            batch_main()
         elif sys.argv[1] == "--continue":
             # 继续指定项目
             if len(sys.argv) > 2:
@@ -463,6 +481,7 @@ def main():
             print("  python complete_video_automation.py --finalize # 完成最新项目")
             print("  python complete_video_automation.py --list     # 列出所有项目")
             print("  python complete_video_automation.py --continue <项目目录> # 继续指定项目")
+            print("  python complete_video_automation.py --batch <清单.json|csv> # 批量导入")
     else:
         # 交互式开始
         print("🎯 完整视频处理自动化")
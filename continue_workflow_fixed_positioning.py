@@ -22,8 +22,13 @@ import os
 import sys
 import subprocess
 import re
+from itertools import chain
 from pathlib import Path
 
+from ass_build_cache import build_ass, describe as describe_build
+from bilingual_merge import align_by_time, alignment_report, describe as describe_merge, snap_translation
+from subtitle_core import CueStore, iter_ass_events, iter_cues
+
 def print_step(step_num, title, description=""):
     """打印步骤信息"""
     print(f"\n{'='*60}")
@@ -32,24 +37,11 @@ def print_step(step_num, title, description=""):
         print(f"   {description}")
     print(f"{'='*60}")
 
-def srt_time_to_seconds(time_str):
-    """将SRT时间格式转换为秒数"""
-    time_str = time_str.replace(',', '.')
-    parts = time_str.split(':')
-    hours = int(parts[0])
-    minutes = int(parts[1])
-    seconds = float(parts[2])
-    return hours * 3600 + minutes * 60 + seconds
-
-def seconds_to_ass_time(seconds):
-    """将秒数转换为ASS时间格式"""
-    hours = int(seconds // 3600)
-    minutes = int((seconds % 3600) // 60)
-    secs = seconds % 60
-    return f"{hours:01d}:{minutes:02d}:{secs:05.2f}"
-
 def create_stable_ass_subtitles(english_srt, chinese_srt, output_path, subtitle_type="bilingual"):
-    """创建位置稳定的ASS字幕 - 改进时间同步"""
+    """创建位置稳定的ASS字幕 - 改进时间同步
+
+    返回 build_ass 的结果：written 为 False 时内容与上次相同，ranges 为变化的时间范围
+    """
     
     # 稳定的样式定义 - 调整中文字幕到英文字幕上方
     if subtitle_type == "bilingual":
@@ -83,77 +75,38 @@ Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
     # 添加水印
     ass_content += "Dialogue: 0,0:00:00.00,9:59:59.99,Watermark,,0,0,0,,董卓主演脱口秀\n"
     
-    # 读取中文字幕 - 改进时间处理
-    chinese_subtitles = []
-    if os.path.exists(chinese_srt):
-        with open(chinese_srt, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        # 解析SRT格式，精确处理时间
-        blocks = content.strip().split('\n\n')
-        for block in blocks:
-            lines = block.strip().split('\n')
-            if len(lines) >= 3:
-                time_line = lines[1]
-                text_lines = lines[2:]
-                text = ' '.join(text_lines).strip()
-                
-                # 解析时间，确保精确同步
-                if '-->' in time_line:
-                    start_str, end_str = time_line.split(' --> ')
-                    start_str = start_str.strip()
-                    end_str = end_str.strip()
-                    
-                    # 转换为ASS时间格式，保持精确性
-                    start_seconds = srt_time_to_seconds(start_str)
-                    end_seconds = srt_time_to_seconds(end_str)
-                    start_ass = seconds_to_ass_time(start_seconds)
-                    end_ass = seconds_to_ass_time(end_seconds)
-                    
-                    # 强制使用固定的MarginV确保位置一致
-                    if subtitle_type == "bilingual":
-                        ass_content += f"Dialogue: 0,{start_ass},{end_ass},Chinese,,0,0,0,,{text}\n"
-                    else:
-                        ass_content += f"Dialogue: 0,{start_ass},{end_ass},Chinese,,0,0,0,,{text}\n"
-    
-    # 添加英文字幕（如果是双语）- 改进时间处理
+    # 读取中文字幕（强制使用固定的MarginV确保位置一致）
     if subtitle_type == "bilingual" and os.path.exists(english_srt):
-        with open(english_srt, 'r', encoding='utf-8') as f:
-            content = f.read()
+        english = CueStore.read(english_srt, line_sep=' ')
+        chinese = CueStore.read(chinese_srt, line_sep=' ') if os.path.exists(chinese_srt) else CueStore([], [])
+        # 按时间重叠对齐：译文合并/拆分过字幕时，中文仍与对应的英文同时出现、同时消失
+        groups = align_by_time(english, chinese)
+        print(describe_merge(alignment_report(english, chinese, groups)))
+        chinese = snap_translation(english, chinese, groups)
         
-        blocks = content.strip().split('\n\n')
-        for block in blocks:
-            lines = block.strip().split('\n')
-            if len(lines) >= 3:
-                time_line = lines[1]
-                text_lines = lines[2:]
-                text = ' '.join(text_lines).strip()
-                
-                if '-->' in time_line:
-                    start_str, end_str = time_line.split(' --> ')
-                    start_str = start_str.strip()
-                    end_str = end_str.strip()
-                    
-                    # 转换为ASS时间格式，保持精确性
-                    start_seconds = srt_time_to_seconds(start_str)
-                    end_seconds = srt_time_to_seconds(end_str)
-                    start_ass = seconds_to_ass_time(start_seconds)
-                    end_ass = seconds_to_ass_time(end_seconds)
-                    
-                    # 强制使用固定的MarginV确保位置一致
-                    ass_content += f"Dialogue: 0,{start_ass},{end_ass},English,,0,0,0,,{text}\n"
-    
-    # 保存ASS文件
-    with open(output_path, 'w', encoding='utf-8') as f:
-        f.write(ass_content)
-    
-    print(f"✅ 稳定位置ASS字幕已生成: {output_path}")
-    return True
+        # 添加英文字幕（双语）
+        events = chain(iter_ass_events(chinese, 'Chinese'), iter_ass_events(english, 'English'))
+    elif os.path.exists(chinese_srt):
+        # 纯中文：不需要对齐，字幕逐块读入、逐批写出
+        events = iter_ass_events(iter_cues(chinese_srt, line_sep=' '), 'Chinese')
+    else:
+        events = []
+    
+    # 保存ASS文件：只有内容变化时才写入，并报告变化的时间范围
+    result = build_ass(output_path, ass_content, events)
+    print(describe_build(result))
+    return result
+
+def render_is_current(ass_path, output_path):
+    """视频晚于字幕文件生成才算有效：渲染先写临时文件、成功后才替换，失败的渲染不会留下半截视频"""
+    return os.path.exists(output_path) and os.stat(output_path).st_mtime_ns >= os.stat(ass_path).st_mtime_ns
 
 def generate_video_with_stable_subtitles(video_path, ass_path, output_path):
     """使用稳定位置的字幕生成视频"""
     print(f"🔄 生成带稳定字幕的视频...")
     
+    base, ext = os.path.splitext(output_path)
+    temp_output = f"{base}.tmp{ext}"
     cmd = [
         "ffmpeg", "-y",
         "-i", video_path,
@@ -163,11 +116,12 @@ def generate_video_with_stable_subtitles(video_path, ass_path, output_path):
         "-crf", "20",
         "-c:a", "aac",
         "-b:a", "128k",
-        output_path
+        temp_output
     ]
     
     try:
         result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        os.replace(temp_output, output_path)
         
         # 获取文件大小
         file_size = os.path.getsize(output_path)
@@ -177,6 +131,8 @@ def generate_video_with_stable_subtitles(video_path, ass_path, output_path):
         return True
         
     except subprocess.CalledProcessError as e:
+        if os.path.exists(temp_output):
+            os.remove(temp_output)
         print(f"❌ 视频生成失败: {e}")
         if e.stderr:
             print(f"错误详情: {e.stderr}")
@@ -216,25 +172,29 @@ def main():
     
     # 生成稳定位置的双语ASS字幕
     bilingual_ass = f"{project_dir}/subtitles/bilingual_stable.ass"
-    create_stable_ass_subtitles(english_srt, chinese_srt, bilingual_ass, "bilingual")
+    bilingual_build = create_stable_ass_subtitles(english_srt, chinese_srt, bilingual_ass, "bilingual")
     
-    # 生成双语视频
+    # 生成双语视频（字幕没有变化且上次渲染成功时跳过）
     bilingual_output = f"{project_dir}/final/Ted Cruz & Tucker Carlson Battle Over Iran While Trump Enters His Decorating Era ｜ The Daily Show_bilingual_stable.mp4"
     os.makedirs(os.path.dirname(bilingual_output), exist_ok=True)
     
-    if generate_video_with_stable_subtitles(video_file, bilingual_ass, bilingual_output):
+    if not bilingual_build['written'] and render_is_current(bilingual_ass, bilingual_output):
+        print(f"⏭️ 双语字幕未变化，沿用已有视频")
+    elif generate_video_with_stable_subtitles(video_file, bilingual_ass, bilingual_output):
         print(f"✅ 稳定位置双语视频完成")
     
     print_step(2, "生成稳定位置中文视频", "中文字幕居中显示，位置固定")
     
     # 生成稳定位置的中文ASS字幕
     chinese_ass = f"{project_dir}/subtitles/chinese_stable.ass"
-    create_stable_ass_subtitles(english_srt, chinese_srt, chinese_ass, "chinese")
+    chinese_build = create_stable_ass_subtitles(english_srt, chinese_srt, chinese_ass, "chinese")
     
-    # 生成中文视频
+    # 生成中文视频（字幕没有变化且上次渲染成功时跳过）
     chinese_output = f"{project_dir}/final/Ted Cruz & Tucker Carlson Battle Over Iran While Trump Enters His Decorating Era ｜ The Daily Show_chinese_stable.mp4"
     
-    if generate_video_with_stable_subtitles(video_file, chinese_ass, chinese_output):
+    if not chinese_build['written'] and render_is_current(chinese_ass, chinese_output):
+        print(f"⏭️ 中文字幕未变化，沿用已有视频")
+    elif generate_video_with_stable_subtitles(video_file, chinese_ass, chinese_output):
         print(f"✅ 稳定位置中文视频完成")
     
     print_step(3, "完成稳定字幕视频生成")
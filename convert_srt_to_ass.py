@@ -4,9 +4,11 @@ Convert bilingual SRT subtitles to ASS format with different font sizes
 Chinese: 22px, English: 18px
 """
 
+from subtitle_core import CueStore, write_ass
+
 def convert_srt_to_ass(srt_file, ass_file):
     # ASS header
-    ass_content = """[Script Info]
+    header = """[Script Info]
 Title: Bilingual Subtitles
 ScriptType: v4.00+
 
@@ -19,49 +21,22 @@ Style: English,Arial,18,&Hffffff,&Hffffff,&H000000,&H80000000,0,0,0,0,100,100,0,
 Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
 """
     
-    # Read SRT file
-    with open(srt_file, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
-    
-    i = 0
-    while i < len(lines):
-        line = lines[i].strip()
-        
-        # Skip subtitle number
-        if line.isdigit():
-            i += 1
-            continue
-        
-        # Parse time
-        if '-->' in line:
-            time_line = line.replace(',', '.')
-            start_time, end_time = time_line.split(' --> ')
-            
-            # Convert time format from SRT to ASS
-            start_ass = start_time.replace('.', ':')[:-1]  # Remove last digit
-            end_ass = end_time.replace('.', ':')[:-1]      # Remove last digit
-            
-            i += 1
-            
-            # Get Chinese subtitle
-            chinese_line = lines[i].strip() if i < len(lines) else ""
-            i += 1
-            
-            # Get English subtitle  
-            english_line = lines[i].strip() if i < len(lines) else ""
-            i += 1
-            
-            # Add to ASS content
-            if chinese_line:
-                ass_content += f"Dialogue: 0,{start_ass},{end_ass},Chinese,,0,0,0,,{chinese_line}\n"
-            if english_line:
-                ass_content += f"Dialogue: 0,{start_ass},{end_ass},English,,0,0,0,,{english_line}\n"
-        else:
-            i += 1
+    # Stream the SRT file chunk by chunk: line 1 Chinese, line 2 English
+    def dialogue_lines():
+        for subtitles in CueStore.iter_read(srt_file):
+            starts, ends = subtitles.timestamps('ass')
+            for start_ass, end_ass, text in zip(starts, ends, subtitles.texts()):
+                lines = text.split('\n')
+                chinese_line = lines[0].strip()
+                english_line = lines[1].strip() if len(lines) > 1 else ""
+                
+                if chinese_line:
+                    yield f"Dialogue: 0,{start_ass},{end_ass},Chinese,,0,0,0,,{chinese_line}"
+                if english_line:
+                    yield f"Dialogue: 0,{start_ass},{end_ass},English,,0,0,0,,{english_line}"
     
-    # Write ASS file
-    with open(ass_file, 'w', encoding='utf-8') as f:
-        f.write(ass_content)
+    # Write ASS file as the lines are produced
+    write_ass(ass_file, header, dialogue_lines())
     
     print(f"Converted {srt_file} to {ass_file}")
 
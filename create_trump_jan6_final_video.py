@@ -10,6 +10,9 @@ import subprocess
 import tempfile
 from typing import List, Dict
 
+from bilingual_merge import describe as describe_merge, merge_files
+from subtitle_core import format_ms, write_ass
+
 class TrumpJan6VideoProcessor:
     def __init__(self):
         self.project_dir = "output/trump_jan6_complete_project"
@@ -24,75 +27,15 @@ class TrumpJan6VideoProcessor:
         
         print("📝 创建双语字幕文件...")
         
-        # 读取英文字幕
-        with open(self.english_srt, 'r', encoding='utf-8') as f:
-            english_lines = f.readlines()
-        
-        # 读取中文字幕  
-        with open(self.chinese_srt, 'r', encoding='utf-8') as f:
-            chinese_lines = f.readlines()
-        
         dual_srt_path = f"{self.project_dir}/trump_jan6_dual_subtitles.srt"
         
-        with open(dual_srt_path, 'w', encoding='utf-8') as f:
-            english_subtitle = ""
-            chinese_subtitle = ""
-            
-            i = 0
-            while i < len(english_lines):
-                line = english_lines[i].strip()
-                
-                # 字幕序号
-                if line.isdigit():
-                    subtitle_num = line
-                    f.write(f"{subtitle_num}\n")
-                    
-                    # 时间轴
-                    i += 1
-                    if i < len(english_lines):
-                        time_line = english_lines[i].strip()
-                        f.write(f"{time_line}\n")
-                    
-                    # 英文字幕内容
-                    i += 1
-                    english_content = []
-                    while i < len(english_lines) and english_lines[i].strip():
-                        english_content.append(english_lines[i].strip())
-                        i += 1
-                    
-                    # 查找对应的中文字幕
-                    chinese_content = self.find_matching_chinese_subtitle(subtitle_num, chinese_lines)
-                    
-                    # 写入双语字幕
-                    if english_content:
-                        # 英文在上
-                        f.write(" ".join(english_content) + "\n")
-                    if chinese_content:
-                        # 中文在下  
-                        f.write(chinese_content + "\n")
-                    
-                    f.write("\n")
-                
-                i += 1
+        # 中文按序号一次建索引后配对：英文在上，中文在下，时间轴沿用英文
+        report = merge_files(self.english_srt, self.chinese_srt, dual_srt_path)
+        print(describe_merge(report))
         
         print(f"✅ 双语字幕已创建: {dual_srt_path}")
         return dual_srt_path
     
-    def find_matching_chinese_subtitle(self, subtitle_num: str, chinese_lines: List[str]) -> str:
-        """查找匹配的中文字幕"""
-        
-        for i, line in enumerate(chinese_lines):
-            if line.strip() == subtitle_num:
-                # 跳过时间轴行
-                i += 2
-                chinese_content = []
-                while i < len(chinese_lines) and chinese_lines[i].strip():
-                    chinese_content.append(chinese_lines[i].strip())
-                    i += 1
-                return " ".join(chinese_content)
-        
-        return ""
-    
     def convert_danmaku_to_ass(self) -> str:
         """将弹幕JSON转换为ASS字幕格式"""
         
@@ -101,7 +44,7 @@ class TrumpJan6VideoProcessor:
         with open(self.danmaku_json, 'r', encoding='utf-8') as f:
             danmaku_data = json.load(f)
         
-        ass_content = [
+        header = '\n'.join([
             "[Script Info]",
             "Title: Trump Jan 6 Danmaku",
             "ScriptType: v4.00+",
@@ -112,36 +55,27 @@ class TrumpJan6VideoProcessor:
             "",
             "[Events]",
             "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text"
-        ]
+        ]) + '\n'
         
-        for danmaku in danmaku_data["danmaku_list"]:
-            start_ms = danmaku["time"]
-            start_time = self.ms_to_ass_time(start_ms)
-            end_time = self.ms_to_ass_time(start_ms + 8000)  # 显示8秒
-            
-            # 弹幕移动效果
-            move_effect = "{\\move(1920,540,0,540)}"
-            text = f"{move_effect}{danmaku['text']}"
-            
-            ass_line = f"Dialogue: 0,{start_time},{end_time},Danmaku,,0,0,0,,{text}"
-            ass_content.append(ass_line)
+        def dialogue_lines():
+            for danmaku in danmaku_data["danmaku_list"]:
+                start_ms = danmaku["time"]
+                start_time = format_ms(start_ms, 'ass')
+                end_time = format_ms(start_ms + 8000, 'ass')  # 显示8秒
+                
+                # 弹幕移动效果
+                move_effect = "{\\move(1920,540,0,540)}"
+                text = f"{move_effect}{danmaku['text']}"
+                
+                yield f"Dialogue: 0,{start_time},{end_time},Danmaku,,0,0,0,,{text}"
         
+        # 逐条生成、逐条写出
         ass_path = f"{self.project_dir}/trump_jan6_danmaku.ass"
-        with open(ass_path, 'w', encoding='utf-8') as f:
-            f.write('\n'.join(ass_content))
+        write_ass(ass_path, header, dialogue_lines())
         
         print(f"✅ ASS弹幕文件已创建: {ass_path}")
         return ass_path
     
-    def ms_to_ass_time(self, ms: int) -> str:
-        """毫秒转ASS时间格式"""
-        total_seconds = ms / 1000
-        hours = int(total_seconds // 3600)
-        minutes = int((total_seconds % 3600) // 60)
-        seconds = int(total_seconds % 60)
-        centiseconds = int((ms % 1000) / 10)
-        return f"{hours}:{minutes:02d}:{seconds:02d}.{centiseconds:02d}"
-    
     def create_final_video(self, dual_srt_path: str, danmaku_ass_path: str) -> str:
         """创建最终视频：原视频 + 双语字幕 + 弹幕 + 水印"""
         
@@ -10,6 +10,8 @@ import subprocess
 import tempfile
 from typing import List, Dict
 
+from subtitle_core import format_ms, write_ass
+
 class VideoDanmakuProcessor:
     def __init__(self):
         self.temp_files = []
@@ -31,61 +33,47 @@ Style: Danmaku,Microsoft YaHei,25,&H00FFFFFF,&H000000FF,&H00000000,&H80000000,0,
 Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
 """
         
-        ass_content = ass_header
-        
-        for danmaku in danmaku_data["danmaku_list"]:
-            # 转换时间格式
-            start_time = danmaku["time"] / 1000.0  # 毫秒转秒
-            end_time = start_time + 3.0  # 弹幕显示3秒
+        def dialogue_lines():
+            for danmaku in danmaku_data["danmaku_list"]:
+                # 转换为ASS时间格式 (h:mm:ss.cc)，弹幕显示3秒
+                start_ass = format_ms(danmaku["time"], 'ass')
+                end_ass = format_ms(danmaku["time"] + 3000, 'ass')
             
-            # 转换为ASS时间格式 (h:mm:ss.cc)
-            start_ass = self._seconds_to_ass_time(start_time)
-            end_ass = self._seconds_to_ass_time(end_time)
+                # 根据弹幕模式设置效果
+                effect = ""
+                alignment = "2"  # 默认居中
             
-            # 根据弹幕模式设置效果
-            effect = ""
-            alignment = "2"  # 默认居中
+                if danmaku["mode"] == 1:  # 滚动弹幕
+                    effect = "{\\move(1920,540,0,540)}"  # 从右到左滚动
+                elif danmaku["mode"] == 5:  # 顶部弹幕
+                    alignment = "8"
+                    effect = "{\\pos(960,100)}"
+                elif danmaku["mode"] == 4:  # 底部弹幕
+                    alignment = "2"
+                    effect = "{\\pos(960,980)}"
             
-            if danmaku["mode"] == 1:  # 滚动弹幕
-                effect = "{\\move(1920,540,0,540)}"  # 从右到左滚动
-            elif danmaku["mode"] == 5:  # 顶部弹幕
-                alignment = "8"
-                effect = "{\\pos(960,100)}"
-            elif danmaku["mode"] == 4:  # 底部弹幕
-                alignment = "2"
-                effect = "{\\pos(960,980)}"
+                # 颜色转换
+                color = danmaku["color"]
+                if isinstance(color, str):
+                    color = int(color)
             
-            # 颜色转换
-            color = danmaku["color"]
-            if isinstance(color, str):
-                color = int(color)
+                # 转换为ASS颜色格式 (BGR)
+                r = (color >> 16) & 0xFF
+                g = (color >> 8) & 0xFF
+                b = color & 0xFF
+                ass_color = f"&H00{b:02X}{g:02X}{r:02X}"
             
-            # 转换为ASS颜色格式 (BGR)
-            r = (color >> 16) & 0xFF
-            g = (color >> 8) & 0xFF
-            b = color & 0xFF
-            ass_color = f"&H00{b:02X}{g:02X}{r:02X}"
+                # 文本内容
+                text = danmaku["text"].replace('\n', '\\N')
             
-            # 文本内容
-            text = danmaku["text"].replace('\n', '\\N')
-            
-            # 添加弹幕行
-            ass_line = f"Dialogue: 0,{start_ass},{end_ass},Danmaku,,0,0,0,{effect}{{\\c{ass_color}\\fs{danmaku['fontsize']}}}{text}\n"
-            ass_content += ass_line
+                # 添加弹幕行
+                yield f"Dialogue: 0,{start_ass},{end_ass},Danmaku,,0,0,0,{effect}{{\\c{ass_color}\\fs{danmaku['fontsize']}}}{text}"
         
-        # 写入文件
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(ass_content)
+        # 逐条生成、逐条写入文件
+        write_ass(output_path, ass_header, dialogue_lines())
         
         return output_path
     
-    def _seconds_to_ass_time(self, seconds: float) -> str:
-        """将秒数转换为ASS时间格式"""
-        hours = int(seconds // 3600)
-        minutes = int((seconds % 3600) // 60)
-        secs = seconds % 60
-        return f"{hours}:{minutes:02d}:{secs:05.2f}"
-    
     def create_video_with_danmaku(self, video_path: str, danmaku_file: str, 
                                 output_path: str) -> str:
         """使用FFmpeg创建带弹幕的视频"""
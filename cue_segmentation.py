@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+字幕切分 - 用词级时间戳把Whisper的长片段重新切成适合烧录显示的字幕条
+特点：
+- 按实际显示宽度换行：宽度取 SUBTITLE_CONFIG 字体的字形宽度（Pillow 读取字体文件，
+  结果缓存在 output/.font_metrics.json），而不是按字符数估计
+- 每条字幕最多 max_lines 行、不超过 max_duration 秒，停顿处（词间隔 ≥ pause 秒）总是断开
+- 超出限制时优先退回到本条字幕最后一个标点处断开
+- 逐词单遍处理、可流式产出，几小时的转录也只需线性时间
+
+宽度单位与 ffmpeg subtitles 滤镜（libass）渲染SRT时一致：画布宽 384，Fontsize 即字号，
+左右边距各 10，再扣除描边宽度
+
+使用方法:
+python cue_segmentation.py subtitles/video_english.srt --style english     # 输出 video_english_cues.srt
+python cue_segmentation.py --benchmark --hours 3                             # 3小时合成转录的切分耗时
+"""
+
+import argparse
+import json
+import os
+import re
+import time
+import unicodedata
+
+from subtitle_config import SUBTITLE_CONFIG
+from subtitle_core import CueStore
+
+DEFAULT_METRICS_CACHE = os.path.join("output", ".font_metrics.json")
+
+# libass 渲染SRT时的默认画布与边距
+PLAY_RES_X = 384
+MARGIN_H = 10
+
+MAX_LINES = 2
+MAX_DURATION = 7.0
+PAUSE_SECONDS = 0.6
+CLAUSE_END = re.compile(r"[.,!?;:…。，！？；：]['\"”’)]*$")
+
+FONT_DIRS = ['/System/Library/Fonts', '/System/Library/Fonts/Supplementary', '/Library/Fonts',
+             '~/Library/Fonts', '/usr/share/fonts', '/usr/local/share/fonts', '~/.fonts']
+FONT_FILES = {
+    'Arial': ['Arial.ttf', 'arial.ttf', 'LiberationSans-Regular.ttf', 'DejaVuSans.ttf'],
+    'PingFang SC': ['PingFang.ttc', 'NotoSansCJK-Regular.ttc', 'NotoSansSC-Regular.otf', 'wqy-microhei.ttc'],
+}
+
+
+def find_font_file(fontname):
+    candidates = FONT_FILES.get(fontname, []) + [f"{fontname}.ttf", f"{fontname}.ttc", f"{fontname}.otf"]
+    for directory in FONT_DIRS:
+        directory = os.path.expanduser(directory)
+        if not os.path.isdir(directory):
+            continue
+        for root, _, files in os.walk(directory):
+            for candidate in candidates:
+                if candidate in files:
+                    return os.path.join(root, candidate)
+    return None
+
+
+def estimated_width(char):
+    """没有字体文件或Pillow时的估计宽度（相对字号）"""
+    if char.isspace():
+        return 0.25
+    if unicodedata.east_asian_width(char) in ('W', 'F'):
+        return 0.87
+    if char in 'iljt.,;:!|\'"' or unicodedata.category(char).startswith('M'):
+        return 0.25
+    if char in 'mwMW':
+        return 0.75
+    return 0.5 if char.islower() else 0.62
+
+
+class FontMetrics:
+    """字形宽度（相对字号，即 libass 中宽度 = 值 × Fontsize），按字体缓存
+
+    libass 把字号映射为字体的 ascent + descent 高度，所以宽度按该高度归一化
+    """
+
+    def __init__(self, fontname, cache_path=DEFAULT_METRICS_CACHE):
+        self.fontname = fontname
+        self.cache_path = cache_path
+        self.widths = {}
+        self.font = None
+        self.scale = None
+        self.dirty = False
+
+        cached = self.read_cache().get(fontname)
+        if cached:
+            self.widths = cached['widths']
+        self.font_file = cached['file'] if cached else find_font_file(fontname)
+        if not cached and self.font_file:
+            self.load_font()
+        if self.font is not None:
+            self.measure(''.join(chr(code) for code in range(32, 127)))  # 先量好ASCII，之后按需补充
+
+    def read_cache(self):
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def load_font(self):
+        try:
+            from PIL import ImageFont
+            self.font = ImageFont.truetype(self.font_file, 100)
+        except Exception:
+            self.font_file = None  # 只能估计，估计值不写入缓存
+            return
+        ascent, descent = self.font.getmetrics()
+        self.scale = 1.0 / (ascent + descent)
+
+    def measure(self, chars):
+        for char in chars:
+            if char not in self.widths:
+                self.widths[char] = round(self.font.getlength(char) * self.scale, 4)
+                self.dirty = True
+
+    def char_width(self, char):
+        width = self.widths.get(char)
+        if width is not None:
+            return width
+        if self.font is None and self.font_file:
+            self.load_font()
+        if self.font is None:
+            return estimated_width(char)
+        self.measure(char)
+        return self.widths[char]
+
+    def text_width(self, text):
+        widths = self.widths
+        total = 0.0
+        for char in text:
+            width = widths.get(char)
+            total += width if width is not None else self.char_width(char)
+        return total
+
+    def save(self):
+        """新量到的字形宽度写回缓存（原子写入）"""
+        if not self.dirty or not self.font_file:
+            return
+        cache = self.read_cache()
+        cache[self.fontname] = {'file': self.font_file, 'widths': self.widths}
+        directory = os.path.dirname(self.cache_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.cache_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, ensure_ascii=False)
+        os.replace(tmp_path, self.cache_path)
+        self.dirty = False
+
+
+def split_words(segment):
+    """片段的词列表；没有词级时间戳（旧缓存、SRT）时按字符数在片段内插值"""
+    if segment.get('words'):
+        return segment['words']
+    pieces = re.findall(r'\s*\S+', segment['text'])
+    total = sum(len(piece.strip()) for piece in pieces) or 1
+    duration = segment['end'] - segment['start']
+    words = []
+    position = segment['start']
+    for piece in pieces:
+        end = position + duration * len(piece.strip()) / total
+        words.append({'word': piece, 'start': position, 'end': end})
+        position = end
+    return words
+
+
+class CueSegmenter:
+    def __init__(self, metrics, fontsize, max_width=None, max_lines=MAX_LINES, max_duration=MAX_DURATION,
+                 pause=PAUSE_SECONDS, outline=0):
+        self.metrics = metrics
+        self.fontsize = fontsize
+        # 宽度按相对字号计算，这里把可用宽度换算到同一单位
+        width = max_width if max_width is not None else PLAY_RES_X - 2 * MARGIN_H - 2 * outline
+        self.max_width = width / fontsize
+        self.max_lines = max_lines
+        self.max_duration = max_duration
+        self.pause = pause
+
+    @classmethod
+    def for_style(cls, style='english', fontsize=None, cache_path=DEFAULT_METRICS_CACHE, **limits):
+        """按 SUBTITLE_CONFIG 中的字幕样式（english / chinese）创建"""
+        config = SUBTITLE_CONFIG[style]
+        return cls(FontMetrics(config['fontname'], cache_path), fontsize or config['fontsize'],
+                   outline=config.get('outline', 0), **limits)
+
+    def iter_cues(self, segments):
+        """逐条产出字幕 {'start', 'end', 'text', 'lines'}；segments 可以是流式产出的生成器"""
+        words = []      # 当前字幕的词: (文本, 开始, 结束)
+        lines = []      # 每行的 [宽度, 词数]
+
+        def place(word):
+            """把词排入当前字幕；放不下时返回 False"""
+            text = word[0]
+            if lines:
+                width = self.metrics.text_width(text)
+                if lines[-1][0] + width <= self.max_width:
+                    lines[-1][0] += width
+                    lines[-1][1] += 1
+                    words.append(word)
+                    return True
+                if len(lines) >= self.max_lines:
+                    return False
+            lines.append([self.metrics.text_width(text.lstrip()), 1])  # 行首不计前导空格
+            words.append(word)
+            return True
+
+        def emit(count):
+            """输出前 count 个词为一条字幕，其余词重新排版为下一条的开头"""
+            cue_words, rest = words[:count], words[count:]
+            texts = []
+            index = 0
+            for _, line_count in lines:  # 退回到标点断开时，后面的行被截断或为空
+                line_words = cue_words[index:index + line_count]
+                index += line_count
+                if line_words:
+                    texts.append(''.join(word[0] for word in line_words).strip())
+            cue = {'start': cue_words[0][1], 'end': cue_words[-1][2], 'lines': texts, 'text': ' '.join(texts)}
+            words.clear()
+            lines.clear()
+            for word in rest:
+                place(word)
+            return cue
+
+        def break_point():
+            """超出限制时的断开位置：后半条之内的最后一个标点之后，没有时整条输出"""
+            for index in range(len(words) - 1, len(words) // 2 - 1, -1):
+                if CLAUSE_END.search(words[index][0]):
+                    return index + 1
+            return len(words)
+
+        for segment in segments:
+            for raw in split_words(segment):
+                if not raw['word'].strip():
+                    continue
+                word = (raw['word'], raw['start'], raw['end'])
+                if words and word[1] - words[-1][2] >= self.pause:
+                    yield emit(len(words))
+                while words and word[2] - words[0][1] > self.max_duration:
+                    yield emit(break_point())
+                if not place(word):
+                    yield emit(break_point())
+                    if not place(word):
+                        yield emit(len(words))
+                        place(word)
+        if words:
+            yield emit(len(words))
+        self.metrics.save()
+
+    def segment(self, segments):
+        return list(self.iter_cues(segments))
+
+
+# ---------- SRT ----------
+
+def read_srt_segments(path):
+    return [{'start': cue.start, 'end': cue.end, 'text': ' ' + cue.text} for cue in CueStore.read(path, line_sep=' ')]
+
+
+def synthetic_segments(hours, seed=3):
+    import random
+
+    rng = random.Random(seed)
+    vocabulary = ['the', 'president', 'said', 'that', 'we', 'are', 'going', 'to', 'have', 'a', 'tremendous',
+                  'day,', 'groceries', 'prices', 'war.', 'today', 'and', 'they', 'know', 'it?']
+    position = 0.0
+    while position < hours * 3600:
+        words = []
+        for _ in range(rng.randint(10, 40)):
+            start = position + rng.choice((0.0, 0.0, 0.05, 0.8))
+            position = start + rng.uniform(0.15, 0.45)
+            words.append({'word': ' ' + rng.choice(vocabulary), 'start': start, 'end': position})
+        yield {'start': words[0]['start'], 'end': words[-1]['end'], 'words': words,
+               'text': ''.join(word['word'] for word in words)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='按字体宽度、时长与停顿重新切分字幕')
+    parser.add_argument('srt', nargs='?', help='要重新切分的SRT文件')
+    parser.add_argument('--style', default='english', choices=sorted(SUBTITLE_CONFIG), help='SUBTITLE_CONFIG 中的样式')
+    parser.add_argument('--fontsize', type=float, default=None, help='烧录时的字号（默认取样式配置）')
+    parser.add_argument('--max-lines', type=int, default=MAX_LINES)
+    parser.add_argument('--max-duration', type=float, default=MAX_DURATION)
+    parser.add_argument('--output', default=None)
+    parser.add_argument('--benchmark', action='store_true')
+    parser.add_argument('--hours', type=float, default=3.0, help='基准测试的合成转录时长')
+    args = parser.parse_args()
+
+    segmenter = CueSegmenter.for_style(args.style, args.fontsize, max_lines=args.max_lines,
+                                       max_duration=args.max_duration)
+    if args.benchmark:
+        started = time.time()
+        count = sum(1 for _ in segmenter.iter_cues(synthetic_segments(args.hours)))
+        elapsed = time.time() - started
+        print(f"📊 {args.hours:g}小时合成转录切分为 {count} 条字幕，耗时 {elapsed:.2f}秒 "
+              f"(字体 {segmenter.metrics.fontname}: {segmenter.metrics.font_file or '估计宽度'})")
+        return
+    if not args.srt:
+        parser.error('需要SRT文件或 --benchmark')
+
+    from streaming_transcription import IncrementalSrtWriter
+
+    output = args.output or args.srt.replace('.srt', '_cues.srt')
+    segments = read_srt_segments(args.srt)
+    with IncrementalSrtWriter(output) as writer:
+        for cue in segmenter.iter_cues(segments):
+            writer.write(cue)
+    print(f"✅ {len(segments)} 个片段切分为 {writer.count} 条字幕: {output}")
+
+
+if __name__ == "__main__":
+    main()
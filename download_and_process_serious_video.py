@@ -14,6 +14,7 @@ import json
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from political_comedy_automation import PoliticalComedyAutomator
+from subtitle_core import write_srt
 
 def main():
     print("📺 YouTube严肃视频政治喜剧处理")
@@ -34,38 +35,8 @@ def main():
     
     print(f"📁 输出目录: {output_dir}")
     
-    # 第一步：下载完整视频
-    print(f"\n📥 第一步：下载YouTube视频...")
-    temp_video = os.path.join(output_dir, "temp_full_video.%(ext)s")
-    
-    download_cmd = [
-        "yt-dlp",
-        "--format", "best[height<=720]",  # 最大720p
-        "--output", temp_video,
-        youtube_url
-    ]
-    
-    print("执行视频下载...")
-    try:
-        result = subprocess.run(download_cmd, capture_output=True, text=True, check=True)
-        print("✅ 视频下载成功")
-        
-        # 找到实际下载的文件
-        downloaded_files = [f for f in os.listdir(output_dir) if f.startswith("temp_full_video")]
-        if not downloaded_files:
-            print("❌ 找不到下载的视频文件")
-            return
-        
-        full_video_path = os.path.join(output_dir, downloaded_files[0])
-        print(f"📹 下载文件: {downloaded_files[0]}")
-        
-    except subprocess.CalledProcessError as e:
-        print(f"❌ 视频下载失败: {e}")
-        print(f"错误输出: {e.stderr}")
-        return
-    
-    # 第二步：截取指定时间段
-    print(f"\n✂️ 第二步：截取视频片段 ({start_time}-{end_time})...")
+    # 第一步：只下载切片范围内的分片（不支持时回退到完整下载后切割）
+    print(f"\n📥 第一步：按范围下载视频片段 ({start_time}-{end_time})...")
     clipped_video = os.path.join(output_dir, f"serious_video_clip_{timestamp}.mp4")
     
     # 将时间转换为秒数
@@ -73,44 +44,23 @@ def main():
     end_seconds = time_to_seconds(end_time)
     duration = end_seconds - start_seconds
     
-    clip_cmd = [
-        "ffmpeg", "-y",
-        "-i", full_video_path,
-        "-ss", str(start_seconds),
-        "-t", str(duration),
-        "-c", "copy",  # 快速复制，不重新编码
-        clipped_video
-    ]
-    
-    print(f"截取 {duration} 秒片段...")
-    try:
-        result = subprocess.run(clip_cmd, capture_output=True, text=True, check=True)
-        print("✅ 视频截取成功")
-        
-        # 删除原始大文件
-        os.remove(full_video_path)
-        print("🗑️ 清理原始大文件")
-        
-    except subprocess.CalledProcessError as e:
-        print(f"❌ 视频截取失败: {e}")
-        print(f"错误输出: {e.stderr}")
-        return
+    if download_clip_range(youtube_url, start_seconds, end_seconds, clipped_video):
+        print("✅ 视频片段下载成功（仅下载所需分片）")
+    else:
+        print("⚠️ 按范围下载不可用，回退到完整下载")
+        if not download_full_and_cut(youtube_url, output_dir, start_seconds, duration, clipped_video):
+            return
     
     # 第三步：提取音频并生成英文字幕
     print(f"\n🔊 第三步：提取音频并生成字幕...")
-    audio_file = os.path.join(output_dir, f"serious_video_audio_{timestamp}.wav")
-    
-    audio_cmd = [
-        "ffmpeg", "-y",
-        "-i", clipped_video,
-        "-vn", "-acodec", "pcm_s16le", "-ar", "16000", "-ac", "1",
-        audio_file
-    ]
+    from audio_artifact import AudioArtifact
     
+    # 项目级PCM文件：只解码一次，后续识别、分析直接内存映射复用
+    artifact = AudioArtifact(clipped_video)
     try:
-        result = subprocess.run(audio_cmd, capture_output=True, text=True, check=True)
+        audio_file = artifact.ensure()
         print("✅ 音频提取成功")
-    except subprocess.CalledProcessError as e:
+    except Exception as e:
         print(f"❌ 音频提取失败: {e}")
         return
     
@@ -239,10 +189,6 @@ def main():
     with open(readme_file, 'w', encoding='utf-8') as f:
         f.write(readme_content)
     
-    # 清理音频文件
-    if os.path.exists(audio_file):
-        os.remove(audio_file)
-    
     # 第九步：展示处理结果
     print(f"\n🎉 严肃视频政治喜剧处理完成！")
     print(f"📂 输出目录: {output_dir}")
@@ -266,6 +212,87 @@ def main():
     
     return output_dir
 
+def download_clip_range(youtube_url, start_seconds, end_seconds, clipped_video):
+    """只下载覆盖切片范围的DASH/HLS分片，再精确切割"""
+    try:
+        import yt_dlp
+        from retry_policy import RetryPolicy
+        from segment_fetcher import SegmentFetcher
+        
+        def extract(attempt):
+            with yt_dlp.YoutubeDL({'quiet': True, 'no_warnings': True}) as ydl:
+                return ydl.extract_info(youtube_url, download=False)
+        
+        info = RetryPolicy(max_attempts=3).run(extract, youtube_url, "获取视频信息")
+        
+        fetcher = SegmentFetcher()
+        return fetcher.fetch_clip(
+            info, start_seconds, end_seconds, clipped_video,
+            format_spec='bestvideo[height<=720][ext=mp4]+bestaudio[ext=m4a]/best[height<=720]'
+        ) is not None
+    except Exception as e:
+        print(f"⚠️ 按范围下载失败: {e}")
+        return False
+
+def download_full_and_cut(youtube_url, output_dir, start_seconds, duration, clipped_video):
+    """下载完整视频后截取指定时间段（备用方案）"""
+    temp_video = os.path.join(output_dir, "temp_full_video.%(ext)s")
+    
+    download_cmd = [
+        "yt-dlp",
+        "--format", "best[height<=720]",  # 最大720p
+        "--output", temp_video,
+        youtube_url
+    ]
+    
+    print("执行视频下载...")
+    try:
+        from retry_policy import RetryPolicy
+        
+        result = RetryPolicy(max_attempts=3).run(
+            lambda attempt: subprocess.run(download_cmd, capture_output=True, text=True, check=True),
+            youtube_url, "视频下载"
+        )
+        print("✅ 视频下载成功")
+        
+        # 找到实际下载的文件
+        downloaded_files = [f for f in os.listdir(output_dir) if f.startswith("temp_full_video")]
+        if not downloaded_files:
+            print("❌ 找不到下载的视频文件")
+            return False
+        
+        full_video_path = os.path.join(output_dir, downloaded_files[0])
+        print(f"📹 下载文件: {downloaded_files[0]}")
+        
+    except subprocess.CalledProcessError as e:
+        print(f"❌ 视频下载失败: {e}")
+        print(f"错误输出: {e.stderr}")
+        return False
+    
+    clip_cmd = [
+        "ffmpeg", "-y",
+        "-i", full_video_path,
+        "-ss", str(start_seconds),
+        "-t", str(duration),
+        "-c", "copy",  # 快速复制，不重新编码
+        clipped_video
+    ]
+    
+    print(f"截取 {duration} 秒片段...")
+    try:
+        result = subprocess.run(clip_cmd, capture_output=True, text=True, check=True)
+        print("✅ 视频截取成功")
+        
+        # 删除原始大文件
+        os.remove(full_video_path)
+        print("🗑️ 清理原始大文件")
+        return True
+        
+    except subprocess.CalledProcessError as e:
+        print(f"❌ 视频截取失败: {e}")
+        print(f"错误输出: {e.stderr}")
+        return False
+
 def time_to_seconds(time_str):
     """将时间字符串转换为秒数"""
     parts = time_str.split(':')
@@ -280,24 +307,17 @@ def time_to_seconds(time_str):
 
 def create_english_subtitle_template(srt_path, duration):
     """创建英文字幕模板"""
-    with open(srt_path, 'w', encoding='utf-8') as f:
-        f.write("1\n")
-        f.write("00:00:00,000 --> 00:00:10,000\n")
-        f.write("[需要使用Whisper或手动识别英文语音]\n\n")
-        
-        f.write("2\n")
-        f.write("00:00:10,000 --> 00:00:20,000\n")
-        f.write("[请在此添加第二段英文字幕]\n\n")
-        
-        # 根据时长添加更多条目
-        segment_count = max(2, int(duration / 10))
-        for i in range(3, segment_count + 1):
-            start_time = (i-1) * 10
-            end_time = min(i * 10, duration)
-            
-            f.write(f"{i}\n")
-            f.write(f"00:00:{start_time:02d},000 --> 00:00:{end_time:02d},000\n")
-            f.write(f"[请在此添加第{i}段英文字幕]\n\n")
+    segments = [
+        {'start': 0, 'end': 10, 'text': "[需要使用Whisper或手动识别英文语音]"},
+        {'start': 10, 'end': 20, 'text': "[请在此添加第二段英文字幕]"},
+    ]
+    
+    # 根据时长添加更多条目
+    segment_count = max(2, int(duration / 10))
+    for i in range(3, segment_count + 1):
+        segments.append({'start': (i-1) * 10, 'end': min(i * 10, duration), 'text': f"[请在此添加第{i}段英文字幕]"})
+    
+    write_srt(srt_path, segments)
 
 def create_translation_template(english_srt, template_path):
     """创建翻译模板"""
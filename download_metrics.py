@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+下载指标记录 - 通过 yt-dlp 的 progress_hooks / postprocessor_hooks 记录吞吐量
+每个项目写入 <项目目录>/download_metrics.jsonl，每行一个事件:
+  attempt_start / first_byte / sample / retry / fragment_error / merge / attempt_end
+
+内置的分块下载引擎(ResumableDownloader)也会以相同格式的字典回调 progress_hook，
+分块重试时额外发送 status='fragment_error'
+
+使用方法:
+python download_metrics.py [output目录]    # 汇总所有项目的 p50/p95 吞吐量
+"""
+
+import glob
+import json
+import math
+import os
+import re
+import threading
+import time
+
+METRICS_FILENAME = "download_metrics.jsonl"
+
+
+class MetricsLogger:
+    """yt-dlp 日志适配器：原样输出，同时统计重试和分片失败"""
+
+    RETRY_PATTERN = re.compile(r'Retrying \(\d+/\d+\)')
+    FRAGMENT_PATTERN = re.compile(r'(Retrying|Skipping) fragment (\d+)')
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    def debug(self, msg):
+        if msg.startswith('[debug] '):
+            return
+        if msg.startswith('[download]') and '%' in msg:
+            print(f"\r{msg}", end='', flush=True)  # 进度行原地刷新
+        else:
+            print(msg)
+
+    def info(self, msg):
+        print(msg)
+
+    def warning(self, msg):
+        print(f"WARNING: {msg}")
+        fragment = self.FRAGMENT_PATTERN.search(msg)
+        if fragment:
+            self.metrics.record('fragment_error', fragment=int(fragment.group(2)),
+                                skipped=fragment.group(1) == 'Skipping', error=msg[:200])
+        elif self.RETRY_PATTERN.search(msg):
+            self.metrics.record('retry', error=msg[:200])
+
+    def error(self, msg):
+        print(msg)
+
+
+class DownloadMetrics:
+    """单个项目的下载指标记录器（线程安全）
+
+    创建时可以不指定项目目录：事件先缓存在内存中，bind() 后一次写入
+    """
+
+    def __init__(self, project_dir=None, url=None, sample_interval=1.0):
+        self.url = url
+        self.sample_interval = sample_interval
+        self.metrics_file = None
+        self.attempt = 0
+        self.attempt_started = None
+        self.first_byte_seen = False
+        self.files = {}          # filename -> {'bytes', 'last_time', 'last_bytes', 'last_sample'}
+        self.postprocessors = {}  # postprocessor -> 开始时间
+        self._pending = []
+        self._lock = threading.Lock()
+        if project_dir:
+            self.bind(project_dir)
+
+    def bind(self, project_dir):
+        """指定项目目录，写出之前缓存的事件"""
+        with self._lock:
+            self.metrics_file = os.path.join(project_dir, METRICS_FILENAME)
+            pending, self._pending = self._pending, []
+            self._write(pending)
+
+    def _write(self, events):
+        if not events:
+            return
+        with open(self.metrics_file, 'a', encoding='utf-8') as f:
+            for event in events:
+                f.write(json.dumps(event, ensure_ascii=False, separators=(',', ':')) + '\n')
+
+    def record(self, event, **fields):
+        entry = {'ts': round(time.time(), 3), 'event': event, 'attempt': self.attempt}
+        entry.update(fields)
+        with self._lock:
+            if self.metrics_file:
+                self._write([entry])
+            else:
+                self._pending.append(entry)
+
+    def attach(self, ydl_opts):
+        """把钩子和日志适配器加入 yt-dlp 配置"""
+        ydl_opts.setdefault('progress_hooks', []).append(self.progress_hook)
+        ydl_opts.setdefault('postprocessor_hooks', []).append(self.postprocessor_hook)
+        ydl_opts['logger'] = MetricsLogger(self)
+        return ydl_opts
+
+    # ---------- 尝试 ----------
+
+    def start_attempt(self, method, **fields):
+        self.attempt += 1
+        self.attempt_started = time.time()
+        self.first_byte_seen = False
+        self.files = {}
+        self.record('attempt_start', method=method, url=self.url, **fields)
+
+    def end_attempt(self, status, error=None, extra_bytes=0):
+        duration = time.time() - self.attempt_started if self.attempt_started else 0.0
+        total_bytes = sum(info['bytes'] for info in self.files.values()) + extra_bytes
+        self.record(
+            'attempt_end',
+            status=status,
+            bytes=total_bytes,
+            duration=round(duration, 3),
+            bytes_per_sec=round(total_bytes / duration, 1) if duration > 0 else None,
+            error=str(error)[:200] if error else None,
+        )
+
+    # ---------- 钩子 ----------
+
+    def progress_hook(self, d):
+        """yt-dlp progress_hooks 回调"""
+        status = d.get('status')
+        filename = d.get('filename') or d.get('tmpfilename') or '?'
+        now = time.time()
+
+        if status == 'fragment_error':
+            self.record('fragment_error', filename=os.path.basename(filename), error=str(d.get('error'))[:200])
+            return
+        if status == 'error':
+            self.record('download_error', filename=os.path.basename(filename))
+            return
+
+        downloaded = d.get('downloaded_bytes') or 0
+        with self._lock:
+            info = self.files.setdefault(filename, {
+                'bytes': 0, 'last_time': self.attempt_started or now, 'last_bytes': 0, 'last_sample': 0.0
+            })
+            info['bytes'] = max(info['bytes'], downloaded)
+            first_byte = downloaded > 0 and not self.first_byte_seen
+            if first_byte:
+                self.first_byte_seen = True
+            due = status == 'finished' or now - info['last_sample'] >= self.sample_interval
+            if due:
+                elapsed = now - info['last_time']
+                speed = d.get('speed')
+                if speed is None and elapsed > 0:
+                    speed = (downloaded - info['last_bytes']) / elapsed
+                info.update(last_time=now, last_bytes=downloaded, last_sample=now)
+
+        if first_byte and self.attempt_started:
+            self.record('first_byte', filename=os.path.basename(filename), ttfb=round(now - self.attempt_started, 3))
+        if due:
+            self.record(
+                'sample',
+                filename=os.path.basename(filename),
+                status=status,
+                bytes=downloaded,
+                total_bytes=d.get('total_bytes') or d.get('total_bytes_estimate'),
+                bytes_per_sec=round(speed, 1) if speed is not None else None,
+                fragment_index=d.get('fragment_index'),
+                fragment_count=d.get('fragment_count'),
+            )
+
+    def postprocessor_hook(self, d):
+        """yt-dlp postprocessor_hooks 回调，记录合并等后处理耗时"""
+        name = d.get('postprocessor')
+        if d.get('status') == 'started':
+            self.postprocessors[name] = time.time()
+        elif d.get('status') == 'finished' and name in self.postprocessors:
+            self.record('merge', postprocessor=name, duration=round(time.time() - self.postprocessors.pop(name), 3))
+
+    def record_merge(self, duration, postprocessor='ffmpeg'):
+        self.record('merge', postprocessor=postprocessor, duration=round(duration, 3))
+
+
+# ---------- 汇总 ----------
+
+def percentile(values, pct):
+    """最近秩百分位数"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def load_events(metrics_file):
+    events = []
+    with open(metrics_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    continue  # 进程中断时最后一行可能不完整
+    return events
+
+
+def summarize(output_dir="output"):
+    """汇总 output/ 下所有项目的下载指标"""
+    files = sorted(glob.glob(os.path.join(output_dir, '*', METRICS_FILENAME)))
+    sample_rates, attempt_rates, ttfbs, merges = [], [], [], []
+    projects = []
+    for metrics_file in files:
+        events = load_events(metrics_file)
+        ends = [e for e in events if e['event'] == 'attempt_end']
+        project = {
+            'project': os.path.basename(os.path.dirname(metrics_file)),
+            'attempts': len(ends),
+            'failed_attempts': sum(1 for e in ends if e.get('status') != 'ok'),
+            'retries': sum(1 for e in events if e['event'] == 'retry'),
+            'fragment_errors': sum(1 for e in events if e['event'] == 'fragment_error'),
+            'bytes': sum(e.get('bytes') or 0 for e in ends),
+        }
+        projects.append(project)
+
+        sample_rates.extend(e['bytes_per_sec'] for e in events
+                            if e['event'] == 'sample' and e.get('status') == 'downloading' and e.get('bytes_per_sec'))
+        attempt_rates.extend(e['bytes_per_sec'] for e in ends if e.get('status') == 'ok' and e.get('bytes_per_sec'))
+        ttfbs.extend(e['ttfb'] for e in events if e['event'] == 'first_byte')
+        merges.extend(e['duration'] for e in events if e['event'] == 'merge')
+
+    return {
+        'projects': projects,
+        'sample_bytes_per_sec': (percentile(sample_rates, 50), percentile(sample_rates, 95)),
+        'attempt_bytes_per_sec': (percentile(attempt_rates, 50), percentile(attempt_rates, 95)),
+        'ttfb': (percentile(ttfbs, 50), percentile(ttfbs, 95)),
+        'merge': (percentile(merges, 50), percentile(merges, 95)),
+        'retries': sum(p['retries'] for p in projects),
+        'fragment_errors': sum(p['fragment_errors'] for p in projects),
+    }
+
+
+def main():
+    import sys
+
+    output_dir = sys.argv[1] if len(sys.argv) > 1 else "output"
+    summary = summarize(output_dir)
+    if not summary['projects']:
+        print(f"📭 {output_dir}/ 下没有下载指标记录")
+        return
+
+    def mbps(value):
+        return f"{value / (1024*1024):.2f}MB/s" if value is not None else "-"
+
+    def seconds(value):
+        return f"{value:.2f}秒" if value is not None else "-"
+
+    print(f"📊 下载指标汇总 ({len(summary['projects'])} 个项目)")
+    print("=" * 50)
+    print(f"瞬时吞吐量   p50: {mbps(summary['sample_bytes_per_sec'][0])}  p95: {mbps(summary['sample_bytes_per_sec'][1])}")
+    print(f"单次尝试吞吐 p50: {mbps(summary['attempt_bytes_per_sec'][0])}  p95: {mbps(summary['attempt_bytes_per_sec'][1])}")
+    print(f"首字节时间   p50: {seconds(summary['ttfb'][0])}  p95: {seconds(summary['ttfb'][1])}")
+    print(f"合并耗时     p50: {seconds(summary['merge'][0])}  p95: {seconds(summary['merge'][1])}")
+    print(f"重试次数: {summary['retries']}  分片失败: {summary['fragment_errors']}")
+    print()
+    for project in summary['projects']:
+        print(f"  {project['project'][:50]:<50} 尝试 {project['attempts']} (失败 {project['failed_attempts']}) "
+              f"重试 {project['retries']} 分片失败 {project['fragment_errors']} {project['bytes'] / (1024*1024):.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,110 +5,177 @@
 使用更高精度的模型和优化参数来提高语音识别准确率
 """
 
+import argparse
 import os
-import sys
-import whisper
-import subprocess
-import tempfile
 from pathlib import Path
 import time
 
+from audio_artifact import load_audio
+from glossary_corrector import GlossaryCorrector
+from model_planner import ModelPlanner, describe_plan
+from parallel_transcription import SAMPLE_RATE, ParallelTranscriber, parallel_capable, should_use_parallel
+from selective_retranscription import SelectiveRetranscriber
+from subtitle_core import write_srt
+from transcription_cache import CachedWhisperModel
+from whisper_service import WhisperServiceClient, load_whisper_model
+
 class ImprovedSubtitleRecognizer:
     """改进的字幕识别器"""
     
     def __init__(self):
         self.whisper_model = None
-        self.model_size = "large-v3"  # 使用最新最高精度模型
+        self.model_size = None  # None: 加载前按内存、核数、时长与截止时间自动选择最高精度的模型
+        self.backend = None  # openai / ctranslate2（int8量化，CPU上large-v3快数倍）；None 时取环境变量 WHISPER_BACKEND
+        self.deadline = None  # 允许的识别总时间（秒），None 表示不限时
+        self.planner = ModelPlanner()
+        self.load_seconds = None
+        self.last_hit = False
+        self.show = None  # 节目词表名：glossaries/<show>.txt（default.txt 总是加载）
+        self.glossary = None
+        self.two_tier = True  # 快速模型全量识别 + 高精度模型只重新识别可疑片段
+        self.fast_model_size = 'base'
         
+    def plan_model(self, duration, mode='full'):
+        """加载之前选择模型：估计各模型的耗时与内存，选能按时完成的最高精度模型"""
+        status = WhisperServiceClient().ping()
+        plan = self.planner.plan(duration, self.deadline, self.backend, mode,
+                                 loaded_models=status['models'] if status else ())
+        print(describe_plan(plan))
+        self.model_size = plan['model']
+        return plan
+    
     def load_whisper_model(self, model_size=None):
-        """加载更高精度的Whisper模型"""
+        """加载Whisper模型（由 plan_model 选定或显式指定）"""
         if model_size:
             self.model_size = model_size
             
-        print(f"🔄 加载Whisper {self.model_size} 模型（高精度版本）...")
+        print(f"🔄 加载Whisper {self.model_size} 模型...")
+        started = time.time()
+        self.whisper_model = load_whisper_model(self.model_size, backend=self.backend)  # 常驻服务运行时直接复用
+        self.load_seconds = time.time() - started
+        print(f"✅ Whisper模型加载成功 ({self.load_seconds:.1f}秒)")
+        return True
+    
+    def preprocess_audio(self, video_path):
+        """预处理音频以提高识别质量：使用项目级PCM文件的人声滤波版本（不写临时WAV）"""
         try:
-            self.whisper_model = whisper.load_model(self.model_size)
-            print(f"✅ 高精度Whisper模型加载成功")
-            return True
+            print(f"🔄 预处理音频以提高识别质量...")
+            audio = load_audio(video_path, variant='speech')  # 高通200Hz + 低通3000Hz 减少噪音
+            print(f"✅ 音频预处理完成")
+            return audio
         except Exception as e:
-            print(f"❌ 高精度模型加载失败，尝试medium模型: {e}")
+            print(f"⚠️ 音频预处理异常: {e}，使用原始文件")
+            return video_path
+    
+    def use_parallel(self, duration):
+        return parallel_capable() and should_use_parallel(duration) and WhisperServiceClient().ping() is None
+    
+    def transcribe_parallel(self, audio, options):
+        """长音频在多核机器上按VAD切块并行识别；失败时返回None"""
+        try:
+            transcriber = ParallelTranscriber(self.model_size, backend=self.backend)
             try:
-                self.model_size = "medium"
-                self.whisper_model = whisper.load_model("medium")
-                print(f"✅ Medium模型加载成功")
-                return True
-            except Exception as e2:
-                print(f"❌ Medium模型也失败，使用base模型: {e2}")
-                self.model_size = "base"
-                self.whisper_model = whisper.load_model("base")
-                return True
+                model = CachedWhisperModel(transcriber, self.model_size, variant="vad-parallel")
+                result = model.transcribe(audio, **options)
+                self.last_hit = model.last_hit
+                return result
+            finally:
+                transcriber.close()
+        except Exception as e:
+            print(f"⚠️ 并行识别失败，改用单模型识别: {e}")
+            return None
     
-    def preprocess_audio(self, video_path):
-        """预处理音频以提高识别质量"""
+    def decode_options(self):
+        """高精度识别的解码参数"""
+        return dict(
+            language="en",  # 明确指定英文
+            task="transcribe",  # 转录任务
+            temperature=0.0,  # 降低随机性，提高一致性
+            best_of=5,  # 尝试5次取最佳结果
+            beam_size=5,  # 使用束搜索
+            patience=1.0,  # 耐心参数
+            length_penalty=1.0,  # 长度惩罚
+            suppress_tokens=[-1],  # 抑制特定token
+            initial_prompt="This is a political comedy show with clear English speech. Common words include: groceries, eggs, politics, Trump, Iran, Israel, war.",  # 上下文提示
+            condition_on_previous_text=True,  # 基于前文推断
+            fp16=False,  # 不使用半精度以提高准确性
+            compression_ratio_threshold=2.4,
+            logprob_threshold=-1.0,
+            no_speech_threshold=0.6
+        )
+    
+    def transcribe_two_tier(self, audio):
+        """两级识别：快速模型全量识别，只把低置信度/词表误识别的片段交给高精度模型重新识别"""
+        print(f"🔄 开始两级识别（快速模型 {self.fast_model_size}）...")
+        if self.glossary is None:
+            self.glossary = GlossaryCorrector.for_show(self.show)
+        
         try:
-            # 创建临时音频文件
-            temp_audio = tempfile.NamedTemporaryFile(suffix='.wav', delete=False)
-            temp_audio.close()
+            audio = load_audio(audio)
+            fast_model = load_whisper_model(self.fast_model_size, backend=self.backend)
+            load_seconds = None
             
-            # 使用ffmpeg提取高质量音频
-            cmd = [
-                'ffmpeg', '-i', video_path,
-                '-vn',  # 不要视频
-                '-acodec', 'pcm_s16le',  # 16位PCM
-                '-ar', '16000',  # 16kHz采样率
-                '-ac', '1',  # 单声道
-                '-af', 'highpass=f=200,lowpass=f=3000',  # 滤波器减少噪音
-                '-y',  # 覆盖输出文件
-                temp_audio.name
-            ]
+            def load_accurate(seconds):
+                # 按实际需要重新识别的秒数选择模型，截止时间内往往可以用更大的模型
+                nonlocal load_seconds
+                if self.model_size is None:
+                    self.plan_model(seconds)
+                if not self.whisper_model:
+                    self.load_whisper_model()
+                    load_seconds = self.load_seconds
+                return self.whisper_model
             
-            print(f"🔄 预处理音频以提高识别质量...")
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            retranscriber = SelectiveRetranscriber(fast_model, load_accurate, glossary=self.glossary)
+            # 贪心解码：beam_size 必须显式为1，faster-whisper 会忽略None并回到默认的 beam_size=5
+            fast_options = dict(self.decode_options(), best_of=None, beam_size=1, patience=None)
+            segments = retranscriber.transcribe(audio, fast_options, self.decode_options())
+            stats = retranscriber.last_stats
+            print(retranscriber.describe())
+            
+            if stats['spans'] and not self.whisper_model.last_hit:
+                self.planner.record(self.model_size, self.backend, stats['redecoded_seconds'],
+                                    stats['decode_seconds'], load_seconds)
+            print(f"📊 识别出 {len(segments)} 个片段")
+            return segments
             
-            if result.returncode == 0:
-                print(f"✅ 音频预处理完成")
-                return temp_audio.name
-            else:
-                print(f"⚠️ 音频预处理失败，使用原始文件")
-                os.unlink(temp_audio.name)
-                return video_path
-                
         except Exception as e:
-            print(f"⚠️ 音频预处理异常: {e}，使用原始文件")
-            return video_path
+            print(f"❌ 两级识别失败: {e}")
+            return None
     
-    def transcribe_with_improved_params(self, audio_path):
-        """使用优化参数进行语音识别"""
-        if not self.whisper_model:
-            self.load_whisper_model()
-        
+    def transcribe_with_improved_params(self, audio):
+        """使用优化参数进行语音识别（audio: 音频数组或媒体文件路径）"""
         print(f"🔄 开始高精度语音识别...")
-        print(f"📊 使用模型: {self.model_size}")
         
         start_time = time.time()
         
         try:
-            # 使用优化的参数
-            result = self.whisper_model.transcribe(
-                audio_path,
-                language="en",  # 明确指定英文
-                task="transcribe",  # 转录任务
-                temperature=0.0,  # 降低随机性，提高一致性
-                best_of=5,  # 尝试5次取最佳结果
-                beam_size=5,  # 使用束搜索
-                patience=1.0,  # 耐心参数
-                length_penalty=1.0,  # 长度惩罚
-                suppress_tokens=[-1],  # 抑制特定token
-                initial_prompt="This is a political comedy show with clear English speech. Common words include: groceries, eggs, politics, Trump, Iran, Israel, war.",  # 上下文提示
-                condition_on_previous_text=True,  # 基于前文推断
-                fp16=False,  # 不使用半精度以提高准确性
-                compression_ratio_threshold=2.4,
-                logprob_threshold=-1.0,
-                no_speech_threshold=0.6
-            )
+            audio = load_audio(audio)
+            duration = len(audio) / SAMPLE_RATE
+            mode = 'parallel' if self.use_parallel(duration) else 'full'
+            if self.model_size is None:
+                self.plan_model(duration, mode)
+            print(f"📊 使用模型: {self.model_size}")
+            
+            options = self.decode_options()
+            result = self.transcribe_parallel(audio, options) if mode == 'parallel' else None
+            load_seconds = None
+            if result is None:
+                mode = 'full'
+                if not self.whisper_model:
+                    self.load_whisper_model()
+                    load_seconds = self.load_seconds
+                transcribe_started = time.time()
+                result = self.whisper_model.transcribe(audio, **options)
+                self.last_hit = self.whisper_model.last_hit
+            else:
+                transcribe_started = start_time
             
             end_time = time.time()
             print(f"✅ 高精度识别完成，耗时 {end_time - start_time:.1f}秒")
+            if not self.last_hit:
+                # 记录实测耗时，供下次选择模型时估计RTF
+                self.planner.record(self.model_size, self.backend, duration, end_time - transcribe_started,
+                                    load_seconds, mode)
             
             segments = result.get("segments", [])
             print(f"📊 识别出 {len(segments)} 个片段")
@@ -125,57 +192,12 @@ class ImprovedSubtitleRecognizer:
             return None
     
     def post_process_segments(self, segments):
-        """后处理识别结果，修复常见错误"""
+        """后处理识别结果：按节目词表一次扫描修正常见误识别和专有名词写法"""
         print(f"🔄 后处理识别结果，修复常见错误...")
         
-        # 常见错误修正词典
-        corrections = {
-            # 政治相关
-            "rosary's": "groceries",
-            "rosary": "groceries", 
-            "rosaries": "groceries",
-            "grocery's": "groceries",
-            "groceries a down": "groceries are down",
-            "rosary's a down": "groceries are down",
-            "rosary a down": "groceries are down",
-            
-            # 人名修正
-            "ted crews": "ted cruz",
-            "tucker karlson": "tucker carlson",
-            "tucker carlsen": "tucker carlson",
-            
-            # 常见词汇
-            "iran's": "iran",
-            "israel's": "israel",
-            "polls": "polls",
-            "poll": "poll",
-            
-            # 语法修正
-            " a down": " are down",
-            " is down": " are down",
-        }
-        
-        corrected_count = 0
-        for segment in segments:
-            original_text = segment['text']
-            corrected_text = original_text.lower()
-            
-            # 应用修正
-            for wrong, correct in corrections.items():
-                if wrong in corrected_text:
-                    corrected_text = corrected_text.replace(wrong, correct)
-                    corrected_count += 1
-            
-            # 恢复大小写（简单处理）
-            if corrected_text != original_text.lower():
-                # 句首大写
-                corrected_text = corrected_text.capitalize()
-                # 专有名词大写
-                proper_nouns = ["trump", "donald", "ted cruz", "tucker carlson", "iran", "israel", "biden", "america", "american"]
-                for noun in proper_nouns:
-                    corrected_text = corrected_text.replace(noun, noun.title())
-                
-                segment['text'] = corrected_text
+        if self.glossary is None:
+            self.glossary = GlossaryCorrector.for_show(self.show)
+        corrected_count = self.glossary.correct_segments(segments)
         
         if corrected_count > 0:
             print(f"✅ 修正了 {corrected_count} 个常见错误")
@@ -187,15 +209,7 @@ class ImprovedSubtitleRecognizer:
     def save_improved_subtitles(self, segments, output_path):
         """保存改进后的字幕"""
         try:
-            with open(output_path, 'w', encoding='utf-8') as f:
-                for i, segment in enumerate(segments, 1):
-                    start_time = self.format_time_srt(segment['start'])
-                    end_time = self.format_time_srt(segment['end'])
-                    text = segment['text'].strip()
-                    
-                    f.write(f"{i}\n")
-                    f.write(f"{start_time} --> {end_time}\n")
-                    f.write(f"{text}\n\n")
+            write_srt(output_path, segments)
             
             print(f"✅ 改进版字幕已保存: {output_path}")
             return True
@@ -204,14 +218,6 @@ class ImprovedSubtitleRecognizer:
             print(f"❌ 字幕保存失败: {e}")
             return False
     
-    def format_time_srt(self, seconds):
-        """将秒数转换为SRT时间格式"""
-        hours = int(seconds // 3600)
-        minutes = int((seconds % 3600) // 60)
-        secs = int(seconds % 60)
-        milliseconds = int((seconds - int(seconds)) * 1000)
-        return f"{hours:02d}:{minutes:02d}:{secs:02d},{milliseconds:03d}"
-    
     def improve_existing_subtitles(self, video_path, original_srt_path):
         """改进现有字幕文件"""
         print("🚀 开始改进现有字幕识别质量")
@@ -220,38 +226,43 @@ class ImprovedSubtitleRecognizer:
         # 1. 预处理音频
         processed_audio = self.preprocess_audio(video_path)
         
-        try:
-            # 2. 重新识别
+        # 2. 重新识别（默认两级识别：只有可疑片段使用高精度模型）
+        if self.two_tier:
+            segments = self.transcribe_two_tier(processed_audio)
+        else:
             segments = self.transcribe_with_improved_params(processed_audio)
+        
+        if segments:
+            # 3. 后处理
+            segments = self.post_process_segments(segments)
             
-            if segments:
-                # 3. 后处理
-                segments = self.post_process_segments(segments)
-                
-                # 4. 保存改进版本
-                improved_path = original_srt_path.replace('.srt', '_improved.srt')
-                if self.save_improved_subtitles(segments, improved_path):
-                    print(f"\n✅ 字幕识别改进完成!")
-                    print(f"   原始文件: {original_srt_path}")
-                    print(f"   改进文件: {improved_path}")
-                    print(f"   共 {len(segments)} 个字幕片段")
-                    return improved_path
-            
-        finally:
-            # 清理临时文件
-            if processed_audio != video_path and os.path.exists(processed_audio):
-                os.unlink(processed_audio)
+            # 4. 保存改进版本
+            improved_path = original_srt_path.replace('.srt', '_improved.srt')
+            if self.save_improved_subtitles(segments, improved_path):
+                print(f"\n✅ 字幕识别改进完成!")
+                print(f"   原始文件: {original_srt_path}")
+                print(f"   改进文件: {improved_path}")
+                print(f"   共 {len(segments)} 个字幕片段")
+                return improved_path
         
         return None
 
 def main():
     """主函数：改进现有项目的字幕识别"""
-    if len(sys.argv) != 2:
-        print("使用方法: python improved_subtitle_recognition.py <项目目录>")
-        print("例如: python improved_subtitle_recognition.py output/Ted_Cruz_&_Tucker_Carlson_Battle_Over_Iran_While_T_20250623_172209")
-        return
+    parser = argparse.ArgumentParser(
+        description='改进现有项目的字幕识别',
+        epilog='例如: python improved_subtitle_recognition.py output/Ted_Cruz_&_Tucker_Carlson_Battle_Over_Iran_While_T_20250623_172209 --deadline 600'
+    )
+    parser.add_argument('project_dir', help='项目目录')
+    parser.add_argument('--deadline', type=float, default=None, help='允许的识别总时间（秒），据此自动选择模型')
+    parser.add_argument('--model', default=None, help='指定模型（不自动选择）')
+    parser.add_argument('--backend', default=None, help='推理后端: openai / ctranslate2')
+    parser.add_argument('--show', default=None, help='节目词表名（glossaries/<名称>.txt）')
+    parser.add_argument('--fast-model', default='base', help='两级识别中全量识别用的快速模型')
+    parser.add_argument('--full', action='store_true', help='整段使用高精度模型识别（不用两级识别）')
+    args = parser.parse_args()
     
-    project_dir = sys.argv[1]
+    project_dir = args.project_dir
     
     if not os.path.exists(project_dir):
         print(f"❌ 项目目录不存在: {project_dir}")
@@ -290,6 +301,12 @@ def main():
     
     # 开始改进
     recognizer = ImprovedSubtitleRecognizer()
+    recognizer.model_size = args.model
+    recognizer.backend = args.backend
+    recognizer.deadline = args.deadline
+    recognizer.show = args.show
+    recognizer.fast_model_size = args.fast_model
+    recognizer.two_tier = not args.full
     improved_srt = recognizer.improve_existing_subtitles(video_file, subtitle_file)
     
     if improved_srt:
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+全局媒体库 - 内容寻址存储，重复运行和新项目复用已下载的视频
+特点：按 (视频ID, 格式ID, 切片范围) 和内容哈希索引、项目内使用硬链接/reflink、引用计数与垃圾回收
+
+目录结构:
+  output/.media_store/
+    index.sqlite3            # 索引
+    objects/ab/abcdef...mp4  # 按SHA256存放的媒体文件
+
+使用方法:
+python media_store.py --stats
+python media_store.py --gc [--grace 天数]
+"""
+
+import hashlib
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+
+
+def clip_range_key(start_seconds=None, end_seconds=None):
+    """切片范围的规范化表示，完整视频为 full"""
+    if start_seconds is None or end_seconds is None:
+        return "full"
+    return f"{float(start_seconds):.3f}-{float(end_seconds):.3f}"
+
+
+def guess_video_id(url):
+    """不访问网络，仅从URL推断视频ID（用于下载前查库）"""
+    try:
+        import yt_dlp
+        for extractor in yt_dlp.extractor.gen_extractor_classes():
+            if extractor.ie_key() != 'Generic' and extractor.suitable(url):
+                return extractor.get_temp_id(url)
+    except Exception:
+        pass
+    return None
+
+
+class MediaStore:
+    """内容寻址的媒体库"""
+
+    def __init__(self, root="output/.media_store"):
+        self.root = root
+        self.objects_dir = os.path.join(root, "objects")
+        self.db_path = os.path.join(root, "index.sqlite3")
+        self._local = threading.local()
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self._init_schema()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._connect()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS objects (
+                hash TEXT PRIMARY KEY,
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS source_keys (
+                video_id TEXT NOT NULL,
+                format_id TEXT NOT NULL,
+                clip_range TEXT NOT NULL,
+                format_spec TEXT,
+                title TEXT,
+                hash TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (video_id, format_id, clip_range)
+            );
+            CREATE INDEX IF NOT EXISTS idx_source_keys_spec ON source_keys(video_id, format_spec, clip_range);
+            CREATE TABLE IF NOT EXISTS links (
+                link_path TEXT PRIMARY KEY,
+                hash TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_links_hash ON links(hash);
+            CREATE TABLE IF NOT EXISTS file_hashes (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                inode INTEGER NOT NULL,
+                hash TEXT NOT NULL
+            );
+        """)
+
+    # ---------- 哈希 ----------
+
+    def hash_file(self, file_path):
+        """计算SHA256，按 (路径, 大小, mtime, inode) 缓存，避免重复读取大文件"""
+        stat = os.stat(file_path)
+        abs_path = os.path.abspath(file_path)
+        conn = self._connect()
+        row = conn.execute(
+            'SELECT hash FROM file_hashes WHERE path = ? AND size = ? AND mtime_ns = ? AND inode = ?',
+            (abs_path, stat.st_size, stat.st_mtime_ns, stat.st_ino)
+        ).fetchone()
+        if row:
+            return row[0]
+
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(4 * 1024 * 1024), b''):
+                digest.update(chunk)
+        content_hash = digest.hexdigest()
+
+        conn.execute(
+            'INSERT OR REPLACE INTO file_hashes (path, size, mtime_ns, inode, hash) VALUES (?, ?, ?, ?, ?)',
+            (abs_path, stat.st_size, stat.st_mtime_ns, stat.st_ino, content_hash)
+        )
+        return content_hash
+
+    def object_path(self, content_hash, ext):
+        return os.path.join(self.objects_dir, content_hash[:2], f"{content_hash}{ext}")
+
+    # ---------- 查询 ----------
+
+    def lookup(self, video_id, format_id, clip_range="full"):
+        """按 (视频ID, 格式ID, 切片范围) 精确查询"""
+        row = self._connect().execute(
+            'SELECT hash, title FROM source_keys WHERE video_id = ? AND format_id = ? AND clip_range = ?',
+            (video_id, format_id, clip_range)
+        ).fetchone()
+        return self._resolve(row)
+
+    def lookup_by_spec(self, video_id, format_spec, clip_range="full"):
+        """按格式选择表达式查询最近一次下载结果（不需要先获取视频信息）"""
+        row = self._connect().execute(
+            'SELECT hash, title FROM source_keys WHERE video_id = ? AND format_spec = ? AND clip_range = ? '
+            'ORDER BY created_at DESC LIMIT 1',
+            (video_id, format_spec, clip_range)
+        ).fetchone()
+        return self._resolve(row)
+
+    def _resolve(self, row):
+        if row is None:
+            return None
+        obj = self._connect().execute('SELECT path, size FROM objects WHERE hash = ?', (row[0],)).fetchone()
+        if obj is None or not os.path.exists(obj[0]):
+            return None
+        return {'hash': row[0], 'title': row[1], 'path': obj[0], 'size': obj[1]}
+
+    # ---------- 写入 ----------
+
+    def ingest(self, file_path, video_id=None, format_id=None, clip_range="full",
+               format_spec=None, title=None, move=False):
+        """把文件放入媒体库，返回内容哈希
+
+        move=True: 文件移入媒体库（同一文件系统内为重命名），原路径替换为链接
+        move=False: reflink（写时复制）或复制进媒体库，原文件保持独立
+        """
+        content_hash = self.hash_file(file_path)
+        ext = os.path.splitext(file_path)[1]
+        target = self.object_path(content_hash, ext)
+        now = time.time()
+
+        conn = self._connect()
+        existing = conn.execute('SELECT path FROM objects WHERE hash = ?', (content_hash,)).fetchone()
+        if existing and os.path.exists(existing[0]):
+            target = existing[0]
+            if move:
+                if not os.path.samefile(file_path, target):
+                    os.remove(file_path)
+                self.link_into(content_hash, file_path)  # 同一文件时只登记引用
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            if move:
+                shutil.move(file_path, target)
+            else:
+                # 不能硬链接用户自己的文件：之后原地修改它会悄悄改坏库中的对象
+                temp_target = target + '.tmp'
+                if not self._reflink(file_path, temp_target):
+                    shutil.copy2(file_path, temp_target)
+                os.replace(temp_target, target)
+            conn.execute(
+                'INSERT OR REPLACE INTO objects (hash, path, size, created_at, last_used) VALUES (?, ?, ?, ?, ?)',
+                (content_hash, target, os.path.getsize(target), now, now)
+            )
+            if move:
+                self.link_into(content_hash, file_path)
+
+        if video_id and format_id:
+            conn.execute("""
+                INSERT OR REPLACE INTO source_keys
+                    (video_id, format_id, clip_range, format_spec, title, hash, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (video_id, format_id, clip_range, format_spec, title, content_hash, now))
+        return content_hash
+
+    def link_into(self, content_hash, dest_path):
+        """在项目目录中创建指向媒体库对象的硬链接（不可用时使用reflink，最后才复制）"""
+        obj = self._connect().execute('SELECT path FROM objects WHERE hash = ?', (content_hash,)).fetchone()
+        if obj is None:
+            raise KeyError(f"媒体库中不存在对象: {content_hash}")
+        source = obj[0]
+
+        os.makedirs(os.path.dirname(os.path.abspath(dest_path)), exist_ok=True)
+        if os.path.exists(dest_path):
+            if os.path.samefile(source, dest_path):
+                self._record_link(content_hash, dest_path)
+                return dest_path
+            os.remove(dest_path)
+
+        try:
+            os.link(source, dest_path)
+        except OSError:
+            if not self._reflink(source, dest_path):
+                print(f"⚠️ 无法创建硬链接或reflink，复制文件: {os.path.basename(dest_path)}")
+                shutil.copy2(source, dest_path)
+
+        self._record_link(content_hash, dest_path)
+        return dest_path
+
+    def _record_link(self, content_hash, dest_path):
+        conn = self._connect()
+        now = time.time()
+        conn.execute(
+            'INSERT OR REPLACE INTO links (link_path, hash, created_at) VALUES (?, ?, ?)',
+            (os.path.abspath(dest_path), content_hash, now)
+        )
+        conn.execute('UPDATE objects SET last_used = ? WHERE hash = ?', (now, content_hash))
+
+    @staticmethod
+    def _reflink(source, dest_path):
+        """写时复制克隆（Linux: btrfs/xfs，macOS: APFS）"""
+        cmd = ['cp', '-c', source, dest_path] if sys.platform == 'darwin' else ['cp', '--reflink=always', source, dest_path]
+        try:
+            return subprocess.run(cmd, capture_output=True).returncode == 0
+        except OSError:
+            return False
+
+    def release(self, link_path):
+        """删除项目中的链接并减少引用计数"""
+        abs_path = os.path.abspath(link_path)
+        self._connect().execute('DELETE FROM links WHERE link_path = ?', (abs_path,))
+        if os.path.exists(abs_path):
+            os.remove(abs_path)
+
+    def refcount(self, content_hash):
+        return self._connect().execute('SELECT COUNT(*) FROM links WHERE hash = ?', (content_hash,)).fetchone()[0]
+
+    # ---------- 垃圾回收 ----------
+
+    def gc(self, grace_seconds=7 * 86400, dry_run=False):
+        """清理失效链接，删除无引用且超过保留期的对象，返回 (删除对象数, 释放字节数)"""
+        conn = self._connect()
+
+        # 1. 项目已删除或文件被替换的链接不再计入引用
+        for link_path, content_hash in conn.execute('SELECT link_path, hash FROM links').fetchall():
+            obj = conn.execute('SELECT path FROM objects WHERE hash = ?', (content_hash,)).fetchone()
+            stale = not os.path.exists(link_path)
+            if not stale and obj and os.path.exists(obj[0]):
+                link_stat, obj_stat = os.stat(link_path), os.stat(obj[0])
+                stale = link_stat.st_size != obj_stat.st_size
+            if stale and not dry_run:
+                conn.execute('DELETE FROM links WHERE link_path = ?', (link_path,))
+
+        # 2. 删除无引用的对象
+        cutoff = time.time() - grace_seconds
+        removed, freed = 0, 0
+        rows = conn.execute("""
+            SELECT hash, path, size FROM objects
+            WHERE last_used < ? AND hash NOT IN (SELECT hash FROM links)
+        """, (cutoff,)).fetchall()
+        for content_hash, path, size in rows:
+            removed += 1
+            freed += size
+            if dry_run:
+                continue
+            if os.path.exists(path):
+                os.remove(path)
+            conn.execute('DELETE FROM source_keys WHERE hash = ?', (content_hash,))
+            conn.execute('DELETE FROM objects WHERE hash = ?', (content_hash,))
+        return removed, freed
+
+    def stats(self):
+        conn = self._connect()
+        count, total = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM objects').fetchone()
+        links = conn.execute('SELECT COUNT(*) FROM links').fetchone()[0]
+        return {'objects': count, 'bytes': total, 'links': links}
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='全局媒体库管理')
+    parser.add_argument('--root', default='output/.media_store', help='媒体库目录')
+    parser.add_argument('--gc', action='store_true', help='垃圾回收无引用的对象')
+    parser.add_argument('--grace', type=float, default=7, help='无引用对象的保留天数')
+    parser.add_argument('--dry-run', action='store_true', help='只统计不删除')
+    parser.add_argument('--stats', action='store_true', help='显示媒体库统计')
+    args = parser.parse_args()
+
+    store = MediaStore(args.root)
+    if args.gc:
+        removed, freed = store.gc(grace_seconds=args.grace * 86400, dry_run=args.dry_run)
+        action = "可清理" if args.dry_run else "已清理"
+        print(f"🗑️ {action} {removed} 个对象，释放 {freed / (1024 * 1024):.1f}MB")
+
+    stats = store.stats()
+    print(f"📦 媒体库: {stats['objects']} 个对象, {stats['bytes'] / (1024 * 1024):.1f}MB, {stats['links']} 个项目链接")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Whisper模型选择 - 加载之前按可用内存、CPU核数、音频时长和截止时间选出能按时完成的最高精度模型
+特点：
+- 实时率(RTF)与加载时间取本机历史记录的中位数（按模型/后端/并行方式区分），没有记录时使用保守的默认估计
+- 常驻服务已加载的模型不占用额外内存、没有加载时间
+- 每次实际转录后记录耗时，估计会越来越准
+
+历史记录: output/.transcription_history.jsonl，每行一次转录
+  {"time", "model", "backend", "mode", "cores", "audio_seconds", "seconds", "load_seconds"}
+
+使用方法:
+python model_planner.py --duration 1800 --deadline 900       # 30分钟音频，15分钟内完成
+python model_planner.py --history                            # 查看各模型的实测RTF
+"""
+
+import argparse
+import json
+import os
+import statistics
+import threading
+import time
+
+from parallel_transcription import INT8_MEMORY_RATIO, MODEL_MEMORY_GB, available_memory_gb, default_workers
+from transcription_backends import model_label, resolve_backend
+
+DEFAULT_HISTORY = os.path.join("output", ".transcription_history.jsonl")
+
+# 按精度从高到低排列的候选模型
+MODEL_CANDIDATES = ['large-v3', 'turbo', 'medium', 'small', 'base', 'tiny']
+
+# 没有历史记录时的默认估计：openai-whisper fp32 在8核CPU上的实时率与加载秒数（偏保守）
+DEFAULT_RTF = {'tiny': 0.05, 'base': 0.1, 'small': 0.3, 'medium': 0.8, 'turbo': 0.6, 'large-v3': 1.6}
+DEFAULT_LOAD_SECONDS = {'tiny': 1, 'base': 2, 'small': 5, 'medium': 12, 'turbo': 15, 'large-v3': 25}
+REFERENCE_CORES = 8
+CORE_SCALING = 0.7        # 线程数增加时的加速并非线性
+INT8_RTF_RATIO = 0.3      # CTranslate2 int8 相对 openai-whisper fp32
+PARALLEL_EFFICIENCY = 0.8
+SAFETY_MARGIN = 1.2       # 估计耗时乘以此系数后再与截止时间比较
+MEMORY_HEADROOM = 1.2
+HISTORY_WINDOW = 20       # 只看最近的记录
+
+
+class ModelPlanner:
+    def __init__(self, history_path=DEFAULT_HISTORY, candidates=MODEL_CANDIDATES):
+        self.history_path = history_path
+        self.candidates = list(candidates)
+        self._lock = threading.Lock()
+
+    # ---------- 历史记录 ----------
+
+    def load_history(self):
+        records = []
+        if not os.path.exists(self.history_path):
+            return records
+        with open(self.history_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue  # 写入中断留下的半行
+        return records
+
+    def record(self, model, backend, audio_seconds, seconds, load_seconds=None, mode='full'):
+        """记录一次实际转录（命中缓存的结果不要记录）"""
+        if audio_seconds <= 0 or seconds <= 0:
+            return
+        entry = {
+            'time': round(time.time(), 3),
+            'model': model,
+            'backend': resolve_backend(backend),
+            'mode': mode,
+            'cores': os.cpu_count() or 1,
+            'audio_seconds': round(audio_seconds, 2),
+            'seconds': round(seconds, 2),
+            'load_seconds': round(load_seconds, 2) if load_seconds is not None else None,
+        }
+        directory = os.path.dirname(self.history_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock, open(self.history_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+    # ---------- 估计 ----------
+
+    @staticmethod
+    def core_factor(from_cores, to_cores):
+        """from_cores 核上的耗时换算到 to_cores 核"""
+        return (max(1, from_cores) / max(1, to_cores)) ** CORE_SCALING
+
+    def estimate(self, model, backend, mode, cores, history):
+        """返回 (RTF, 加载秒数, 依据)；RTF 已换算到当前核数"""
+        matching = [entry for entry in history
+                    if entry.get('model') == model and entry.get('backend') == backend and entry.get('mode') == mode][-HISTORY_WINDOW:]
+        if matching:
+            rtf = statistics.median(entry['seconds'] / entry['audio_seconds'] * self.core_factor(entry['cores'], cores)
+                                    for entry in matching)
+            loads = [entry['load_seconds'] for entry in matching if entry.get('load_seconds') is not None]
+            load_seconds = statistics.median(loads) if loads else DEFAULT_LOAD_SECONDS.get(model, 20)
+            return rtf, load_seconds, f"历史 {len(matching)} 次"
+
+        rtf = DEFAULT_RTF.get(model, 2.0) * self.core_factor(REFERENCE_CORES, cores)
+        if backend == 'ctranslate2':
+            rtf *= INT8_RTF_RATIO
+        if mode == 'parallel':
+            workers = default_workers(model, backend=backend)
+            rtf = rtf * self.core_factor(max(1, cores // workers), cores) / (workers * PARALLEL_EFFICIENCY)
+        return rtf, DEFAULT_LOAD_SECONDS.get(model, 20), "默认估计"
+
+    @staticmethod
+    def memory_needed(model, backend):
+        memory = MODEL_MEMORY_GB.get(model, 5.0)
+        if backend == 'ctranslate2':
+            memory *= INT8_MEMORY_RATIO
+        return memory * MEMORY_HEADROOM
+
+    def plan(self, duration, deadline=None, backend=None, mode='full', memory_gb=None, cores=None, loaded_models=()):
+        """选出能在截止时间内完成、内存放得下的最高精度模型
+
+        duration: 音频秒数；deadline: 允许的总秒数（含加载），None 表示不限时
+        loaded_models: 常驻服务中已加载的模型标识（见 transcription_backends.model_label）
+        返回 {'model', 'backend', 'rtf', 'estimated_seconds', 'memory_gb', 'basis', 'fits', 'rejected'}
+        """
+        backend = resolve_backend(backend)
+        cores = cores or os.cpu_count() or 1
+        if memory_gb is None:
+            memory_gb = available_memory_gb()
+        history = self.load_history()
+
+        rejected = []
+        options = []
+        for model in self.candidates:
+            loaded = model_label(model, backend) in loaded_models
+            rtf, load_seconds, basis = self.estimate(model, backend, mode, cores, history)
+            if loaded:
+                load_seconds = 0.0
+            estimated = (load_seconds + rtf * duration) * SAFETY_MARGIN
+            memory = 0.0 if loaded else self.memory_needed(model, backend)  # 并行时进程数按内存自动收缩，至少需要一份
+            option = {
+                'model': model,
+                'backend': backend,
+                'rtf': rtf,
+                'estimated_seconds': estimated,
+                'memory_gb': memory,
+                'basis': basis + ('，服务已加载' if loaded else ''),
+                'fits': True,
+                'rejected': rejected,
+            }
+            options.append(option)
+
+            if memory_gb is not None and memory > memory_gb:
+                rejected.append((model, f"需要 {memory:.1f}GB 内存，可用 {memory_gb:.1f}GB"))
+                continue
+            if deadline is not None and estimated > deadline:
+                rejected.append((model, f"预计 {estimated:.0f}秒 > 截止 {deadline:.0f}秒 (RTF {rtf:.2f}, {basis})"))
+                continue
+            return option
+
+        # 没有能按时完成的模型：选内存放得下的最快模型
+        fallback = [option for option in options if memory_gb is None or option['memory_gb'] <= memory_gb]
+        choice = min(fallback or options, key=lambda option: option['estimated_seconds'])
+        choice['fits'] = False
+        return choice
+
+
+def describe_plan(plan):
+    lines = [f"🧠 模型选择: {model_label(plan['model'], plan['backend'])} "
+             f"(预计 {plan['estimated_seconds']:.0f}秒, RTF {plan['rtf']:.2f}, {plan['basis']})"]
+    for model, reason in plan['rejected']:
+        lines.append(f"   ⏭️  跳过 {model}: {reason}")
+    if not plan['fits']:
+        lines.append("   ⚠️ 没有模型能在截止时间内完成，改用最快的模型")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='按资源与截止时间选择Whisper模型')
+    parser.add_argument('--duration', type=float, default=None, help='音频时长（秒）')
+    parser.add_argument('--deadline', type=float, default=None, help='允许的转录总时间（秒）')
+    parser.add_argument('--backend', default=None, help='openai / ctranslate2')
+    parser.add_argument('--parallel', action='store_true', help='按VAD并行转录估计')
+    parser.add_argument('--history', action='store_true', help='显示各模型的实测RTF')
+    args = parser.parse_args()
+
+    planner = ModelPlanner()
+    if args.history or args.duration is None:
+        history = planner.load_history()
+        print(f"📋 转录历史: {len(history)} 条 ({planner.history_path})")
+        groups = {}
+        for entry in history:
+            groups.setdefault((entry['model'], entry['backend'], entry['mode']), []).append(entry)
+        for (model, backend, mode), entries in sorted(groups.items()):
+            rtf = statistics.median(entry['seconds'] / entry['audio_seconds'] for entry in entries)
+            print(f"   {model_label(model, backend):<24}{mode:<10} RTF {rtf:.3f} ({len(entries)} 次)")
+        if args.duration is None:
+            return
+
+    plan = planner.plan(args.duration, args.deadline, args.backend, 'parallel' if args.parallel else 'full')
+    print(describe_plan(plan))
+
+
+if __name__ == "__main__":
+    main()
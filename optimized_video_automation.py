@@ -2,7 +2,7 @@
 # -*- coding: utf-8 -*-
 """
 性能优化的视频处理自动化系统
-特点：网络重试、并发处理、断点续传、智能缓存
+特点：网络重试、并发处理、断点续传、多连接下载、智能缓存
 """
 
 import os
@@ -14,22 +14,53 @@ import threading
 from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import yt_dlp
-import whisper
+
+from audio_artifact import AudioArtifact, load_audio
+from cue_segmentation import CueSegmenter
+from download_metrics import DownloadMetrics
+from media_store import MediaStore, clip_range_key, guess_video_id
+from parallel_downloader import ParallelRangeDownloader
+from parallel_transcription import SAMPLE_RATE, ParallelTranscriber, parallel_capable, should_use_parallel
+from resumable_download import ResumableDownloader
+from retry_policy import RetryPolicy
+from segment_fetcher import SegmentFetcher, parse_timestamp, resolve_requested_formats
+from streaming_transcription import IncrementalSrtWriter, PromptChunkWriter, StreamingTranscriber
+from transcription_cache import CachedWhisperModel
+from video_info_cache import VideoInfoCache
+from youtube_captions import load_captions
+from whisper_service import WhisperServiceClient, load_whisper_model
 
 class OptimizedVideoAutomation:
     def __init__(self):
         self.base_output_dir = "output"
         self.current_project_dir = None
         self.whisper_model = None
+        self.whisper_backend = None  # openai / ctranslate2(int8)；None 时取环境变量 WHISPER_BACKEND
+        self.parallel_transcriber = None
+        self.parallel_transcription = True  # 长音频在多核机器上VAD切块、多进程并行转录
+        self.streaming_transcriber = None
+        self.prompt_chunk_size = 50  # 每凑够这么多片段就生成一个翻译提示词分块
+        self.cue_splitting = True  # 词级时间戳 + 按字体宽度/时长/停顿重新切分字幕，避免烧录时字幕过长
+        self.use_youtube_captions = True  # 视频已有合格的英文字幕时直接使用，跳过Whisper
+        self.subtitle_source = {'type': 'whisper'}  # 本项目英文字幕的来源，写入 automation_state.json
         self.max_retries = 3
         self.retry_delay = 5  # 秒
+        self.retry_policy = RetryPolicy(max_attempts=self.max_retries, base_delay=self.retry_delay)
+        self.video_info_cache = None
+        self.media_store = None
+        self.download_metrics = None
+        self.download_format = 'bestvideo[height>=1080]+bestaudio/best[height>=1080]'
+        self.video_info_cache_ttl = 300  # 秒，格式URL会过期
+        self.video_info_cache_max_entries = 10000
+        self.download_connections = 4  # 单连接被CDN限速时，按字节范围多连接并行下载
+        self.max_download_connections = 16
         
     def load_whisper_model(self):
         """优化：只加载一次Whisper模型"""
         if not self.whisper_model:
             print("🔄 加载Whisper模型...")
             start_time = time.time()
-            self.whisper_model = whisper.load_model("base")
+            self.whisper_model = load_whisper_model("base", backend=self.whisper_backend)  # 常驻服务运行时直接复用
             load_time = time.time() - start_time
             print(f"✅ Whisper模型加载完成 ({load_time:.1f}秒)")
     
@@ -67,6 +98,14 @@ class OptimizedVideoAutomation:
         if start_time and end_time:
             print(f"   切片时间: {start_time} - {end_time}")
         
+        # 步骤0: 媒体库中已有同一来源时直接链接，不访问网络也不复制
+        clip_range = self.get_clip_range_key(start_time, end_time)
+        video_id = guess_video_id(url)
+        if video_id:
+            stored = self.get_media_store().lookup_by_spec(video_id, self.download_format, clip_range)
+            if stored:
+                return self.link_stored_media(stored)
+        
         # 步骤1: 获取并缓存视频信息
         video_info, video_title = self.get_and_cache_video_info(url)
         if not video_info:
@@ -74,28 +113,88 @@ class OptimizedVideoAutomation:
             
         # 创建项目目录
         project_dir = self.create_project_directory(video_title)
+        self.download_metrics = DownloadMetrics(project_dir, url)
         
         # 步骤2: 检查是否已有部分下载
-        partial_file = self.check_partial_download(project_dir, video_title)
+        partial_file = self.check_partial_download(project_dir, video_title, video_info.get('id'))
         
         # 步骤3: 增量下载策略
-        return self.incremental_download(url, project_dir, video_info, start_time, end_time, partial_file)
+        video_path, video_title = self.incremental_download(url, project_dir, video_info, start_time, end_time, partial_file)
+        
+        # 步骤4: 存入媒体库，项目内替换为硬链接
+        if video_path:
+            self.store_downloaded_media(video_path, video_info, clip_range)
+        return video_path, video_title
+    
+    def get_media_store(self):
+        """获取全局媒体库（按需创建）"""
+        if self.media_store is None:
+            self.media_store = MediaStore(os.path.join(self.base_output_dir, ".media_store"))
+        return self.media_store
+    
+    def get_clip_range_key(self, start_time, end_time):
+        """切片范围的媒体库键"""
+        if not (start_time and end_time):
+            return clip_range_key()
+        try:
+            return clip_range_key(parse_timestamp(start_time), parse_timestamp(end_time))
+        except ValueError:
+            return f"{start_time}-{end_time}"
+    
+    def link_stored_media(self, stored):
+        """从媒体库链接视频到新项目目录"""
+        title = stored['title'] or 'video'
+        project_dir = self.create_project_directory(title)
+        safe_title = re.sub(r'[<>:"/\\|?*]', '_', title)
+        ext = os.path.splitext(stored['path'])[1]
+        video_path = self.get_media_store().link_into(stored['hash'], os.path.join(project_dir, f"{safe_title}{ext}"))
+        print(f"♻️ 复用媒体库中的视频 ({stored['size'] / (1024*1024):.1f}MB)，跳过下载")
+        return video_path, title
+    
+    def store_downloaded_media(self, video_path, video_info, clip_range):
+        """把下载结果移入媒体库，项目目录中保留硬链接"""
+        try:
+            try:
+                formats = resolve_requested_formats(video_info, self.download_format)
+                format_id = '+'.join(str(fmt.get('format_id')) for fmt in formats)
+            except Exception:
+                format_id = self.download_format
+            
+            self.get_media_store().ingest(
+                video_path,
+                video_id=video_info.get('id'),
+                format_id=format_id,
+                clip_range=clip_range,
+                format_spec=self.download_format,
+                title=video_info.get('title'),
+                move=True
+            )
+            print("📦 已存入媒体库，后续项目将直接复用")
+        except Exception as e:
+            print(f"⚠️ 存入媒体库失败（不影响本次处理）: {str(e)[:80]}")
+    
+    def get_video_info_cache(self):
+        """获取视频信息缓存（SQLite索引存储，按需创建）"""
+        if self.video_info_cache is None:
+            self.video_info_cache = VideoInfoCache(
+                os.path.join(self.base_output_dir, ".video_info_cache.sqlite3"),
+                ttl=self.video_info_cache_ttl,
+                max_entries=self.video_info_cache_max_entries
+            )
+        return self.video_info_cache
     
     def get_and_cache_video_info(self, url):
         """获取并缓存视频信息，避免重复请求"""
-        cache_file = f"{self.base_output_dir}/.video_info_cache.json"
+        cache = self.get_video_info_cache()
         
         # 尝试从缓存读取
-        if os.path.exists(cache_file):
-            try:
-                with open(cache_file, 'r', encoding='utf-8') as f:
-                    cache = json.load(f)
-                    if url in cache and (time.time() - cache[url]['timestamp']) < 300:  # 5分钟缓存
-                        print("📋 使用缓存的视频信息")
-                        info = cache[url]['info']
-                        return info, info.get('title', 'video')
-            except:
-                pass
+        try:
+            info = cache.get(url)
+            if info:
+                print("📋 使用缓存的视频信息")
+                return info, info.get('title', 'video')
+        except Exception as e:
+            print(f"⚠️ 读取视频信息缓存失败: {str(e)[:50]}")
         
         # 获取新的视频信息
         print("🔍 获取视频信息...")
@@ -106,41 +205,27 @@ class OptimizedVideoAutomation:
             'retries': 2
         }
         
-        for attempt in range(2):
-            try:
-                with yt_dlp.YoutubeDL(temp_ydl_opts) as ydl:
-                    info = ydl.extract_info(url, download=False)
-                    title = info.get('title', 'video')
-                    
-                    # 缓存视频信息
-                    cache = {}
-                    if os.path.exists(cache_file):
-                        try:
-                            with open(cache_file, 'r', encoding='utf-8') as f:
-                                cache = json.load(f)
-                        except:
-                            pass
-                    
-                    cache[url] = {
-                        'info': info,
-                        'timestamp': time.time()
-                    }
-                    
-                    os.makedirs(self.base_output_dir, exist_ok=True)
-                    with open(cache_file, 'w', encoding='utf-8') as f:
-                        json.dump(cache, f, ensure_ascii=False, indent=2)
-                    
-                    print(f"✅ 视频信息获取成功: {title}")
-                    return info, title
-                    
-            except Exception as e:
-                print(f"⚠️ 获取视频信息失败 (尝试 {attempt + 1}/2): {str(e)[:50]}...")
-                if attempt == 0:
-                    time.sleep(3)
+        def extract(attempt):
+            with yt_dlp.YoutubeDL(temp_ydl_opts) as ydl:
+                return ydl.extract_info(url, download=False)
         
-        return None, None
+        try:
+            info = self.retry_policy.run(extract, url, "获取视频信息")
+        except Exception as e:
+            print(f"⚠️ 获取视频信息失败: {str(e)[:50]}...")
+            return None, None
+        title = info.get('title', 'video')
+        
+        # 缓存精简后的视频信息（单键原子写入）
+        try:
+            info = cache.put(url, info)
+        except Exception as e:
+            print(f"⚠️ 写入视频信息缓存失败: {str(e)[:50]}")
+        
+        print(f"✅ 视频信息获取成功: {title}")
+        return info, title
     
-    def check_partial_download(self, project_dir, video_title):
+    def check_partial_download(self, project_dir, video_title, video_id=None):
         """检查是否有部分下载的文件"""
         # 检查完整文件
         complete_file = self.find_downloaded_file(project_dir)
@@ -148,24 +233,112 @@ class OptimizedVideoAutomation:
             print(f"✅ 发现已完成的下载: {complete_file}")
             return complete_file
         
-        # 检查部分文件 (.part, .ytdl, .tmp)
-        partial_extensions = ['.part', '.ytdl', '.tmp', '.f*']
+        # 检查跨运行保留的分块续传进度（项目目录带时间戳，续传文件放在固定目录）
+        partial_dir = self.get_partial_dir()
+        if video_id and os.path.isdir(partial_dir):
+            downloader = ResumableDownloader()
+            for file in sorted(os.listdir(partial_dir)):
+                if file.startswith(f"{video_id}.") and file.endswith('.manifest.json'):
+                    progress = downloader.describe_progress(os.path.join(partial_dir, file[:-len('.manifest.json')]))
+                    if progress:
+                        done, total = progress
+                        total_text = f"{total / (1024*1024):.1f}MB" if total else "?"
+                        print(f"📂 发现可续传的下载: {file} ({done / (1024*1024):.1f}MB / {total_text})")
+        
+        # 检查部分文件 (.part, .ytdl, .tmp, yt-dlp的分格式文件如 .f137.mp4)
+        partial_pattern = re.compile(r'\.(part|ytdl|tmp)$|\.f[0-9a-z_-]+\.[0-9a-z]+(\.part)?$', re.IGNORECASE)
         for file in os.listdir(project_dir):
-            for ext in partial_extensions:
-                if ext in file.lower():
-                    partial_path = os.path.join(project_dir, file)
-                    size = os.path.getsize(partial_path) / (1024*1024)  # MB
-                    print(f"📂 发现部分下载: {file} ({size:.1f}MB)")
-                    return partial_path
+            if partial_pattern.search(file):
+                partial_path = os.path.join(project_dir, file)
+                size = os.path.getsize(partial_path) / (1024*1024)  # MB
+                print(f"📂 发现部分下载: {file} ({size:.1f}MB)")
+                return partial_path
         
         return None
     
+    def get_partial_dir(self):
+        """分块续传文件的固定存放目录"""
+        return os.path.join(self.base_output_dir, ".partial")
+    
+    def resumable_download(self, project_dir, video_info):
+        """用分块清单逐格式下载（可在崩溃/断网后续传），再合并为mp4；格式不支持时返回None"""
+        formats = resolve_requested_formats(video_info, self.download_format)
+        plans = self.plan_resumable_formats(formats)
+        if not plans:
+            return None
+        
+        parts = [self.download_format_part(video_info, fmt, plan) for fmt, plan in plans]
+        return self.merge_format_parts(parts, self.get_project_video_path(project_dir, video_info))
+    
+    def plan_resumable_formats(self, formats):
+        """为每个格式规划分块下载方式：直链返回plan=None，分片格式返回分片计划；任一格式不支持时返回None"""
+        if not formats:
+            return None
+        
+        fetcher = SegmentFetcher()
+        plans = []
+        for fmt in formats:
+            protocol = fmt.get('protocol', '')
+            if fmt.get('fragments') or protocol.startswith(('m3u8', 'http_dash')):
+                plan = fetcher.plan_format(fmt)
+                if not plan:
+                    return None
+            elif protocol in ('https', 'http') and fmt.get('url'):
+                plan = None
+            else:
+                return None
+            plans.append((fmt, plan))
+        return plans
+    
+    def download_format_part(self, video_info, fmt, plan):
+        """下载单个格式到续传目录，返回文件路径"""
+        downloader = ParallelRangeDownloader(
+            connections=self.download_connections,
+            max_connections=self.max_download_connections
+        )
+        if self.download_metrics:
+            downloader.progress_hooks.append(self.download_metrics.progress_hook)
+        partial_dir = self.get_partial_dir()
+        os.makedirs(partial_dir, exist_ok=True)
+        
+        dest = os.path.join(partial_dir, f"{video_info.get('id', 'video')}.f{fmt.get('format_id')}.{fmt.get('ext', 'mp4')}")
+        headers = fmt.get('http_headers')
+        print(f"⬇️  分块下载格式 {fmt.get('format_id')} ({fmt.get('ext')})")
+        if plan:
+            downloader.download_fragments(plan['fragments'], dest, headers, init=plan['init'])
+        else:
+            downloader.download(fmt['url'], dest, headers)
+        return dest
+    
+    def get_project_video_path(self, project_dir, video_info):
+        safe_title = re.sub(r'[<>:"/\\|?*]', '_', video_info.get('title', 'video'))
+        return os.path.join(project_dir, f"{safe_title}.mp4")
+    
+    def merge_format_parts(self, parts, video_path):
+        """无损合并各格式为mp4，成功后删除续传文件"""
+        cmd = ['ffmpeg', '-y']
+        for part in parts:
+            cmd += ['-i', part]
+        for index in range(len(parts)):
+            cmd += ['-map', str(index)]
+        cmd += ['-c', 'copy', video_path]
+        merge_start = time.time()
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"合并音视频失败: {result.stderr[-200:]}")
+        if self.download_metrics:
+            self.download_metrics.record_merge(time.time() - merge_start)
+        
+        for part in parts:
+            os.remove(part)
+        return video_path
+    
     def incremental_download(self, url, project_dir, video_info, start_time, end_time, partial_file):
         """增量下载 - 基于已有进度继续"""
         
         # 基础下载配置
         ydl_opts = {
-            'format': 'bestvideo[height>=1080]+bestaudio/best[height>=1080]',
+            'format': self.download_format,
             'outtmpl': f'{project_dir}/%(title)s.%(ext)s',
             'merge_output_format': 'mp4',
             'socket_timeout': 30,
@@ -173,6 +346,8 @@ class OptimizedVideoAutomation:
             'continue_dl': True,  # 关键：启用断点续传
             'nooverwrites': True,  # 不覆盖已存在文件
         }
+        metrics = self.download_metrics
+        metrics.attach(ydl_opts)
         
         # 如果是切片下载
         if start_time and end_time:
@@ -191,55 +366,86 @@ class OptimizedVideoAutomation:
             print("✅ 文件已完整，跳过下载")
             return partial_file, video_info.get('title', 'video')
         
-        # 增量重试下载
-        for attempt in range(self.max_retries):
-            try:
-                print(f"🔄 增量下载尝试 {attempt + 1}/{self.max_retries}")
-                
-                # 动态调整超时时间
-                ydl_opts['socket_timeout'] = 30 + (attempt * 10)  # 递增超时
-                ydl_opts['retries'] = max(1, 3 - attempt)  # 递减内部重试
-                
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    # 使用已缓存的info，避免重复网络请求
-                    ydl.process_info(video_info)
-                    
-                    # 查找下载的文件
-                    video_path = self.find_downloaded_file(project_dir)
-                    if video_path:
-                        file_size = os.path.getsize(video_path) / (1024*1024)
-                        print(f"✅ 增量下载成功: {video_path} ({file_size:.1f}MB)")
-                        return video_path, video_info.get('title', 'video')
-                    
-            except Exception as e:
-                error_msg = str(e)
-                print(f"❌ 增量下载尝试 {attempt + 1} 失败: {error_msg[:80]}...")
-                
-                # 智能错误处理
-                if "connection reset" in error_msg.lower() or "timeout" in error_msg.lower():
-                    # 网络问题 - 继续重试
-                    if attempt < self.max_retries - 1:
-                        wait_time = self.retry_delay * (attempt + 1)
-                        print(f"🌐 网络问题，等待 {wait_time} 秒后重试...")
-                        time.sleep(wait_time)
-                        continue
-                        
-                elif "unavailable" in error_msg.lower() or "private" in error_msg.lower():
-                    # 视频不可用 - 直接退出
-                    print("❌ 视频不可用或已私有，停止重试")
-                    break
-                    
-                else:
-                    # 其他错误 - 短暂等待后重试
-                    if attempt < self.max_retries - 1:
-                        print(f"⏱️  等待 {self.retry_delay} 秒后重试...")
-                        time.sleep(self.retry_delay)
-        
-        print("❌ 所有增量下载尝试均失败")
-        return None, None
+        # 切片优先只下载覆盖范围的分片，不支持时回退到ffmpeg外部下载器
+        if start_time and end_time:
+            clip_path = self.download_clip_range(project_dir, video_info, start_time, end_time)
+            if clip_path:
+                return clip_path, video_info.get('title', 'video')
+        
+        # 增量重试下载（优先使用分块清单续传，每次重试只补下缺失的块）
+        state = {'use_resumable': True}
+        
+        def attempt_download(attempt):
+            return self.download_attempt(project_dir, video_info, ydl_opts, attempt, state)
+        
+        try:
+            video_path = self.retry_policy.run(
+                attempt_download, url, "增量下载",
+                on_retry=lambda kind, delay, e: metrics.record('retry', kind=kind, delay=round(delay, 2))
+            )
+        except Exception:
+            print("❌ 所有增量下载尝试均失败")
+            return None, None
+        
+        file_size = os.path.getsize(video_path) / (1024*1024)
+        print(f"✅ 增量下载成功: {video_path} ({file_size:.1f}MB)")
+        return video_path, video_info.get('title', 'video')
+    
+    def download_attempt(self, project_dir, video_info, ydl_opts, attempt, state):
+        """单次下载尝试：先用分块续传引擎，格式不支持时改用yt-dlp"""
+        metrics = self.download_metrics
+        print(f"🔄 增量下载尝试 {attempt + 1}/{self.max_retries}")
+        
+        try:
+            if state['use_resumable']:
+                metrics.start_attempt('resumable')
+                video_path = self.resumable_download(project_dir, video_info)
+                if video_path:
+                    metrics.end_attempt('ok')
+                    return video_path
+                metrics.end_attempt('unsupported')
+                state['use_resumable'] = False
+                print("⚠️ 该格式不支持分块续传，改用yt-dlp下载")
+            
+            # 动态调整超时时间
+            ydl_opts['socket_timeout'] = 30 + (attempt * 10)  # 递增超时
+            ydl_opts['retries'] = max(1, 3 - attempt)  # 递减内部重试
+            metrics.start_attempt('yt-dlp', socket_timeout=ydl_opts['socket_timeout'])
+            
+            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                # 使用已缓存的info，避免重复网络请求
+                ydl.process_info(video_info)
+            
+            # 查找下载的文件
+            video_path = self.find_downloaded_file(project_dir)
+            if not video_path:
+                raise RuntimeError("下载完成但未找到视频文件")
+            metrics.end_attempt('ok')
+            return video_path
+        except Exception as e:
+            metrics.end_attempt('failed', error=e)
+            print(f"❌ 增量下载尝试 {attempt + 1} 失败: {str(e)[:80]}...")
+            raise
     
 
     
+    def download_clip_range(self, project_dir, video_info, start_time, end_time):
+        """按时间范围只下载需要的DASH/HLS分片并精确切割"""
+        safe_title = re.sub(r'[<>:"/\\|?*]', '_', video_info.get('title', 'video'))
+        clip_path = os.path.join(project_dir, f"{safe_title}.mp4")
+        
+        fetcher = SegmentFetcher()
+        self.download_metrics.start_attempt('range_fetch', start=start_time, end=end_time)
+        try:
+            # 与媒体库登记/查询用同一个格式表达式，库里的条目才与实际下载的格式一致
+            clip_path = fetcher.fetch_clip(video_info, start_time, end_time, clip_path, format_spec=self.download_format)
+        except Exception as e:
+            self.download_metrics.end_attempt('failed', error=e, extra_bytes=fetcher.bytes_downloaded)
+            print(f"⚠️ 按范围下载失败，回退到完整切片下载: {str(e)[:80]}")
+            return None
+        self.download_metrics.end_attempt('ok' if clip_path else 'unsupported', extra_bytes=fetcher.bytes_downloaded)
+        return clip_path
+    
     def find_downloaded_file(self, project_dir):
         """查找下载的视频文件"""
         for file in os.listdir(project_dir):
@@ -247,49 +453,118 @@ class OptimizedVideoAutomation:
                 return os.path.join(project_dir, file)
         return None
     
-    def extract_english_subtitles_fast(self, video_path):
-        """优化的字幕提取"""
-        print("🔄 提取英文字幕...")
-        
-        # 预加载模型
-        self.load_whisper_model()
+    def extract_english_subtitles_from_captions(self, url, video_path, start_time=None, end_time=None,
+                                                prompt_writer=None, video_info=None):
+        """优先使用YouTube已有的英文字幕（人工字幕优先于自动字幕），不必运行Whisper
+
+        没有可用轨道或质量检查未通过时返回None，由调用方改用Whisper；所用来源记录在 self.subtitle_source
+        """
+        if not self.use_youtube_captions:
+            self.subtitle_source = {'type': 'whisper', 'reason': '未启用YouTube字幕'}
+            return None
+        print("🔍 检查YouTube已有的英文字幕...")
+        if video_info is None and url:
+            video_info, _ = self.get_and_cache_video_info(url)
+        if not video_info:
+            self.subtitle_source = {'type': 'whisper', 'reason': '无法获取视频信息'}
+            return None
         
-        start_time = time.time()
-        result = self.whisper_model.transcribe(video_path)
-        transcribe_time = time.time() - start_time
+        try:
+            segments, track, reason = load_captions(video_info, parse_timestamp(start_time), parse_timestamp(end_time))
+        except Exception as e:
+            segments, track, reason = None, None, f"解析失败: {str(e)[:80]}"
+        if segments is None:
+            print(f"⚠️ 不使用YouTube字幕，改用Whisper识别: {reason}")
+            self.subtitle_source = {'type': 'whisper', 'reason': reason}
+            return None
+        
+        print(f"✅ 使用YouTube{'人工' if track['kind'] == 'manual' else '自动'}字幕 "
+              f"({track['language']}.{track['ext']})，跳过Whisper")
+        self.subtitle_source = {'type': 'youtube', 'kind': track['kind'], 'language': track['language'],
+                                'format': track['ext']}
+        stream = segments
+        if self.cue_splitting and track['kind'] == 'automatic':
+            # 自动字幕是滚动显示的短行，按字体宽度重新组合；人工字幕保留上传者的断句
+            stream = CueSegmenter.for_style('english').iter_cues(segments)
+        return self.write_english_subtitles(video_path, stream, prompt_writer)
+    
+    def extract_english_subtitles_fast(self, video_path, audio=None, prompt_writer=None):
+        """流式字幕提取：每解码完一个窗口就把片段追加到SRT（flush + fsync），并交给翻译提示词分块
+
+        audio: 可选的已解码16kHz音频数组或音频文件（默认使用视频的项目级PCM文件）
+        """
+        print("🔄 提取英文字幕...")
         
-        segments = []
-        for segment in result["segments"]:
-            segments.append({
-                "start": segment["start"],
-                "end": segment["end"],
-                "text": segment["text"].strip()
-            })
-        
-        # 批量写入字幕文件
+        source = audio if audio is not None else video_path
+        if self.cue_splitting:
+            stream = CueSegmenter.for_style('english').iter_cues(
+                self.iter_transcribed_segments(source, word_timestamps=True)
+            )
+        else:
+            stream = self.iter_transcribed_segments(source)
+        return self.write_english_subtitles(video_path, stream, prompt_writer)
+    
+    def write_english_subtitles(self, video_path, stream, prompt_writer=None):
+        """逐条写入英文SRT并交给翻译提示词分块，返回 (SRT路径, 片段列表)"""
         video_name = Path(video_path).stem
         english_srt = f"{self.current_project_dir}/subtitles/{video_name}_english.srt"
         
-        # 优化：批量构建内容再一次写入
-        srt_content = []
-        for i, segment in enumerate(segments, 1):
-            start_time_str = self.seconds_to_srt_time(segment["start"])
-            end_time_str = self.seconds_to_srt_time(segment["end"])
-            srt_content.append(f"{i}\n{start_time_str} --> {end_time_str}\n{segment['text']}\n")
-        
-        with open(english_srt, 'w', encoding='utf-8') as f:
-            f.write('\n'.join(srt_content))
+        start_time = time.time()
+        segments = []
+        with IncrementalSrtWriter(english_srt) as writer:
+            for segment in stream:
+                segment = {
+                    "start": segment["start"],
+                    "end": segment["end"],
+                    "text": segment["text"].strip(),
+                    "lines": segment.get("lines")
+                }
+                segments.append(segment)
+                writer.write(segment)
+                if prompt_writer:
+                    prompt_writer.add(segment)
+        if prompt_writer:
+            prompt_writer.flush()
+        transcribe_time = time.time() - start_time
         
         print(f"✅ 英文字幕提取完成: {english_srt}")
         print(f"📊 共 {len(segments)} 个片段 (耗时 {transcribe_time:.1f}秒)")
         return english_srt, segments
     
-    def create_translation_prompt_fast(self, segments):
-        """快速生成翻译提示词"""
-        prompt_file = f"{self.current_project_dir}/translation_prompt.txt"
+    def iter_transcribed_segments(self, source, **options):
+        """逐个产出转录片段：长音频在多核机器上用VAD切块并行转录（按时间顺序产出），
+        常驻服务运行时或短音频逐30秒窗口转录；options 为解码参数（如 word_timestamps）"""
+        source = load_audio(source)  # 项目级PCM文件：只解码一次，之后内存映射复用
+        if self.parallel_transcription and parallel_capable() and WhisperServiceClient().ping() is None:
+            if should_use_parallel(len(source) / SAMPLE_RATE):
+                if self.parallel_transcriber is None:
+                    self.parallel_transcriber = CachedWhisperModel(
+                        ParallelTranscriber("base", backend=self.whisper_backend), "base", variant="vad-parallel"
+                    )
+                yield from self.parallel_transcriber.iter_segments(source, **options)
+                return
+        
+        # 预加载模型
+        self.load_whisper_model()
+        if self.streaming_transcriber is None:
+            self.streaming_transcriber = StreamingTranscriber(self.whisper_model)
+        yield from self.streaming_transcriber.iter_segments(source, **options)
+    
+    def create_prompt_chunk_writer(self):
+        """翻译提示词分块：每凑够 prompt_chunk_size 个片段就生成一个，翻译可与转录同时进行"""
         translation_file = f"{self.current_project_dir}/subtitles/chinese_translation.srt"
         
-        # 优化：使用字符串拼接而不是多次append
+        def render(segments, first_index, part):
+            last_index = first_index + len(segments) - 1
+            return self.build_translation_prompt(
+                segments, first_index, translation_file,
+                heading=f"## 待翻译内容 第{part}部分 (片段 {first_index}-{last_index})",
+                save_note=f"请将本部分的翻译按顺序追加到: {translation_file}（序号从 {first_index} 开始）"
+            )
+        
+        return PromptChunkWriter(self.current_project_dir, render, chunk_size=self.prompt_chunk_size)
+    
+    def build_translation_prompt(self, segments, first_index, translation_file, heading, save_note):
         prompt_lines = [
             "# 政治脱口秀翻译指南",
             "",
@@ -299,18 +574,18 @@ class OptimizedVideoAutomation:
             "3. 专有名词准确翻译（人名、地名、机构名）",
             "4. 保持时间节奏，适合字幕显示",
             "",
-            f"## 待翻译内容 ({len(segments)} 个片段)",
+            heading,
             ""
         ]
         
         # 批量添加片段
-        for i, segment in enumerate(segments, 1):
+        for i, segment in enumerate(segments, first_index):
             prompt_lines.append(f"{i}. {segment['text']}")
         
         prompt_lines.extend([
             "",
             "## 翻译格式要求",
-            f"请将翻译结果保存到: {translation_file}",
+            save_note,
             "格式如下:",
             "",
             "1",
@@ -326,6 +601,18 @@ class OptimizedVideoAutomation:
             "## 翻译完成后",
             "请运行: python optimized_video_automation.py --finalize"
         ])
+        return prompt_lines
+    
+    def create_translation_prompt_fast(self, segments):
+        """快速生成翻译提示词（完整版，包含全部片段）"""
+        prompt_file = f"{self.current_project_dir}/translation_prompt.txt"
+        translation_file = f"{self.current_project_dir}/subtitles/chinese_translation.srt"
+        
+        prompt_lines = self.build_translation_prompt(
+            segments, 1, translation_file,
+            heading=f"## 待翻译内容 ({len(segments)} 个片段)",
+            save_note=f"请将翻译结果保存到: {translation_file}"
+        )
         
         # 一次性写入
         with open(prompt_file, 'w', encoding='utf-8') as f:
@@ -335,14 +622,6 @@ class OptimizedVideoAutomation:
         print(f"📝 请将中文翻译保存到: {translation_file}")
         return prompt_file, translation_file
     
-    def seconds_to_srt_time(self, seconds):
-        """转换秒数为SRT时间格式"""
-        hours = int(seconds // 3600)
-        minutes = int((seconds % 3600) // 60)
-        secs = int(seconds % 60)
-        millisecs = int((seconds % 1) * 1000)
-        return f"{hours:02d}:{minutes:02d}:{secs:02d},{millisecs:03d}"
-    
     def process_video_optimized(self, url, start_time=None, end_time=None):
         """优化的视频处理流程"""
         print("🚀 优化版视频处理自动化开始")
@@ -350,46 +629,172 @@ class OptimizedVideoAutomation:
         
         total_start_time = time.time()
         
-        # 步骤1: 智能下载（增量重试）
-        print("\n📥 步骤1: 智能下载")
-        video_path, video_title = self.download_video_with_incremental_retry(url, start_time, end_time)
-        if not video_path:
-            print("❌ 下载失败，无法继续")
-            return False
+        # 完整视频优先下载音频：转录与视频下载并行，翻译提示词提前就绪
+        audio_first = None
+        if not (start_time and end_time):
+            audio_first = self.start_audio_first_download(url)
         
-        # 步骤2: 提取英文字幕
-        print("\n📝 步骤2: 提取英文字幕")
-        english_srt, segments = self.extract_english_subtitles_fast(video_path)
-        
-        # 步骤3: 生成翻译提示词
-        print("\n📖 步骤3: 生成翻译提示词")
-        prompt_file, translation_file = self.create_translation_prompt_fast(segments)
+        if audio_first:
+            video_title = audio_first['title']
+            
+            print("\n📝 步骤2: 提取英文字幕（视频在后台继续下载）")
+            prompt_writer = self.create_prompt_chunk_writer()
+            english_srt, segments = self.extract_english_subtitles_from_captions(
+                url, audio_first['video_path'], prompt_writer=prompt_writer, video_info=audio_first['video_info']
+            ) or self.extract_english_subtitles_fast(
+                audio_first['video_path'], audio=audio_first['audio_path'], prompt_writer=prompt_writer
+            )
+            
+            print("\n📖 步骤3: 生成完整翻译提示词")
+            prompt_file, translation_file = self.create_translation_prompt_fast(segments)
+            
+            print("\n🎬 等待视频下载完成并合并")
+            try:
+                video_path = self.finish_audio_first_download(audio_first)
+            except Exception as e:
+                print(f"❌ 音视频合并失败: {str(e)[:80]}")
+                video_path = None
+            if not video_path:
+                # 翻译提示词已经生成，保存状态以便重新下载视频后继续
+                self.save_automation_state(audio_first['video_path'], video_title, english_srt, translation_file,
+                                           len(segments), status="video_download_failed")
+                print("❌ 视频下载失败，无法继续")
+                return False
+        else:
+            # 步骤1: 智能下载（增量重试）
+            print("\n📥 步骤1: 智能下载")
+            video_path, video_title = self.download_video_with_incremental_retry(url, start_time, end_time)
+            if not video_path:
+                print("❌ 下载失败，无法继续")
+                return False
+            
+            # 步骤2: 提取英文字幕
+            print("\n📝 步骤2: 提取英文字幕")
+            prompt_writer = self.create_prompt_chunk_writer()
+            english_srt, segments = self.extract_english_subtitles_from_captions(
+                url, video_path, start_time, end_time, prompt_writer=prompt_writer
+            ) or self.extract_english_subtitles_fast(video_path, prompt_writer=prompt_writer)
+            
+            # 步骤3: 生成翻译提示词
+            print("\n📖 步骤3: 生成完整翻译提示词")
+            prompt_file, translation_file = self.create_translation_prompt_fast(segments)
         
         # 保存状态（优化的状态保存）
+        self.save_automation_state(video_path, video_title, english_srt, translation_file, len(segments))
+        
+        total_time = time.time() - total_start_time
+        
+        print(f"\n⏳ 处理完成，总耗时: {total_time:.1f}秒")
+        print("\n📋 下一步操作:")
+        print(f"1. 查看翻译提示词: {prompt_file}")
+        print(f"2. 完成中文翻译并保存到: {translation_file}")
+        print("3. 运行完成命令: python optimized_video_automation.py --finalize")
+        
+        return True
+    
+    def start_audio_first_download(self, url):
+        """先下载音频流，再在后台线程下载视频流；不适用时返回None，由调用方走顺序流程"""
+        video_id = guess_video_id(url)
+        if video_id and self.get_media_store().lookup_by_spec(video_id, self.download_format, clip_range_key()):
+            return None  # 媒体库已有，顺序流程会直接链接
+        
+        video_info, video_title = self.get_and_cache_video_info(url)
+        if not video_info:
+            return None
+        
+        formats = resolve_requested_formats(video_info, self.download_format)
+        audio_formats = [fmt for fmt in formats if fmt.get('vcodec') == 'none']
+        video_formats = [fmt for fmt in formats if fmt.get('vcodec') != 'none']
+        if len(audio_formats) != 1 or len(video_formats) != 1:
+            return None  # 音视频合一的格式无法先取音频
+        plans = self.plan_resumable_formats([video_formats[0], audio_formats[0]])
+        if not plans:
+            return None
+        (video_format, video_plan), (audio_format, audio_plan) = plans
+        
+        print("📥 步骤1: 优先下载音频流")
+        self.download_metrics = DownloadMetrics(url=url)  # 项目目录创建前先缓存事件
+        self.download_metrics.start_attempt('audio_first', format_id=audio_format.get('format_id'))
+        try:
+            audio_path = self.download_format_part(video_info, audio_format, audio_plan)
+        except Exception as e:
+            self.download_metrics.end_attempt('failed', error=e)
+            print(f"⚠️ 音频优先下载失败，改用顺序流程: {str(e)[:80]}")
+            return None
+        self.download_metrics.end_attempt('ok')
+        
+        project_dir = self.create_project_directory(video_title)
+        self.download_metrics.bind(project_dir)
+        executor = ThreadPoolExecutor(max_workers=1)
+        video_future = executor.submit(self.download_video_part_with_retry, video_info, video_format, video_plan)
+        print(f"🎬 视频流 {video_format.get('format_id')} 在后台下载中")
+        return {
+            'title': video_title,
+            'video_info': video_info,
+            'audio_path': audio_path,
+            'video_path': self.get_project_video_path(project_dir, video_info),
+            'video_future': video_future,
+            'executor': executor,
+        }
+    
+    def download_video_part_with_retry(self, video_info, fmt, plan):
+        """后台下载视频流，失败时基于续传清单重试"""
+        metrics = self.download_metrics
+        
+        def attempt_download(attempt):
+            metrics.start_attempt('background_video', format_id=fmt.get('format_id'))
+            try:
+                video_part = self.download_format_part(video_info, fmt, plan)
+            except Exception as e:
+                metrics.end_attempt('failed', error=e)
+                print(f"❌ 视频流下载尝试 {attempt + 1} 失败: {str(e)[:80]}...")
+                raise
+            metrics.end_attempt('ok')
+            return video_part
+        
+        try:
+            return self.retry_policy.run(
+                attempt_download, video_info.get('webpage_url') or fmt.get('url', ''), "视频流下载",
+                on_retry=lambda kind, delay, e: metrics.record('retry', kind=kind, delay=round(delay, 2))
+            )
+        except Exception:
+            return None
+    
+    def finish_audio_first_download(self, audio_first):
+        """等待后台视频流完成，与音频合并后存入媒体库"""
+        try:
+            video_part = audio_first['video_future'].result()
+        finally:
+            audio_first['executor'].shutdown()
+        if not video_part:
+            return None
+        
+        video_path = self.merge_format_parts([video_part, audio_first['audio_path']], audio_first['video_path'])
+        AudioArtifact(audio_first['audio_path']).remove()  # 转录用的PCM随音频流一起清理
+        file_size = os.path.getsize(video_path) / (1024*1024)
+        print(f"✅ 音视频合并完成: {video_path} ({file_size:.1f}MB)")
+        self.store_downloaded_media(video_path, audio_first['video_info'], clip_range_key())
+        return video_path
+    
+    def save_automation_state(self, video_path, video_title, english_srt, translation_file, segments_count,
+                              subtitle_source=None, status="waiting_translation"):
+        """保存项目状态，供 --finalize 继续处理"""
         state = {
             "video_path": video_path,
             "video_title": video_title,
             "english_srt": english_srt,
             "translation_file": translation_file,
             "project_dir": self.current_project_dir,
-            "status": "waiting_translation",
+            "status": status,
             "created_time": time.time(),
-            "segments_count": len(segments)
+            "segments_count": segments_count,
+            "subtitle_source": subtitle_source or self.subtitle_source
         }
         
         state_file = f"{self.current_project_dir}/automation_state.json"
         with open(state_file, 'w', encoding='utf-8') as f:
             json.dump(state, f, ensure_ascii=False, indent=2)
-        
-        total_time = time.time() - total_start_time
-        
-        print(f"\n⏳ 处理完成，总耗时: {total_time:.1f}秒")
-        print("\n📋 下一步操作:")
-        print(f"1. 查看翻译提示词: {prompt_file}")
-        print(f"2. 完成中文翻译并保存到: {translation_file}")
-        print("3. 运行完成命令: python optimized_video_automation.py --finalize")
-        
-        return True
+        return state_file
     
     def finalize_latest_project(self):
         """完成最新项目的视频生成"""
@@ -557,6 +962,13 @@ def main():
         automation.finalize_latest_project()
         return
     
+    if len(sys.argv) > 1 and sys.argv[1] == "--batch":
+        # 非交互式批量模式: python optimized_video_automation.py --batch manifest.json
+        from batch_ingest import main as batch_main
+        sys.argv = [sys.argv[0]] + sys.argv[2:]
+        batch_main()
+        return
+    
     # 交互式开始
     print("🚀 优化版视频处理自动化")
     print("特点: 网络重试、性能优化、错误恢复")
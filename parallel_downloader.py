@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多连接并行下载器 - 把大文件切成字节范围，多个连接同时下载并按偏移写入预分配文件
+特点：CDN对单连接限速时按实测吞吐量自动增减连接数；沿用断点续传清单，崩溃后同样可续传
+
+使用方法:
+python parallel_downloader.py <url> <输出文件> [--connections 4]
+python parallel_downloader.py --benchmark     # 与单连接对比（本地限速HTTP服务器）
+"""
+
+import argparse
+import os
+import queue
+import threading
+import time
+
+from resumable_download import ResumableDownloader
+
+
+class ParallelRangeDownloader(ResumableDownloader):
+    """多连接字节范围下载器"""
+
+    def __init__(self, connections=4, max_connections=16, min_connections=1,
+                 chunk_size=4 * 1024 * 1024, timeout=30, adaptive=True, sample_interval=1.0,
+                 chunk_retries=2):
+        super().__init__(chunk_size=chunk_size, timeout=timeout)
+        self.connections = connections
+        self.max_connections = max_connections
+        self.min_connections = min_connections
+        self.adaptive = adaptive
+        self.sample_interval = sample_interval
+        self.chunk_retries = chunk_retries
+        self.connection_history = []   # [(秒, 连接数, MB/s)]，用于观察自适应过程
+
+    def download(self, url, dest_path, headers=None):
+        """并行下载单个文件，返回最终路径"""
+        if os.path.exists(dest_path) and not os.path.exists(self.manifest_path(dest_path)):
+            return dest_path
+
+        manifest, pending = self.prepare(url, dest_path, headers)
+        if manifest is None:
+            print("⚠️ 服务器不支持范围请求，使用单流下载（无法续传）")
+            return self.download_stream(url, dest_path, headers)
+        self.begin_file(dest_path, manifest['total_size'])
+        if not pending:
+            return self.finalize(dest_path, manifest)
+
+        work = queue.Queue()
+        for chunk in pending:
+            work.put(chunk)
+
+        state = {
+            'target': max(self.min_connections, min(self.connections, self.max_connections, len(pending))),
+            'active': 0,
+            'errors': [],
+            'attempts': {},
+        }
+        fd = os.open(self.part_path(dest_path), os.O_RDWR)
+        workers = []
+        started = time.time()
+        try:
+            self._spawn_workers(workers, state, work, url, dest_path, manifest, fd, headers)
+            self._control(workers, state, work, url, dest_path, manifest, fd, headers, started)
+            for worker in workers:
+                worker.join()
+        finally:
+            os.close(fd)
+
+        if state['errors']:
+            raise state['errors'][0]
+        return self.finalize(dest_path, manifest)
+
+    def _spawn_workers(self, workers, state, work, url, dest_path, manifest, fd, headers):
+        with self._lock:
+            missing = state['target'] - state['active']
+            state['active'] += max(0, missing)
+        for _ in range(missing):
+            worker = threading.Thread(
+                target=self._worker, args=(state, work, url, dest_path, manifest, fd, headers), daemon=True
+            )
+            worker.start()
+            workers.append(worker)
+
+    def _worker(self, state, work, url, dest_path, manifest, fd, headers):
+        """单个连接：循环领取字节范围，下载后写入对应偏移"""
+        released = False
+        try:
+            while not state['errors']:
+                with self._lock:
+                    if state['active'] > state['target']:
+                        # 控制器减少了连接数：在同一把锁内判断并减计数，否则所有连接可能同时退出
+                        state['active'] -= 1
+                        released = True
+                        return
+                try:
+                    offset, length = work.get_nowait()
+                except queue.Empty:
+                    return
+
+                try:
+                    data = self.fetch_range(url, offset, length, headers)
+                    self.write_chunk(dest_path, manifest, fd, offset, data)
+                except Exception as e:
+                    self.report_progress('fragment_error', error=str(e), fragment_offset=offset)
+                    with self._lock:
+                        attempts = state['attempts'].get(offset, 0) + 1
+                        state['attempts'][offset] = attempts
+                        if attempts > self.chunk_retries:
+                            state['errors'].append(e)
+                            return
+                    work.put((offset, length))
+        finally:
+            if not released:
+                with self._lock:
+                    state['active'] -= 1
+
+    def _control(self, workers, state, work, url, dest_path, manifest, fd, headers, started):
+        """按采样周期测量总吞吐量：增加连接带来明显提升就继续增加，否则回退并停止增长"""
+        last_bytes = self.bytes_downloaded
+        last_rate = None
+        growing = self.adaptive
+        previous_target = state['target']
+
+        while any(worker.is_alive() for worker in workers):
+            time.sleep(self.sample_interval)
+            current_bytes = self.bytes_downloaded
+            rate = (current_bytes - last_bytes) / self.sample_interval
+            last_bytes = current_bytes
+            self.connection_history.append(
+                (round(time.time() - started, 1), state['target'], round(rate / (1024 * 1024), 2))
+            )
+            if not self.adaptive or work.empty() or state['errors']:
+                continue
+
+            if last_rate is not None and growing and rate < last_rate * 1.1:
+                # 增加连接没有带来提升（带宽已满或服务器整体限速），回退到上一档
+                growing = False
+                if rate < last_rate * 0.9:
+                    with self._lock:
+                        state['target'] = max(self.min_connections, previous_target)
+                print(f"   🔧 连接数稳定在 {state['target']} ({rate / (1024*1024):.1f}MB/s)")
+            elif growing and state['target'] < self.max_connections:
+                previous_target = state['target']
+                state['target'] = min(self.max_connections, state['target'] + max(1, state['target'] // 2))
+                self._spawn_workers(workers, state, work, url, dest_path, manifest, fd, headers)
+                print(f"   🔧 吞吐量 {rate / (1024*1024):.1f}MB/s，连接数增加到 {state['target']}")
+            last_rate = rate
+
+
+def run_benchmark(size_mb=64, per_connection_kbps=2048, connections=4):
+    """启动本地限速HTTP服务器（每个连接限速），对比单连接与多连接下载耗时"""
+    import http.server
+    import re
+    import tempfile
+
+    work_dir = tempfile.mkdtemp(prefix="parallel_download_bench_")
+    source = os.path.join(work_dir, "source.bin")
+    with open(source, 'wb') as f:
+        f.write(os.urandom(size_mb * 1024 * 1024))
+    total_size = os.path.getsize(source)
+    bytes_per_tick = per_connection_kbps * 1024 // 20  # 每50毫秒发送的字节数
+
+    class ThrottledHandler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            match = re.match(r'bytes=(\d+)-(\d+)', self.headers.get('Range') or '')
+            if match:
+                begin, end = int(match.group(1)), min(int(match.group(2)), total_size - 1)
+                self.send_response(206)
+                self.send_header('Content-Range', f'bytes {begin}-{end}/{total_size}')
+            else:
+                begin, end = 0, total_size - 1
+                self.send_response(200)
+            self.send_header('Content-Length', str(end - begin + 1))
+            self.send_header('Accept-Ranges', 'bytes')
+            self.end_headers()
+            with open(source, 'rb') as f:
+                f.seek(begin)
+                remaining = end - begin + 1
+                while remaining > 0:
+                    data = f.read(min(bytes_per_tick, remaining))
+                    self.wfile.write(data)
+                    remaining -= len(data)
+                    time.sleep(0.05)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), ThrottledHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/source.bin"
+
+    print(f"📊 基准测试: {size_mb}MB 文件，单连接限速 {per_connection_kbps}KB/s")
+    results = []
+    for name, downloader in [
+        ("单连接", ResumableDownloader()),
+        (f"固定{connections}连接", ParallelRangeDownloader(connections=connections, adaptive=False)),
+        ("自适应", ParallelRangeDownloader(connections=2)),
+    ]:
+        dest = os.path.join(work_dir, f"{len(results)}.bin")
+        started = time.time()
+        downloader.download(url, dest)
+        elapsed = time.time() - started
+        with open(dest, 'rb') as a, open(source, 'rb') as b:
+            identical = a.read() == b.read()
+        os.remove(dest)
+        results.append((name, elapsed))
+        print(f"   {name}: {elapsed:.1f}秒 ({size_mb / elapsed:.1f}MB/s) {'✅' if identical else '❌ 内容不一致'}")
+
+    server.shutdown()
+    os.remove(source)
+    os.rmdir(work_dir)
+    baseline = results[0][1]
+    for name, elapsed in results[1:]:
+        print(f"   {name} 加速比: {baseline / elapsed:.1f}x")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='多连接并行下载')
+    parser.add_argument('url', nargs='?')
+    parser.add_argument('output', nargs='?')
+    parser.add_argument('--connections', type=int, default=4, help='初始连接数')
+    parser.add_argument('--max-connections', type=int, default=16, help='自适应时的最大连接数')
+    parser.add_argument('--no-adaptive', action='store_true', help='固定连接数')
+    parser.add_argument('--benchmark', action='store_true', help='在本地限速服务器上对比单连接')
+    parser.add_argument('--size-mb', type=int, default=64, help='基准测试文件大小')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        run_benchmark(size_mb=args.size_mb, connections=args.connections)
+        return
+    if not (args.url and args.output):
+        parser.error('需要 url 和 output，或使用 --benchmark')
+
+    downloader = ParallelRangeDownloader(
+        connections=args.connections, max_connections=args.max_connections, adaptive=not args.no_adaptive
+    )
+    started = time.time()
+    downloader.download(args.url, args.output)
+    elapsed = time.time() - started
+    print(f"✅ 下载完成: {args.output} ({downloader.bytes_downloaded / (1024*1024):.1f}MB, {elapsed:.1f}秒)")
+
+
+if __name__ == "__main__":
+    main()
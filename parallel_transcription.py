@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+并行转录 - 语音活动检测(VAD)切块后在多进程中同时转录
+特点：
+- 基于能量 + 频谱平坦度的VAD：跳过静音、掌声、噪声等非语音区域
+- 在静音处切分为有上限长度的块；超长语音硬切时保留重叠，合并时按重叠中点去重
+- 进程池常驻（每个进程加载一次模型），结果按全局时间戳合并为whisper格式
+
+使用方法:
+python parallel_transcription.py audio.wav --model base --workers 8
+python parallel_transcription.py audio.wav --benchmark --workers 1,2,4,8,16,32
+"""
+
+import argparse
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from audio_artifact import load_audio
+from transcription_backends import engine_tag, load_backend, resolve_backend
+
+SAMPLE_RATE = 16000
+
+# 各模型在CPU上(fp32)大约占用的内存(GB)，用于限制进程数
+MODEL_MEMORY_GB = {
+    'tiny': 0.4, 'base': 0.5, 'small': 1.0, 'medium': 2.5,
+    'large': 5.0, 'large-v1': 5.0, 'large-v2': 5.0, 'large-v3': 5.0, 'turbo': 3.0,
+}
+INT8_MEMORY_RATIO = 0.35  # CTranslate2 int8 权重约为fp32的1/4，另加解码缓存
+
+
+# ---------- VAD ----------
+
+def frame_features(audio, frame_ms=30, block_frames=8192):
+    """逐帧计算能量(dB)与频谱平坦度（分块计算，避免长音频一次性做FFT占用过多内存）"""
+    frame_size = int(SAMPLE_RATE * frame_ms / 1000)
+    count = len(audio) // frame_size
+    frames = audio[:count * frame_size].reshape(count, frame_size)
+    window = np.hanning(frame_size).astype(np.float32)
+
+    energy_db = np.empty(count, dtype=np.float32)
+    flatness = np.empty(count, dtype=np.float32)
+    for begin in range(0, count, block_frames):
+        block = frames[begin:begin + block_frames]
+        rms = np.sqrt(np.mean(block.astype(np.float64) ** 2, axis=1) + 1e-12)
+        energy_db[begin:begin + len(block)] = 20 * np.log10(rms)
+        spectrum = np.abs(np.fft.rfft(block * window, axis=1)) + 1e-10
+        flatness[begin:begin + len(block)] = np.exp(np.mean(np.log(spectrum), axis=1)) / np.mean(spectrum, axis=1)
+    return energy_db, flatness, frame_size
+
+
+def smooth_mask(mask, width):
+    """滑动窗口多数表决，去掉零散的单帧抖动"""
+    if width <= 1 or len(mask) == 0:
+        return mask
+    kernel = np.ones(width, dtype=np.float32) / width
+    return np.convolve(mask.astype(np.float32), kernel, mode='same') >= 0.5
+
+
+def detect_speech(audio, frame_ms=30, margin_db=12.0, min_db=-50.0, flatness_threshold=0.45,
+                  min_speech=0.3, min_silence=0.5, padding=0.2):
+    """返回语音区域列表 [(start, end)]（秒）
+
+    能量阈值 = 背景噪声(10%分位) + margin_db；频谱平坦度高于阈值的帧（掌声、白噪声类）视为非语音
+    """
+    if len(audio) == 0:
+        return []
+    energy_db, flatness, frame_size = frame_features(audio, frame_ms)
+    if len(energy_db) == 0:
+        return []
+
+    noise_floor = float(np.percentile(energy_db, 10))
+    threshold = max(noise_floor + margin_db, min_db)
+    frames_per_second = SAMPLE_RATE / frame_size
+    voiced = (energy_db > threshold) & (smooth_mask(flatness < flatness_threshold, int(0.3 * frames_per_second)))
+    voiced = smooth_mask(voiced, int(0.1 * frames_per_second))
+
+    # 连续语音帧 → 区域
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], voiced.astype(np.int8), [0]))))
+    regions = [(float(start / frames_per_second), float(end / frames_per_second))
+               for start, end in zip(edges[::2], edges[1::2])]
+
+    # 合并短静音、丢弃过短语音、两端留余量
+    merged = []
+    for start, end in regions:
+        if merged and start - merged[-1][1] < min_silence:
+            merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    total = len(audio) / SAMPLE_RATE
+    return [
+        (max(0.0, start - padding), min(total, end + padding))
+        for start, end in merged if end - start >= min_speech
+    ]
+
+
+# ---------- 切块与合并 ----------
+
+def plan_chunks(regions, max_chunk=60.0, skip_gap=2.0, overlap=1.0):
+    """把语音区域组合成长度有上限的块
+
+    返回 [{'start', 'end', 'own_start', 'own_end'}]：own_* 是该块负责的时间范围，
+    硬切产生的重叠部分按中点分给前后两块，合并时据此去重
+    """
+    chunks = []
+    for start, end in regions:
+        if chunks and start - chunks[-1]['end'] < skip_gap and end - chunks[-1]['start'] <= max_chunk:
+            chunks[-1]['end'] = chunks[-1]['own_end'] = end
+            continue
+
+        # 新块；超长语音按 max_chunk 硬切并保留重叠
+        position = start
+        while True:
+            chunk_end = min(end, position + max_chunk)
+            chunk = {'start': position, 'end': chunk_end, 'own_start': position, 'own_end': chunk_end}
+            if chunks and position < chunks[-1]['end']:
+                middle = (position + chunks[-1]['end']) / 2
+                chunks[-1]['own_end'] = middle
+                chunk['own_start'] = middle
+            chunks.append(chunk)
+            if chunk_end >= end:
+                break
+            position = chunk_end - overlap
+
+    # 相邻块之间（静音处切分）的归属边界取间隔中点
+    for previous, current in zip(chunks, chunks[1:]):
+        if previous['own_end'] <= current['own_start']:
+            middle = (previous['end'] + current['start']) / 2
+            previous['own_end'] = max(previous['own_end'], middle)
+            current['own_start'] = min(current['own_start'], middle)
+    return chunks
+
+
+def normalize_text(text):
+    return re.sub(r'[^a-z0-9 ]', '', text.lower()).strip()
+
+
+def owns_segment(chunk, segment):
+    """片段中点落在块的归属范围内时由该块负责"""
+    middle = (segment['start'] + segment['end']) / 2
+    return chunk['own_start'] <= middle <= chunk['own_end']
+
+
+def is_duplicate(previous, segment):
+    """重叠超过较短片段一半且文本相同，视为重叠区域内的重复识别"""
+    overlap = min(previous['end'], segment['end']) - max(previous['start'], segment['start'])
+    shorter = min(previous['end'] - previous['start'], segment['end'] - segment['start'])
+    return overlap > 0 and shorter > 0 and overlap / shorter > 0.5 and \
+        normalize_text(previous['text']) == normalize_text(segment['text'])
+
+
+def iter_merged(chunk_results):
+    """按块顺序逐块产出合并后的片段：每块解码完成即可产出，不必等待后续块"""
+    previous = None
+    index = 0
+    for chunk, segments in chunk_results:
+        for segment in sorted((s for s in segments if owns_segment(chunk, s)), key=lambda s: s['start']):
+            if previous is not None and is_duplicate(previous, segment):
+                continue
+            segment['id'] = index
+            index += 1
+            previous = segment
+            yield segment
+
+
+def merge_segments(chunk_results):
+    """按全局时间合并各块结果：保留中点落在块归属范围内的片段，再去掉相邻的重复片段"""
+    return list(iter_merged(sorted(chunk_results, key=lambda item: item[0]['start'])))
+
+
+def shift_segments(segments, offset, length):
+    """把块内时间戳换算为全局时间戳（不超过块长度）"""
+    shifted = []
+    for segment in segments:
+        segment = dict(segment)
+        segment['start'] = round(segment['start'] + offset, 3)
+        segment['end'] = round(min(segment['end'], length) + offset, 3)
+        if segment.get('words'):
+            segment['words'] = [
+                dict(word, start=round(word['start'] + offset, 3), end=round(word['end'] + offset, 3))
+                for word in segment['words']
+            ]
+        shifted.append(segment)
+    return shifted
+
+
+# ---------- 进程池 ----------
+
+_worker_model = None
+
+
+def _init_worker(model_name, threads, backend):
+    global _worker_model
+    _worker_model = load_backend(model_name, backend, device='cpu', cpu_threads=threads)
+
+
+def _transcribe_chunk(index, offset, audio, options):
+    result = _worker_model.transcribe(audio, **options)
+    return index, shift_segments(result.get('segments', []), offset, len(audio) / SAMPLE_RATE), result.get('language')
+
+
+def available_memory_gb():
+    """可用内存(GB)：优先取 /proc/meminfo 的 MemAvailable（包含可回收的页缓存），
+    SC_AVPHYS_PAGES 只是 MemFree，会明显低估"""
+    try:
+        with open('/proc/meminfo', 'r') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) / 1024 ** 2  # 单位为kB
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE') / 1024 ** 3
+    except (ValueError, OSError, AttributeError):
+        try:
+            return os.sysconf('SC_PHYS_PAGES') * os.sysconf('SC_PAGE_SIZE') / 1024 ** 3 / 2
+        except (ValueError, OSError, AttributeError):
+            return None
+
+
+def default_workers(model_name, threads_per_worker=2, backend=None):
+    """按核数和可用内存决定进程数"""
+    workers = max(1, (os.cpu_count() or 1) // threads_per_worker)
+    memory = available_memory_gb()
+    if memory:
+        model_memory = MODEL_MEMORY_GB.get(model_name, 2.0)
+        if resolve_backend(backend) == 'ctranslate2':
+            model_memory *= INT8_MEMORY_RATIO
+        workers = min(workers, max(1, int(memory * 0.8 / model_memory)))
+    return workers
+
+
+def parallel_capable(min_cores=4):
+    return (os.cpu_count() or 1) >= min_cores
+
+
+def should_use_parallel(duration, min_duration=120.0, min_cores=4):
+    """长音频且多核时才值得启动进程池"""
+    return duration >= min_duration and parallel_capable(min_cores)
+
+
+class ParallelTranscriber:
+    """常驻进程池的并行转录器（每个进程只加载一次模型）"""
+
+    def __init__(self, model_name="base", workers=None, threads_per_worker=2, max_chunk=60.0, backend=None):
+        self.model_name = model_name
+        self.backend = resolve_backend(backend)
+        self.engine_tag = engine_tag(self.backend)
+        self.threads_per_worker = threads_per_worker
+        self.workers = workers or default_workers(model_name, threads_per_worker, self.backend)
+        self.max_chunk = max_chunk
+        self.pool = None
+        self.last_stats = {}
+        self.last_language = None
+
+    def get_pool(self):
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(self.model_name, self.threads_per_worker, self.backend),
+            )
+        return self.pool
+
+    def iter_segments(self, audio, **options):
+        """流式转录：所有块同时提交，按时间顺序逐块产出合并后的片段（前面的块完成即可产出）"""
+        audio = load_audio(audio)
+        options = dict(options)
+        options.pop('verbose', None)
+        options.setdefault('fp16', False)
+
+        started = time.time()
+        duration = len(audio) / SAMPLE_RATE
+        regions = detect_speech(audio)
+        speech_seconds = sum(end - start for start, end in regions)
+        # 块长度兼顾负载均衡：至少让每个进程分到两块
+        max_chunk = min(self.max_chunk, max(15.0, speech_seconds / (self.workers * 2)))
+        chunks = plan_chunks(regions, max_chunk=max_chunk)
+        print(f"🔀 并行转录: {len(chunks)} 块 / {self.workers} 进程，语音 {speech_seconds:.0f}秒 / 总长 {duration:.0f}秒")
+
+        pool = self.get_pool()
+        futures = [
+            pool.submit(
+                _transcribe_chunk, index, chunk['start'],
+                audio[int(chunk['start'] * SAMPLE_RATE):int(chunk['end'] * SAMPLE_RATE)], options
+            )
+            for index, chunk in enumerate(chunks)
+        ]
+        languages = []
+
+        def completed():
+            for future in futures:
+                index, segments, language = future.result()
+                languages.append(language)
+                yield chunks[index], segments
+
+        try:
+            yield from iter_merged(completed())
+        finally:
+            for future in futures:
+                future.cancel()  # 调用方提前停止时，尚未开始的块不再转录
+
+        self.last_stats = {
+            'duration': duration,
+            'speech_seconds': speech_seconds,
+            'chunks': len(chunks),
+            'workers': self.workers,
+            'seconds': time.time() - started,
+        }
+        self.last_language = max(set(languages), key=languages.count) if languages else options.get('language')
+
+    def transcribe(self, audio, **options):
+        """接口与 whisper 模型的 transcribe 相同，返回 {'text', 'segments', 'language'}"""
+        segments = list(self.iter_segments(audio, **options))
+        return {
+            'text': ''.join(segment['text'] for segment in segments),
+            'segments': segments,
+            'language': self.last_language,
+        }
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+
+def run_benchmark(audio_path, model_name, worker_counts, threads_per_worker=2):
+    """墙钟时间对比：单进程整段转录 vs 不同进程数的VAD并行转录"""
+    import torch
+    import whisper
+
+    audio = load_audio(audio_path)
+    duration = len(audio) / SAMPLE_RATE
+    print(f"📊 基准测试: {os.path.basename(audio_path)} ({duration:.0f}秒), 模型 {model_name}, CPU {os.cpu_count()} 核")
+
+    torch.set_num_threads(os.cpu_count() or 1)
+    model = whisper.load_model(model_name, device='cpu')
+    started = time.time()
+    model.transcribe(audio, fp16=False)
+    baseline = time.time() - started
+    del model
+    print(f"   串行（单模型，全部核）: {baseline:.1f}秒 (RTF {baseline / duration:.3f})")
+
+    for workers in worker_counts:
+        transcriber = ParallelTranscriber(model_name, workers=workers, threads_per_worker=threads_per_worker)
+        list(transcriber.get_pool().map(time.sleep, [1.0] * workers))  # 预热：模型加载不计入耗时
+        started = time.time()
+        result = transcriber.transcribe(audio)
+        elapsed = time.time() - started
+        transcriber.close()
+        print(f"   {workers:>2} 进程 × {threads_per_worker} 线程: {elapsed:.1f}秒, 加速 {baseline / elapsed:.2f}x, "
+              f"{len(result['segments'])} 片段")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='VAD切块并行转录')
+    parser.add_argument('audio', help='音频或视频文件')
+    parser.add_argument('--model', default='base')
+    parser.add_argument('--backend', default=None, help='推理后端: openai / ctranslate2')
+    parser.add_argument('--workers', default=None, help='进程数；基准测试时为逗号分隔列表')
+    parser.add_argument('--threads', type=int, default=2, help='每个进程的线程数')
+    parser.add_argument('--language', default=None)
+    parser.add_argument('--benchmark', action='store_true')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        counts = [int(n) for n in (args.workers or '1,2,4,8').split(',')]
+        run_benchmark(args.audio, args.model, counts, args.threads)
+        return
+
+    transcriber = ParallelTranscriber(args.model, workers=int(args.workers) if args.workers else None,
+                                      threads_per_worker=args.threads, backend=args.backend)
+    try:
+        result = transcriber.transcribe(args.audio, language=args.language)
+    finally:
+        transcriber.close()
+    for segment in result['segments']:
+        print(f"[{segment['start']:8.2f} → {segment['end']:8.2f}] {segment['text'].strip()}")
+    stats = transcriber.last_stats
+    print(f"✅ {len(result['segments'])} 个片段，耗时 {stats['seconds']:.1f}秒 (音频 {stats['duration']:.0f}秒)")
+
+
+if __name__ == "__main__":
+    main()
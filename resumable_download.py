@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+可断点续传的下载引擎 - 基于分块清单的崩溃安全下载
+特点：按字节范围(或分片)下载，每完成一块就把偏移、长度、SHA256写入旁路清单；
+进程被杀、网络重置或重启后只补下缺失的块，合并前逐块校验完整性
+
+文件布局（dest 为最终文件路径）:
+  dest.part            预分配的数据文件，各块按偏移写入
+  dest.manifest.json   已完成块的清单（原子替换写入）
+  dest.frags/          分片模式下每个分片单独保存
+
+注意: YouTube 的签名URL每次获取都会变化，因此续传时只校验文件总大小和各块校验和，不校验URL
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import urllib.request
+
+from retry_policy import TransientDownloadError, before_request, record_result
+
+
+class DownloadIntegrityError(TransientDownloadError):
+    """下载内容校验失败"""
+
+
+CONTENT_RANGE = re.compile(r'bytes (\d+)-(\d+)/(\d+|\*)')
+
+
+def open_url(url, headers=None, byte_range=None, timeout=30):
+    request_headers = dict(headers or {})
+    if byte_range:
+        request_headers['Range'] = f"bytes={byte_range[0]}-{byte_range[1]}"
+    request = urllib.request.Request(url, headers=request_headers)
+    before_request(url)  # 按主机共享限速，429熔断期间等待
+    try:
+        response = urllib.request.urlopen(request, timeout=timeout)
+    except Exception as e:
+        record_result(url, e)
+        raise
+    record_result(url)
+    return response
+
+
+def open_range(url, byte_range, headers=None, timeout=30):
+    """发出范围请求并校验响应确实是所请求的范围，返回 (响应, 应读取的字节数)
+
+    忽略 Range 返回 200 整个文件的服务器会被拒绝，不会把整个文件当作一个块保存；
+    请求超出文件末尾时按 Content-Range 中的总大小截短
+    """
+    response = open_url(url, headers, byte_range, timeout)
+    start, end = byte_range
+    match = CONTENT_RANGE.fullmatch((response.headers.get('Content-Range') or '').strip())
+    if response.status != 206 or not match:
+        response.close()
+        raise DownloadIntegrityError(f"服务器未按范围返回数据 (HTTP {response.status})")
+    first, last, total = match.groups()
+    expected_last = min(end, int(total) - 1) if total != '*' else end
+    if int(first) != start or int(last) != expected_last:
+        response.close()
+        raise DownloadIntegrityError(f"返回的范围不符: 请求 {start}-{end}，实际 {first}-{last}/{total}")
+    return response, expected_last - start + 1
+
+
+def read_range(response, length, write, chunk_size=262144):
+    """从范围响应中读取恰好 length 字节，逐块交给 write；数据提前结束时报错"""
+    received = 0
+    while received < length:
+        piece = response.read(min(chunk_size, length - received))
+        if not piece:
+            break
+        write(piece)
+        received += len(piece)
+    if received != length:
+        raise DownloadIntegrityError(f"块长度不符: 期望 {length}，实际 {received}")
+
+
+class ResumableDownloader:
+    """崩溃安全的断点续传下载器"""
+
+    def __init__(self, chunk_size=8 * 1024 * 1024, timeout=30):
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.bytes_downloaded = 0
+        self.progress_hooks = []   # 与 yt-dlp progress_hooks 相同格式的回调
+        self._current = None       # 当前文件: {'filename', 'start_bytes', 'total_bytes'}
+        self._lock = threading.Lock()
+
+    # ---------- 路径与清单 ----------
+
+    @staticmethod
+    def part_path(dest_path):
+        return dest_path + '.part'
+
+    @staticmethod
+    def manifest_path(dest_path):
+        return dest_path + '.manifest.json'
+
+    def load_manifest(self, dest_path):
+        try:
+            with open(self.manifest_path(dest_path), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save_manifest(self, dest_path, manifest):
+        """先写临时文件并fsync，再原子替换，保证清单在任意时刻崩溃都完整可读"""
+        path = self.manifest_path(dest_path)
+        temp_path = path + '.tmp'
+        with self._lock:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, separators=(',', ':'))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, path)
+
+    def describe_progress(self, dest_path):
+        """读取清单，返回 (已完成字节数, 总字节数)；没有清单时返回None"""
+        manifest = self.load_manifest(dest_path)
+        if not manifest:
+            return None
+        done = sum(chunk['length'] for chunk in manifest['chunks'].values())
+        return done, manifest.get('total_size')
+
+    def begin_file(self, dest_path, total_bytes=None):
+        self._current = {'filename': dest_path, 'start_bytes': self.bytes_downloaded, 'total_bytes': total_bytes}
+
+    def report_progress(self, status='downloading', **fields):
+        """以 yt-dlp progress_hooks 的字典格式回调进度"""
+        if not self.progress_hooks or not self._current:
+            return
+        progress = {
+            'status': status,
+            'filename': self._current['filename'],
+            'downloaded_bytes': self.bytes_downloaded - self._current['start_bytes'],
+            'total_bytes': self._current['total_bytes'],
+        }
+        progress.update(fields)
+        for hook in self.progress_hooks:
+            hook(progress)
+
+    # ---------- 网络 ----------
+
+    def open_url(self, url, headers=None, byte_range=None):
+        return open_url(url, headers, byte_range, self.timeout)
+
+    def _received(self, piece):
+        with self._lock:
+            self.bytes_downloaded += len(piece)
+
+    def probe(self, url, headers=None):
+        """探测文件大小以及服务器是否支持范围请求，返回 (总大小或None, 是否支持Range)"""
+        with self.open_url(url, headers, (0, 0)) as response:
+            content_range = response.headers.get('Content-Range', '')
+            if response.status == 206 and '/' in content_range:
+                total = content_range.rsplit('/', 1)[1]
+                return (int(total) if total.isdigit() else None), True
+            length = response.headers.get('Content-Length')
+            return (int(length) if length and length.isdigit() else None), False
+
+    def fetch_range(self, url, offset, length, headers=None, progress=None):
+        """下载一个字节范围，状态码、返回范围或长度不符时报错（不会把错误或截断的数据记为完成）"""
+        progress = progress or {}
+        response, expected = open_range(url, (offset, offset + length - 1), headers, self.timeout)
+        buffer = bytearray()
+
+        def write(piece):
+            buffer.extend(piece)
+            self._received(piece)
+            self.report_progress(**progress)
+
+        with response:
+            if expected != length:
+                raise DownloadIntegrityError(f"块长度不符: 期望 {length}，文件只剩 {expected}")
+            read_range(response, length, write)
+        return bytes(buffer)
+
+    # ---------- 字节范围模式 ----------
+
+    def plan_chunks(self, total_size):
+        return [(offset, min(self.chunk_size, total_size - offset)) for offset in range(0, total_size, self.chunk_size)]
+
+    def prepare(self, url, dest_path, headers=None):
+        """探测并加载/新建清单，返回 (清单, 待下载块列表)；不支持范围请求时返回 (None, None)"""
+        total_size, supports_ranges = self.probe(url, headers)
+        if not supports_ranges or not total_size:
+            return None, None
+
+        manifest = self.load_manifest(dest_path)
+        part = self.part_path(dest_path)
+        if (not manifest or manifest.get('mode') != 'ranges' or manifest.get('total_size') != total_size
+                or not os.path.exists(part)):
+            manifest = {
+                'version': 1,
+                'mode': 'ranges',
+                'total_size': total_size,
+                'chunk_size': self.chunk_size,
+                'chunks': {},
+            }
+            with open(part, 'wb') as f:
+                f.truncate(total_size)  # 预分配（稀疏文件）
+            self.save_manifest(dest_path, manifest)
+        else:
+            bad = self.verify_chunks(part, manifest)
+            if bad:
+                print(f"⚠️ {len(bad)} 个已下载块校验失败，将重新下载")
+                for key in bad:
+                    del manifest['chunks'][key]
+                self.save_manifest(dest_path, manifest)
+            done = sum(chunk['length'] for chunk in manifest['chunks'].values())
+            print(f"📂 续传: 已完成 {done / (1024*1024):.1f}MB / {total_size / (1024*1024):.1f}MB")
+
+        chunk_size = manifest['chunk_size']
+        pending = [
+            (offset, min(chunk_size, total_size - offset))
+            for offset in range(0, total_size, chunk_size)
+            if str(offset) not in manifest['chunks']
+        ]
+        return manifest, pending
+
+    def write_chunk(self, dest_path, manifest, fd, offset, data):
+        """把块写入预分配文件的对应偏移，落盘后再记入清单"""
+        os.pwrite(fd, data, offset)
+        os.fsync(fd)
+        with self._lock:
+            manifest['chunks'][str(offset)] = {
+                'offset': offset,
+                'length': len(data),
+                'sha256': hashlib.sha256(data).hexdigest(),
+            }
+        self.save_manifest(dest_path, manifest)
+
+    def download(self, url, dest_path, headers=None):
+        """下载单个文件，支持中断后续传；返回最终路径"""
+        if os.path.exists(dest_path) and not os.path.exists(self.manifest_path(dest_path)):
+            return dest_path
+
+        manifest, pending = self.prepare(url, dest_path, headers)
+        if manifest is None:
+            print("⚠️ 服务器不支持范围请求，使用单流下载（无法续传）")
+            return self.download_stream(url, dest_path, headers)
+
+        part = self.part_path(dest_path)
+        total_size = manifest['total_size']
+        self.begin_file(dest_path, total_size)
+        fd = os.open(part, os.O_RDWR)
+        try:
+            for index, (offset, length) in enumerate(pending, 1):
+                data = self.fetch_range(url, offset, length, headers)
+                self.write_chunk(dest_path, manifest, fd, offset, data)
+                if index % 16 == 0 or index == len(pending):
+                    done = sum(chunk['length'] for chunk in manifest['chunks'].values())
+                    print(f"   ⬇️ {done / total_size * 100:.0f}% ({done / (1024*1024):.1f}MB)")
+        finally:
+            os.close(fd)
+
+        return self.finalize(dest_path, manifest)
+
+    def download_stream(self, url, dest_path, headers=None):
+        part = self.part_path(dest_path)
+        self.begin_file(dest_path)
+        with self.open_url(url, headers) as response, open(part, 'wb') as f:
+            while True:
+                data = response.read(1024 * 1024)
+                if not data:
+                    break
+                f.write(data)
+                self._received(data)
+                self.report_progress()
+        os.replace(part, dest_path)
+        self.report_progress('finished')
+        return dest_path
+
+    def verify_chunks(self, part, manifest):
+        """重新读取数据文件，返回校验和不匹配的块"""
+        bad = []
+        with open(part, 'rb') as f:
+            for key, chunk in manifest['chunks'].items():
+                f.seek(chunk['offset'])
+                data = f.read(chunk['length'])
+                if len(data) != chunk['length'] or hashlib.sha256(data).hexdigest() != chunk['sha256']:
+                    bad.append(key)
+        return bad
+
+    def finalize(self, dest_path, manifest):
+        """合并前完整性校验：所有块齐全且校验和一致后才替换为最终文件"""
+        part = self.part_path(dest_path)
+        covered = sum(chunk['length'] for chunk in manifest['chunks'].values())
+        if covered != manifest['total_size']:
+            raise DownloadIntegrityError(f"数据不完整: {covered}/{manifest['total_size']} 字节")
+
+        bad = self.verify_chunks(part, manifest)
+        if bad:
+            for key in bad:
+                del manifest['chunks'][key]
+            self.save_manifest(dest_path, manifest)
+            raise DownloadIntegrityError(f"{len(bad)} 个块校验失败，重试时将重新下载")
+
+        os.replace(part, dest_path)
+        os.remove(self.manifest_path(dest_path))
+        self.report_progress('finished')
+        return dest_path
+
+    # ---------- 分片模式 ----------
+
+    def download_fragments(self, fragments, dest_path, headers=None, init=None):
+        """按分片列表下载（DASH/HLS），每个分片单独保存并记入清单，校验后按顺序拼接
+
+        fragments/init 的格式与 SegmentFetcher 的分片计划一致: {'url', 'byte_range'}
+        """
+        if os.path.exists(dest_path) and not os.path.exists(self.manifest_path(dest_path)):
+            return dest_path
+
+        pieces = ([init] if init else []) + list(fragments)
+        frag_dir = dest_path + '.frags'
+        os.makedirs(frag_dir, exist_ok=True)
+
+        manifest = self.load_manifest(dest_path)
+        if not manifest or manifest.get('mode') != 'fragments' or manifest.get('count') != len(pieces):
+            manifest = {'version': 1, 'mode': 'fragments', 'count': len(pieces), 'chunks': {}}
+            self.save_manifest(dest_path, manifest)
+        else:
+            bad = [key for key in manifest['chunks'] if not self._fragment_ok(frag_dir, key, manifest['chunks'][key])]
+            for key in bad:
+                del manifest['chunks'][key]
+            print(f"📂 续传: 已完成 {len(manifest['chunks'])}/{len(pieces)} 个分片")
+
+        self.begin_file(dest_path)
+        for index, piece in enumerate(pieces):
+            key = str(index)
+            if key in manifest['chunks']:
+                continue
+            progress = {'fragment_index': index + 1, 'fragment_count': len(pieces)}
+            if piece.get('byte_range'):
+                start, end = piece['byte_range']
+                data = self.fetch_range(piece['url'], start, end - start + 1, headers, progress)
+            else:
+                with self.open_url(piece['url'], headers) as response:
+                    data = response.read()
+                self._received(data)
+                self.report_progress(**progress)
+            self.write_fragment(dest_path, manifest, frag_dir, key, data)
+
+        return self.finalize_fragments(dest_path, manifest, frag_dir)
+
+    def write_fragment(self, dest_path, manifest, frag_dir, key, data):
+        path = os.path.join(frag_dir, f"{int(key):06d}")
+        with open(path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        with self._lock:
+            manifest['chunks'][key] = {'offset': 0, 'length': len(data), 'sha256': hashlib.sha256(data).hexdigest()}
+        self.save_manifest(dest_path, manifest)
+
+    @staticmethod
+    def _fragment_ok(frag_dir, key, chunk):
+        path = os.path.join(frag_dir, f"{int(key):06d}")
+        if not os.path.exists(path) or os.path.getsize(path) != chunk['length']:
+            return False
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest() == chunk['sha256']
+
+    def finalize_fragments(self, dest_path, manifest, frag_dir):
+        bad = [key for key, chunk in manifest['chunks'].items() if not self._fragment_ok(frag_dir, key, chunk)]
+        if bad or len(manifest['chunks']) != manifest['count']:
+            for key in bad:
+                del manifest['chunks'][key]
+            self.save_manifest(dest_path, manifest)
+            raise DownloadIntegrityError(f"分片不完整或校验失败: {len(manifest['chunks'])}/{manifest['count']}")
+
+        part = self.part_path(dest_path)
+        with open(part, 'wb') as out_file:
+            for index in range(manifest['count']):
+                with open(os.path.join(frag_dir, f"{index:06d}"), 'rb') as f:
+                    shutil.copyfileobj(f, out_file)
+            out_file.flush()
+            os.fsync(out_file.fileno())
+        os.replace(part, dest_path)
+        os.remove(self.manifest_path(dest_path))
+        shutil.rmtree(frag_dir, ignore_errors=True)
+        self.report_progress('finished')
+        return dest_path
+
+
+def main():
+    """命令行: python resumable_download.py <url> <输出文件>（中断后重新运行即可续传）"""
+    import sys
+
+    if len(sys.argv) != 3:
+        print("使用方法: python resumable_download.py <url> <输出文件>")
+        return
+
+    url, dest_path = sys.argv[1:]
+    downloader = ResumableDownloader()
+    started = time.time()
+    downloader.download(url, dest_path)
+    elapsed = time.time() - started
+    print(f"✅ 下载完成: {dest_path} (本次 {downloader.bytes_downloaded / (1024*1024):.1f}MB, {elapsed:.1f}秒)")
+
+
+if __name__ == "__main__":
+    main()
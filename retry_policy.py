@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+统一重试策略 - 所有下载入口共用
+特点：
+- 按异常类型分类（yt-dlp / urllib / socket 异常链），不再匹配错误文本
+- 指数退避 + 去相关抖动（decorrelated jitter），批量任务不会在同一时刻集中重试
+- 同一主机共享令牌桶限速（同一进程内的所有任务共用）
+- 连续收到 429 时打开熔断器，冷却期内该主机的所有请求排队等待
+"""
+
+import http.client
+import random
+import socket
+import subprocess
+import threading
+import time
+import urllib.error
+from urllib.parse import urlparse
+
+import yt_dlp.utils
+
+try:
+    from yt_dlp.networking.exceptions import HTTPError as YtdlpHTTPError, TransportError
+except ImportError:  # 旧版 yt-dlp
+    YtdlpHTTPError = TransportError = ()
+
+TRANSIENT = 'transient'   # 网络抖动、超时、5xx：退避后重试
+THROTTLED = 'throttled'   # 429：退避并计入熔断器
+FATAL = 'fatal'           # 视频不可用、私有、地区限制、404：不再重试
+UNKNOWN = 'unknown'       # 无法识别：按临时错误有限次重试
+
+
+class TransientDownloadError(Exception):
+    """可重试的下载错误（例如数据不完整、校验失败）"""
+
+
+def iter_causes(exc, limit=8):
+    """沿 DownloadError.exc_info、ExtractorError.cause、__cause__/__context__ 展开异常链"""
+    seen = set()
+    pending = [exc]
+    while pending and len(seen) < limit:
+        current = pending.pop(0)
+        if current is None or id(current) in seen or not isinstance(current, BaseException):
+            continue
+        seen.add(id(current))
+        yield current
+        exc_info = getattr(current, 'exc_info', None)
+        if isinstance(exc_info, tuple) and len(exc_info) > 1:
+            pending.append(exc_info[1])
+        pending.extend([getattr(current, 'cause', None), current.__cause__, current.__context__])
+
+
+def http_status(exc):
+    if YtdlpHTTPError and isinstance(exc, YtdlpHTTPError):
+        return exc.status
+    if isinstance(exc, urllib.error.HTTPError):
+        return exc.code
+    return None
+
+
+def retry_after(exc):
+    """读取429响应的 Retry-After（秒），没有时返回None"""
+    for cause in iter_causes(exc):
+        response = getattr(cause, 'response', None)
+        headers = getattr(response, 'headers', None) or getattr(cause, 'headers', None)
+        value = headers.get('Retry-After') if headers is not None else None
+        if value and str(value).strip().isdigit():
+            return float(value)
+    return None
+
+
+def classify_process_error(exc):
+    """yt-dlp 命令行子进程只能从其 ERROR 输出判断类型"""
+    output = f"{exc.stderr or ''}{exc.output or ''}" if isinstance(exc, subprocess.CalledProcessError) else ''
+    if 'HTTP Error 429' in output:
+        return THROTTLED
+    if any(marker in output for marker in ('Private video', 'Video unavailable', 'HTTP Error 404', 'not available in your country')):
+        return FATAL
+    return UNKNOWN
+
+
+def classify_error(exc):
+    """按异常类型判断错误类别"""
+    for cause in iter_causes(exc):
+        status = http_status(cause)
+        if status == 429:
+            return THROTTLED
+        if status in (401, 404, 410, 451):
+            return FATAL
+        if status is not None:
+            return TRANSIENT  # 5xx、408，以及签名URL过期导致的403
+        if isinstance(cause, (yt_dlp.utils.GeoRestrictedError, yt_dlp.utils.UnsupportedError)):
+            return FATAL
+        if isinstance(cause, yt_dlp.utils.ExtractorError) and cause.expected:
+            return FATAL  # 私有、已删除、需要登录等
+        if isinstance(cause, (TransientDownloadError, TimeoutError, socket.timeout, ConnectionError,
+                              urllib.error.URLError, http.client.HTTPException,
+                              yt_dlp.utils.ContentTooShortError)):
+            return TRANSIENT
+        if TransportError and isinstance(cause, TransportError):
+            return TRANSIENT
+        if isinstance(cause, subprocess.TimeoutExpired):
+            return TRANSIENT
+        if isinstance(cause, subprocess.CalledProcessError):
+            return classify_process_error(cause)
+    return UNKNOWN
+
+
+class TokenBucket:
+    """令牌桶：平均每秒 rate 个请求，允许 capacity 个突发"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    """连续 threshold 次 429 后打开，冷却时间随连续打开次数翻倍"""
+
+    def __init__(self, threshold=3, cooldown=60.0, max_cooldown=900.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.consecutive = 0
+        self.opened = 0
+        self.open_until = 0.0
+        self._lock = threading.Lock()
+
+    def record_throttle(self, host, hint=None):
+        with self._lock:
+            self.consecutive += 1
+            if self.consecutive < self.threshold and not hint:
+                return
+            cooldown = min(self.max_cooldown, self.cooldown * (2 ** self.opened))
+            cooldown = max(cooldown, hint or 0)
+            until = time.monotonic() + cooldown
+            if until > self.open_until:
+                self.open_until = until
+                self.opened += 1
+                print(f"🚧 {host} 频繁限流，暂停该主机的请求 {cooldown:.0f} 秒")
+
+    def record_success(self):
+        with self._lock:
+            self.consecutive = 0
+            self.opened = 0
+
+    def wait(self):
+        remaining = self.open_until - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+
+
+class HostState:
+    def __init__(self, host, rate, burst):
+        self.host = host
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker()
+
+
+_hosts = {}
+_hosts_lock = threading.Lock()
+
+HOST_RATE = 8.0    # 每个主机每秒请求数
+HOST_BURST = 16
+
+
+def host_key(url):
+    """按注册域名合并主机（rr1---sn-xx.googlevideo.com 与 rr2---... 共享限速）"""
+    hostname = (urlparse(url).hostname or '').lower()
+    labels = hostname.split('.')
+    return '.'.join(labels[-2:]) if len(labels) > 2 else hostname
+
+
+def get_host_state(url):
+    key = host_key(url)
+    with _hosts_lock:
+        state = _hosts.get(key)
+        if state is None:
+            state = _hosts[key] = HostState(key, HOST_RATE, HOST_BURST)
+        return state
+
+
+def before_request(url):
+    """发起请求前调用：熔断器打开时等待，然后取一个令牌"""
+    state = get_host_state(url)
+    state.breaker.wait()
+    state.bucket.acquire()
+
+
+def record_result(url, exc=None, kind=None):
+    """请求结束后调用，更新该主机的熔断器"""
+    state = get_host_state(url)
+    if exc is None:
+        state.breaker.record_success()
+        return
+    if (kind or classify_error(exc)) == THROTTLED:
+        state.breaker.record_throttle(state.host, retry_after(exc))
+
+
+class RetryPolicy:
+    """带分类、退避与主机级限流的重试执行器"""
+
+    def __init__(self, max_attempts=3, base_delay=2.0, max_delay=120.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def next_delay(self, previous):
+        """去相关抖动: sleep = min(cap, random(base, previous * 3))"""
+        return min(self.max_delay, random.uniform(self.base_delay, max(self.base_delay, previous * 3)))
+
+    def run(self, operation, url, description="下载", on_retry=None):
+        """执行 operation(attempt)，按错误类别决定是否重试；最终失败时抛出最后一个异常"""
+        delay = self.base_delay
+        for attempt in range(self.max_attempts):
+            before_request(url)
+            try:
+                result = operation(attempt)
+            except Exception as e:
+                kind = classify_error(e)
+                record_result(url, e, kind)
+                if kind == FATAL:
+                    print(f"❌ {description}失败且不可重试: {str(e)[:80]}")
+                    raise
+                if attempt == self.max_attempts - 1:
+                    raise
+
+                delay = self.next_delay(delay)
+                if kind == THROTTLED:
+                    delay = max(delay, retry_after(e) or 0)
+                print(f"⏱️  {description}遇到{kind}错误，{delay:.1f} 秒后重试 ({attempt + 2}/{self.max_attempts})")
+                if on_retry:
+                    on_retry(kind, delay, e)
+                time.sleep(delay)
+            else:
+                record_result(url)
+                return result
@@ -0,0 +1,470 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按时间范围分片下载 - 只获取切片需要的片段
+特点：解析DASH/HLS分片列表或MP4索引(sidx)，只下载覆盖 [start-ε, end+ε] 的分片，再用ffmpeg精确切割
+
+支持的来源:
+- yt-dlp 提供的 fragments 列表 (http_dash_segments 等)
+- HLS 媒体播放列表 (m3u8 / m3u8_native)
+- DASH MPD 清单 (SegmentTemplate / SegmentTimeline / SegmentList / SegmentBase)
+- 带 sidx 索引的分段MP4直链 (YouTube 的 mp4/m4a DASH 格式)
+
+不支持时返回 None，调用方应回退到完整下载。
+"""
+
+import os
+import re
+import struct
+import subprocess
+import time
+import xml.etree.ElementTree as ET
+from urllib.parse import urljoin
+
+from resumable_download import open_range, open_url, read_range
+
+# 更容易按范围获取的格式（mp4/m4a 带 sidx 索引），不满足时回退到通用格式
+RANGE_FRIENDLY_FORMAT = 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/bestvideo+bestaudio/best'
+
+MPD_NS = '{urn:mpeg:dash:schema:mpd:2011}'
+
+
+def parse_timestamp(value):
+    """解析时间字符串为秒数，支持 50:00、1:02:03、2m36s、1h2m3s、90.5"""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+
+    value = value.strip().lower()
+    if ':' in value:
+        seconds = 0.0
+        for part in value.split(':'):
+            seconds = seconds * 60 + float(part)
+        return seconds
+
+    match = re.fullmatch(r'(?:(\d+(?:\.\d+)?)h)?(?:(\d+(?:\.\d+)?)m)?(?:(\d+(?:\.\d+)?)s?)?', value)
+    if match and any(match.groups()):
+        hours, minutes, seconds = (float(group or 0) for group in match.groups())
+        return hours * 3600 + minutes * 60 + seconds
+    raise ValueError(f"无法解析时间: {value}")
+
+
+def resolve_requested_formats(info, format_spec):
+    """用yt-dlp的格式选择器解析出实际要下载的格式列表（视频+音频或单一格式）"""
+    import yt_dlp
+
+    with yt_dlp.YoutubeDL({'quiet': True, 'no_warnings': True, 'format': format_spec}) as ydl:
+        resolved = ydl.process_ie_result(dict(info), download=False)
+    return resolved.get('requested_formats') or [resolved]
+
+
+def parse_iso_duration(value):
+    """解析 MPD 中的 ISO8601 时长，如 PT1H2M3.5S"""
+    match = re.fullmatch(r'P(?:(\d+)D)?T?(?:(\d+)H)?(?:(\d+)M)?(?:([\d.]+)S)?', value or '')
+    if not match:
+        return None
+    days, hours, minutes, seconds = match.groups()
+    return (int(days or 0) * 86400 + int(hours or 0) * 3600
+            + int(minutes or 0) * 60 + float(seconds or 0))
+
+
+class SegmentFetcher:
+    """范围感知的分片下载器"""
+
+    def __init__(self, padding=2.0, timeout=30, reencode=True, probe_bytes=262144):
+        self.padding = padding          # ε：切片前后各多取的秒数，保证关键帧覆盖
+        self.timeout = timeout
+        self.reencode = reencode        # True: 重新编码实现帧级精确切割
+        self.probe_bytes = probe_bytes  # 读取MP4索引时首次请求的字节数
+        self.bytes_downloaded = 0
+
+    # ---------- 网络 ----------
+
+    def fetch_bytes(self, url, headers=None, byte_range=None):
+        buffer = bytearray()
+        self.fetch_to_file(url, buffer, headers, byte_range)
+        return bytes(buffer)
+
+    def fetch_to_file(self, url, out_file, headers=None, byte_range=None, chunk_size=1048576):
+        """写入 out_file（文件或 bytearray）；有 byte_range 时服务器必须按范围返回（206且长度相符），
+        否则抛出 DownloadIntegrityError，由 fetch_clip 回退到完整下载，不会把整个文件拼进切片"""
+        write = out_file.extend if isinstance(out_file, bytearray) else out_file.write
+
+        def received(chunk):
+            write(chunk)
+            self.bytes_downloaded += len(chunk)
+
+        if byte_range:
+            response, expected = open_range(url, byte_range, headers, self.timeout)
+            with response:
+                read_range(response, expected, received, chunk_size)
+            return
+        with open_url(url, headers, timeout=self.timeout) as response:
+            for chunk in iter(lambda: response.read(chunk_size), b''):
+                received(chunk)
+
+    # ---------- 分片计划 ----------
+
+    def plan_format(self, fmt):
+        """返回 {'init': piece或None, 'fragments': [{'url','start','duration','byte_range'}]}，无法规划时返回None"""
+        if fmt.get('fragments'):
+            return self.plan_from_fragment_list(fmt)
+
+        protocol = fmt.get('protocol', '')
+        url = fmt.get('url')
+        headers = fmt.get('http_headers')
+        if not url:
+            return None
+        if protocol.startswith('m3u8'):
+            return self.plan_from_hls(url, headers)
+        if url.split('?')[0].endswith('.mpd') or protocol == 'dash':
+            return self.plan_from_mpd(fmt.get('manifest_url') or url, headers, fmt.get('format_id'))
+        if fmt.get('ext') in ('mp4', 'm4a') and protocol in ('https', 'http', ''):
+            return self.plan_from_sidx(url, headers)
+        return None
+
+    def plan_from_fragment_list(self, fmt):
+        """yt-dlp 的 fragments 列表：开头无时长的条目是初始化分片"""
+        base_url = fmt.get('fragment_base_url') or ''
+        init = None
+        fragments = []
+        position = 0.0
+        for fragment in fmt['fragments']:
+            url = fragment.get('url') or urljoin(base_url, fragment.get('path', ''))
+            duration = fragment.get('duration')
+            if duration is None:
+                if fragments:
+                    return None  # 中间分片缺少时长，无法按时间定位
+                init = {'url': url, 'byte_range': None}
+                continue
+            fragments.append({'url': url, 'start': position, 'duration': duration, 'byte_range': None})
+            position += duration
+        return {'init': init, 'fragments': fragments} if fragments else None
+
+    def plan_from_hls(self, playlist_url, headers=None):
+        """解析HLS播放列表（主列表时选码率最高的变体）"""
+        text = self.fetch_bytes(playlist_url, headers).decode('utf-8', 'replace')
+        lines = [line.strip() for line in text.splitlines() if line.strip()]
+
+        if any(line.startswith('#EXT-X-STREAM-INF') for line in lines):
+            variants = []
+            for index, line in enumerate(lines):
+                if line.startswith('#EXT-X-STREAM-INF') and index + 1 < len(lines):
+                    bandwidth = re.search(r'BANDWIDTH=(\d+)', line)
+                    variants.append((int(bandwidth.group(1)) if bandwidth else 0, lines[index + 1]))
+            return self.plan_from_hls(urljoin(playlist_url, max(variants)[1]), headers)
+
+        init = None
+        fragments = []
+        position = 0.0
+        duration = None
+        byte_range = None
+        next_offset = 0
+        for line in lines:
+            if line.startswith('#EXT-X-MAP'):
+                uri = re.search(r'URI="([^"]+)"', line).group(1)
+                map_range = re.search(r'BYTERANGE="(\d+)(?:@(\d+))?"', line)
+                init = {
+                    'url': urljoin(playlist_url, uri),
+                    'byte_range': self._hls_byte_range(map_range.group(1), map_range.group(2), 0) if map_range else None,
+                }
+            elif line.startswith('#EXTINF:'):
+                duration = float(line[8:].split(',')[0])
+            elif line.startswith('#EXT-X-BYTERANGE:'):
+                length, _, offset = line[17:].partition('@')
+                byte_range = self._hls_byte_range(length, offset or None, next_offset)
+                next_offset = byte_range[1] + 1
+            elif line.startswith('#EXT-X-KEY') and 'METHOD=NONE' not in line:
+                return None  # 加密流交给yt-dlp处理
+            elif not line.startswith('#') and duration is not None:
+                fragments.append({
+                    'url': urljoin(playlist_url, line),
+                    'start': position,
+                    'duration': duration,
+                    'byte_range': byte_range,
+                })
+                position += duration
+                duration = None
+                byte_range = None
+        return {'init': init, 'fragments': fragments} if fragments else None
+
+    @staticmethod
+    def _hls_byte_range(length, offset, default_offset):
+        start = int(offset) if offset is not None else default_offset
+        return (start, start + int(length) - 1)
+
+    def plan_from_mpd(self, mpd_url, headers=None, representation_id=None):
+        """解析DASH清单，按 representation_id 选择（未指定时选第一个视频表示）"""
+        root = ET.fromstring(self.fetch_bytes(mpd_url, headers))
+        total_duration = parse_iso_duration(root.get('mediaPresentationDuration'))
+        base_url = urljoin(mpd_url, self._base_url(root))
+
+        for period in root.iter(f'{MPD_NS}Period'):
+            period_base = urljoin(base_url, self._base_url(period))
+            for adaptation in period.iter(f'{MPD_NS}AdaptationSet'):
+                adaptation_base = urljoin(period_base, self._base_url(adaptation))
+                for representation in adaptation.iter(f'{MPD_NS}Representation'):
+                    rep_id = representation.get('id')
+                    mime = representation.get('mimeType') or adaptation.get('mimeType') or ''
+                    if representation_id is not None and rep_id != str(representation_id):
+                        continue
+                    if representation_id is None and not mime.startswith('video'):
+                        continue
+                    rep_base = urljoin(adaptation_base, self._base_url(representation))
+                    return self._plan_representation(
+                        representation, adaptation, rep_base, total_duration, headers
+                    )
+        return None
+
+    @staticmethod
+    def _base_url(element):
+        node = element.find(f'{MPD_NS}BaseURL')
+        return node.text.strip() if node is not None and node.text else ''
+
+    def _plan_representation(self, representation, adaptation, base_url, total_duration, headers):
+        template = representation.find(f'{MPD_NS}SegmentTemplate')
+        if template is None:
+            template = adaptation.find(f'{MPD_NS}SegmentTemplate')
+        if template is not None:
+            return self._plan_segment_template(template, representation, base_url, total_duration)
+
+        segment_list = representation.find(f'{MPD_NS}SegmentList')
+        if segment_list is not None:
+            timescale = int(segment_list.get('timescale', 1))
+            duration = int(segment_list.get('duration', 0)) / timescale
+            init_node = segment_list.find(f'{MPD_NS}Initialization')
+            init = {'url': urljoin(base_url, init_node.get('sourceURL')), 'byte_range': None} if init_node is not None else None
+            fragments = []
+            for index, node in enumerate(segment_list.iter(f'{MPD_NS}SegmentURL')):
+                fragments.append({
+                    'url': urljoin(base_url, node.get('media')),
+                    'start': index * duration,
+                    'duration': duration,
+                    'byte_range': None,
+                })
+            return {'init': init, 'fragments': fragments} if fragments and duration else None
+
+        if representation.find(f'{MPD_NS}SegmentBase') is not None:
+            return self.plan_from_sidx(base_url, headers)
+        return None
+
+    def _plan_segment_template(self, template, representation, base_url, total_duration):
+        timescale = int(template.get('timescale', 1))
+        start_number = int(template.get('startNumber', 1))
+        media = template.get('media')
+        variables = {'RepresentationID': representation.get('id'), 'Bandwidth': representation.get('bandwidth')}
+
+        def expand(pattern, number=None, segment_time=None):
+            def replace(match):
+                name, fmt = match.group(1), match.group(2)
+                value = {'Number': number, 'Time': segment_time}.get(name, variables.get(name))
+                return (fmt % int(value)) if fmt else str(value)
+            return urljoin(base_url, re.sub(r'\$(\w+)(%0\d+d)?\$', replace, pattern))
+
+        init = None
+        if template.get('initialization'):
+            init = {'url': expand(template.get('initialization')), 'byte_range': None}
+
+        fragments = []
+        timeline = template.find(f'{MPD_NS}SegmentTimeline')
+        if timeline is not None:
+            number = start_number
+            segment_time = 0
+            for node in timeline.iter(f'{MPD_NS}S'):
+                segment_time = int(node.get('t', segment_time))
+                duration = int(node.get('d'))
+                for _ in range(int(node.get('r', 0)) + 1):
+                    fragments.append({
+                        'url': expand(media, number, segment_time),
+                        'start': segment_time / timescale,
+                        'duration': duration / timescale,
+                        'byte_range': None,
+                    })
+                    segment_time += duration
+                    number += 1
+        elif template.get('duration') and total_duration:
+            duration = int(template.get('duration')) / timescale
+            count = int(-(-total_duration // duration))
+            for index in range(count):
+                fragments.append({
+                    'url': expand(media, start_number + index, int(index * duration * timescale)),
+                    'start': index * duration,
+                    'duration': min(duration, total_duration - index * duration),
+                    'byte_range': None,
+                })
+        return {'init': init, 'fragments': fragments} if fragments else None
+
+    def plan_from_sidx(self, url, headers=None):
+        """读取分段MP4开头的 ftyp/moov/sidx，按 sidx 得到每个分段的字节范围和时长"""
+        head = self.fetch_bytes(url, headers, (0, self.probe_bytes - 1))
+        offset = 0
+        while offset + 8 <= len(head):
+            size, box_type = struct.unpack('>I4s', head[offset:offset + 8])
+            if size == 1:
+                size = struct.unpack('>Q', head[offset + 8:offset + 16])[0]
+            if size < 8:
+                return None
+            if box_type == b'sidx':
+                if offset + size > len(head):
+                    head += self.fetch_bytes(url, headers, (len(head), offset + size - 1))
+                return self._parse_sidx(url, head[offset:offset + size], offset, size)
+            if box_type in (b'moof', b'mdat'):
+                return None  # 没有全局索引
+            offset += size
+        return None
+
+    def _parse_sidx(self, url, box, box_offset, box_size):
+        version = box[8]
+        timescale = struct.unpack('>I', box[16:20])[0]
+        if version == 0:
+            earliest, first_offset = struct.unpack('>II', box[20:28])
+            cursor = 28
+        else:
+            earliest, first_offset = struct.unpack('>QQ', box[20:36])
+            cursor = 36
+        reference_count = struct.unpack('>H', box[cursor + 2:cursor + 4])[0]
+        cursor += 4
+
+        # 初始化分片为 sidx 之前的 ftyp+moov；去掉 sidx 本身，避免拼接后索引偏移错误
+        init = {'url': url, 'byte_range': (0, box_offset - 1)}
+        fragments = []
+        byte_position = box_offset + box_size + first_offset
+        time_position = earliest / timescale
+        for _ in range(reference_count):
+            reference, duration, _sap = struct.unpack('>III', box[cursor:cursor + 12])
+            cursor += 12
+            if reference >> 31:
+                return None  # 分层索引，暂不支持
+            size = reference & 0x7FFFFFFF
+            fragments.append({
+                'url': url,
+                'start': time_position,
+                'duration': duration / timescale,
+                'byte_range': (byte_position, byte_position + size - 1),
+            })
+            byte_position += size
+            time_position += duration / timescale
+        return {'init': init, 'fragments': fragments} if fragments else None
+
+    # ---------- 下载与切割 ----------
+
+    def select_window(self, plan, start, end):
+        """选出覆盖 [start-ε, end+ε] 的分片"""
+        window_start = start - self.padding
+        window_end = end + self.padding
+        return [
+            fragment for fragment in plan['fragments']
+            if fragment['start'] + fragment['duration'] > window_start and fragment['start'] < window_end
+        ]
+
+    def fetch_range(self, fmt, start, end, dest_path):
+        """下载单个格式覆盖时间范围的分片，拼接到 dest_path，返回 (路径, 窗口起点秒数)"""
+        plan = self.plan_format(fmt)
+        if not plan:
+            return None, None
+
+        selected = self.select_window(plan, start, end)
+        if not selected:
+            return None, None
+
+        headers = fmt.get('http_headers')
+        with open(dest_path, 'wb') as out_file:
+            if plan['init']:
+                self.fetch_to_file(plan['init']['url'], out_file, headers, plan['init']['byte_range'])
+            for fragment in selected:
+                self.fetch_to_file(fragment['url'], out_file, headers, fragment['byte_range'])
+        return dest_path, selected[0]['start']
+
+    def fetch_clip(self, info, start, end, output_path, format_spec=RANGE_FRIENDLY_FORMAT):
+        """只下载切片范围内的分片并精确切割，失败时返回None（调用方应回退到完整下载）"""
+        start = parse_timestamp(start)
+        end = parse_timestamp(end)
+        if start is None or end is None or end <= start:
+            return None
+
+        try:
+            formats = resolve_requested_formats(info, format_spec)
+        except Exception as e:
+            print(f"⚠️ 格式解析失败，无法按范围下载: {str(e)[:80]}")
+            return None
+
+        print(f"🎯 按范围下载: {start:.1f}s - {end:.1f}s (前后各留 {self.padding}s)")
+        started = time.time()
+        parts = []
+        try:
+            for index, fmt in enumerate(formats):
+                part_path = f"{output_path}.part{index}.{fmt.get('ext', 'mp4')}"
+                try:
+                    path, window_start = self.fetch_range(fmt, start, end, part_path)
+                except Exception:
+                    if os.path.exists(part_path):
+                        os.remove(part_path)
+                    raise
+                if not path:
+                    print(f"⚠️ 格式 {fmt.get('format_id')} 不支持按范围下载")
+                    return None
+                parts.append((path, window_start))
+        except Exception as e:
+            print(f"⚠️ 分片下载失败: {str(e)[:80]}")
+            return None
+        finally:
+            if len(parts) < len(formats):
+                for path, _ in parts:
+                    if os.path.exists(path):
+                        os.remove(path)
+
+        size_mb = self.bytes_downloaded / (1024 * 1024)
+        print(f"✅ 分片下载完成: {size_mb:.1f}MB ({time.time() - started:.1f}秒)")
+
+        try:
+            return self.cut(parts, start, end, output_path)
+        finally:
+            for path, _ in parts:
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def cut(self, parts, start, end, output_path):
+        """对下载的分片做精确切割并合并音视频"""
+        cmd = ['ffmpeg', '-y']
+        for path, window_start in parts:
+            # 输入端 -ss 相对于该文件的起始时间戳
+            cmd += ['-ss', f"{max(0.0, start - window_start):.3f}", '-i', path]
+        cmd += ['-t', f"{end - start:.3f}"]
+        for index in range(len(parts)):
+            cmd += ['-map', f'{index}']
+        if self.reencode:
+            cmd += ['-c:v', 'libx264', '-preset', 'medium', '-crf', '18', '-c:a', 'aac', '-b:a', '192k']
+        else:
+            cmd += ['-c', 'copy']
+        cmd += ['-movflags', '+faststart', output_path]
+
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        if result.returncode != 0:
+            print(f"❌ 精确切割失败: {result.stderr[-300:]}")
+            return None
+        print(f"✂️ 精确切割完成: {output_path}")
+        return output_path
+
+
+def main():
+    """命令行: python segment_fetcher.py <url> <开始> <结束> <输出.mp4>"""
+    import sys
+    import yt_dlp
+
+    if len(sys.argv) != 5:
+        print("使用方法: python segment_fetcher.py <url> <开始时间> <结束时间> <输出文件>")
+        print("例如: python segment_fetcher.py https://www.youtube.com/watch?v=xxx 50:00 50:40 clip.mp4")
+        return
+
+    url, start, end, output_path = sys.argv[1:]
+    with yt_dlp.YoutubeDL({'quiet': True, 'no_warnings': True}) as ydl:
+        info = ydl.extract_info(url, download=False)
+
+    fetcher = SegmentFetcher()
+    if not fetcher.fetch_clip(info, start, end, output_path):
+        print("❌ 按范围下载失败，请使用完整下载")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+选择性重新识别 - 快速模型的结果保留，只把低置信度的片段交给高精度模型重新识别
+特点：
+- 按 avg_logprob、compression_ratio、no_speech_prob 与词表误识别标记可疑片段
+- 相邻的可疑片段合并为区间，前后各加上下文余量后只解码这些音频窗口
+- 高精度模型的结果中只取中点落在区间内的片段，替换原片段后按时间拼回
+- 重新识别的成本大致与被标记片段所占比例成正比
+
+使用方法:
+python selective_retranscription.py video.mp4 --fast base --accurate large-v3 --srt improved.srt
+"""
+
+import argparse
+import time
+
+from audio_artifact import load_audio
+from parallel_transcription import SAMPLE_RATE, owns_segment, shift_segments
+
+# 与 whisper 自身的回退阈值一致
+THRESHOLDS = {
+    'avg_logprob': -1.0,        # 低于此值：解码置信度低
+    'compression_ratio': 2.4,   # 高于此值：重复/幻觉
+    'no_speech_prob': 0.6,      # 高于此值：可能把噪声识别成了语音
+}
+
+
+def flag_reasons(segment, glossary=None, thresholds=THRESHOLDS):
+    """返回片段被标记的原因列表（空列表表示可信）"""
+    reasons = []
+    if segment.get('avg_logprob', 0.0) < thresholds['avg_logprob']:
+        reasons.append('avg_logprob')
+    if segment.get('compression_ratio', 0.0) > thresholds['compression_ratio']:
+        reasons.append('compression_ratio')
+    if segment.get('no_speech_prob', 0.0) > thresholds['no_speech_prob']:
+        reasons.append('no_speech_prob')
+    if glossary is not None and glossary.misses(segment['text']):
+        reasons.append('glossary')
+    return reasons
+
+
+def plan_spans(segments, flagged, padding=2.0, merge_gap=1.0, duration=None):
+    """把被标记的片段合并为区间
+
+    返回 [{'start', 'end', 'window_start', 'window_end', 'indices'}]：
+    start/end 是要替换的范围，window_* 是加上下文余量后实际解码的音频范围
+    """
+    spans = []
+    for index in sorted(flagged):
+        segment = segments[index]
+        if spans and segment['start'] - spans[-1]['end'] <= merge_gap:
+            spans[-1]['end'] = max(spans[-1]['end'], segment['end'])
+            spans[-1]['indices'].append(index)
+        else:
+            spans.append({'start': segment['start'], 'end': segment['end'], 'indices': [index]})
+
+    for span in spans:
+        span['window_start'] = max(0.0, span['start'] - padding)
+        span['window_end'] = span['end'] + padding
+        if duration is not None:
+            span['window_end'] = min(duration, span['window_end'])
+    return spans
+
+
+def splice(segments, spans, replacements):
+    """用各区间的新片段替换原片段，按时间排序后重新编号"""
+    replaced = {index for span in spans for index in span['indices']}
+    merged = [segment for index, segment in enumerate(segments) if index not in replaced]
+    for new_segments in replacements:
+        merged.extend(new_segments)
+    merged.sort(key=lambda segment: segment['start'])
+    for index, segment in enumerate(merged):
+        segment['id'] = index
+    return merged
+
+
+class SelectiveRetranscriber:
+    """两级识别：fast_model 全量识别，高精度模型只处理可疑区间
+
+    load_accurate(seconds) 在确定要重新解码的总秒数后才调用（没有可疑片段时不加载高精度模型），
+    调用方可以据此按截止时间选择模型
+    """
+
+    def __init__(self, fast_model, load_accurate, glossary=None, thresholds=THRESHOLDS,
+                 padding=2.0, prompt_chars=200):
+        self.fast_model = fast_model
+        self.load_accurate = load_accurate
+        self.glossary = glossary
+        self.thresholds = thresholds
+        self.padding = padding
+        self.prompt_chars = prompt_chars
+        self.last_stats = {}
+
+    def first_pass(self, audio, **options):
+        """快速模型全量识别，返回 (片段, 区间)"""
+        segments = self.fast_model.transcribe(audio, **options).get('segments', [])
+        flagged = [index for index, segment in enumerate(segments)
+                   if flag_reasons(segment, self.glossary, self.thresholds)]
+        spans = plan_spans(segments, flagged, self.padding, duration=len(audio) / SAMPLE_RATE)
+        return segments, spans
+
+    def redecode(self, model, audio, segments, spans, **options):
+        """只解码各区间的音频窗口；区间之前的已保留文本作为 initial_prompt 提供上下文"""
+        replacements = []
+        for span in spans:
+            window = audio[int(span['window_start'] * SAMPLE_RATE):int(span['window_end'] * SAMPLE_RATE)]
+            window_options = dict(options)
+            first = span['indices'][0]
+            context = ''.join(segment['text'] for segment in segments[max(0, first - 3):first]).strip()
+            if context:
+                prompt = window_options.get('initial_prompt') or ''
+                window_options['initial_prompt'] = (prompt + ' ' + context[-self.prompt_chars:]).strip()
+
+            result = model.transcribe(window, **window_options)
+            shifted = shift_segments(result.get('segments', []), span['window_start'], len(window) / SAMPLE_RATE)
+            owner = {'own_start': span['start'], 'own_end': span['end']}  # 余量部分只作上下文，结果不采用
+            replacements.append([segment for segment in shifted if owns_segment(owner, segment)])
+        return replacements
+
+    def transcribe(self, audio, fast_options=None, accurate_options=None):
+        """返回拼接后的片段；统计信息见 last_stats"""
+        audio = load_audio(audio)
+        started = time.time()
+        segments, spans = self.first_pass(audio, **(fast_options or {}))
+        fast_seconds = time.time() - started
+
+        redecoded = sum(span['window_end'] - span['window_start'] for span in spans)
+        replacements = []
+        decode_seconds = 0.0
+        if spans:
+            model = self.load_accurate(redecoded)
+            started = time.time()
+            replacements = self.redecode(model, audio, segments, spans, **(accurate_options or {}))
+            decode_seconds = time.time() - started
+
+        self.last_stats = {
+            'segments': len(segments),
+            'flagged': sum(len(span['indices']) for span in spans),
+            'spans': len(spans),
+            'duration': len(audio) / SAMPLE_RATE,
+            'redecoded_seconds': redecoded,
+            'fast_seconds': fast_seconds,
+            'decode_seconds': decode_seconds,
+        }
+        return splice(segments, spans, replacements)
+
+    def describe(self):
+        stats = self.last_stats
+        if not stats.get('segments'):
+            return "📊 快速识别没有产生片段"
+        return (f"📊 两级识别: {stats['flagged']}/{stats['segments']} 个片段可疑 "
+                f"({stats['flagged'] / stats['segments']:.0%})，合并为 {stats['spans']} 个区间；"
+                f"高精度模型只解码 {stats['redecoded_seconds']:.0f}秒 / {stats['duration']:.0f}秒 "
+                f"(快速识别 {stats['fast_seconds']:.1f}秒 + 重新识别 {stats['decode_seconds']:.1f}秒)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='快速模型全量识别，高精度模型只重新识别低置信度片段')
+    parser.add_argument('audio', help='音频或视频文件')
+    parser.add_argument('--fast', default='base', help='快速模型')
+    parser.add_argument('--accurate', default='large-v3', help='高精度模型')
+    parser.add_argument('--backend', default=None, help='openai / ctranslate2')
+    parser.add_argument('--show', default=None, help='节目词表名（误识别词条也作为标记依据）')
+    parser.add_argument('--padding', type=float, default=2.0, help='区间前后的上下文余量（秒）')
+    parser.add_argument('--srt', default=None, help='输出SRT文件')
+    args = parser.parse_args()
+
+    from glossary_corrector import GlossaryCorrector
+    from streaming_transcription import IncrementalSrtWriter
+    from whisper_service import load_whisper_model
+
+    retranscriber = SelectiveRetranscriber(
+        load_whisper_model(args.fast, backend=args.backend),
+        lambda seconds: load_whisper_model(args.accurate, backend=args.backend),
+        glossary=GlossaryCorrector.for_show(args.show),
+        padding=args.padding,
+    )
+    options = dict(language='en', temperature=0.0, fp16=False)
+    segments = retranscriber.transcribe(args.audio, options, dict(options, beam_size=5, best_of=5))
+    print(retranscriber.describe())
+
+    if args.srt:
+        with IncrementalSrtWriter(args.srt) as writer:
+            for segment in segments:
+                writer.write(segment)
+        print(f"✅ 已写入 {writer.count} 条字幕: {args.srt}")
+    else:
+        for segment in segments:
+            print(f"[{segment['start']:8.2f} → {segment['end']:8.2f}] {segment['text'].strip()}")
+
+
+if __name__ == "__main__":
+    main()
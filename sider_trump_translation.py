@@ -8,6 +8,8 @@
 import os
 import time
 
+from subtitle_core import CueStore
+
 def read_trump_subtitles():
     """读取特朗普视频的英文字幕"""
     subtitle_file = "output/sider__jOTww0E0b4_Trump_seen_in_new_clip_released_by_filmmaker_following_Jan_6_committee_subpoena/Trump seen in new clip released by filmmaker following Jan 6 committee subpoena_english.srt"
@@ -16,19 +18,8 @@ def read_trump_subtitles():
         print(f"❌ 字幕文件不存在: {subtitle_file}")
         return None
     
-    # 读取字幕并提取英文文本
-    english_texts = []
-    with open(subtitle_file, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
-    
-    # 解析SRT格式，提取英文文本
-    for i, line in enumerate(lines):
-        line = line.strip()
-        # 跳过序号行和时间行
-        if line and not line.isdigit() and '-->' not in line and line:
-            english_texts.append(line)
-    
-    return english_texts
+    # 解析SRT格式，提取英文文本（每条字幕一行）
+    return CueStore.read(subtitle_file, line_sep=' ').texts()
 
 def create_sider_translation_prompt(english_texts):
     """创建Sider翻译的专业提示词"""
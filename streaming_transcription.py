@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+流式转录 - 每解码完一个约30秒的窗口就产出该窗口的片段
+特点：
+- 窗口在VAD检测到的静音处切分（超长语音硬切并保留重叠，按重叠中点去重）
+- 上一窗口的文本作为下一窗口的 initial_prompt，首个窗口识别出的语言固定给后续窗口
+- SRT逐条追加写入并 flush + fsync，翻译提示词每凑够N个片段就生成一个分块
+  翻译可以与转录同时进行，转录中断时已写出的字幕和提示词仍然完整可用
+
+使用方法:
+python streaming_transcription.py audio.wav --model base --srt output.srt
+"""
+
+import argparse
+import os
+
+from audio_artifact import load_audio
+from parallel_transcription import SAMPLE_RATE, detect_speech, iter_merged, plan_chunks, shift_segments
+from subtitle_core import srt_timestamp
+
+WINDOW_SECONDS = 30.0
+
+
+class StreamingTranscriber:
+    """包装任何带 transcribe(audio, **options) 的模型，逐窗口转录"""
+
+    def __init__(self, model, window=WINDOW_SECONDS, prompt_chars=200):
+        self.model = model
+        self.window = window
+        self.prompt_chars = prompt_chars
+        self.last_language = None
+
+    def iter_segments(self, audio, **options):
+        """逐个产出片段（全局时间戳）；每个窗口解码完成后立即产出该窗口的全部片段"""
+        audio = load_audio(audio)
+        options = dict(options)
+        options.pop('verbose', None)
+        chunks = plan_chunks(detect_speech(audio), max_chunk=self.window)
+        self.last_language = options.get('language')
+
+        def decoded():
+            previous_text = ''
+            for chunk in chunks:
+                piece = audio[int(chunk['start'] * SAMPLE_RATE):int(chunk['end'] * SAMPLE_RATE)]
+                window_options = dict(options)
+                if self.last_language:
+                    window_options['language'] = self.last_language
+                if previous_text and not options.get('initial_prompt') and \
+                        options.get('condition_on_previous_text', True):
+                    window_options['initial_prompt'] = previous_text[-self.prompt_chars:]
+
+                result = self.model.transcribe(piece, **window_options)
+                self.last_language = self.last_language or result.get('language')
+                previous_text = result.get('text', '').strip() or previous_text
+                yield chunk, shift_segments(result.get('segments', []), chunk['start'], len(piece) / SAMPLE_RATE)
+
+        yield from iter_merged(decoded())
+
+    def transcribe(self, audio, **options):
+        """接口与 whisper 模型的 transcribe 相同，返回 {'text', 'segments', 'language'}"""
+        segments = list(self.iter_segments(audio, **options))
+        return {
+            'text': ''.join(segment['text'] for segment in segments),
+            'segments': segments,
+            'language': self.last_language,
+        }
+
+
+def iter_segments(model, audio, **options):
+    """模型自带流式接口时直接使用，否则整段转录后逐个产出"""
+    if hasattr(model, 'iter_segments'):
+        yield from model.iter_segments(audio, **options)
+    else:
+        yield from model.transcribe(audio, **options)['segments']
+
+
+class IncrementalSrtWriter:
+    """逐条追加SRT字幕，每条写入后 flush + fsync"""
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self.file = open(path, 'w', encoding='utf-8')
+
+    def write(self, segment):
+        """segment 带 'lines'（见 cue_segmentation）时按其换行"""
+        self.count += 1
+        text = '\n'.join(segment['lines']) if segment.get('lines') else segment['text'].strip()
+        self.file.write(f"{self.count}\n{srt_timestamp(segment['start'])} --> {srt_timestamp(segment['end'])}\n"
+                        f"{text}\n\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class PromptChunkWriter:
+    """每凑够 chunk_size 个片段就写出一个翻译提示词分块
+
+    render(segments, first_index, part) 返回分块文件的行列表；first_index 是分块内第一个片段的全局序号
+    """
+
+    def __init__(self, directory, render, chunk_size=50, prefix="translation_prompt_part"):
+        self.directory = directory
+        self.render = render
+        self.chunk_size = chunk_size
+        self.prefix = prefix
+        self.pending = []
+        self.first_index = 1
+        self.files = []
+
+    def add(self, segment):
+        self.pending.append(segment)
+        if len(self.pending) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return None
+        part = len(self.files) + 1
+        path = os.path.join(self.directory, f"{self.prefix}_{part:03d}.txt")
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(self.render(self.pending, self.first_index, part)))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)  # 翻译方看到的分块总是完整的
+
+        last_index = self.first_index + len(self.pending) - 1
+        print(f"📝 翻译提示词分块 {part} 已就绪: {path} (片段 {self.first_index}-{last_index})")
+        self.files.append(path)
+        self.first_index = last_index + 1
+        self.pending = []
+        return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='逐窗口流式转录')
+    parser.add_argument('audio', help='音频或视频文件')
+    parser.add_argument('--model', default='base')
+    parser.add_argument('--window', type=float, default=WINDOW_SECONDS, help='窗口长度（秒）')
+    parser.add_argument('--language', default=None)
+    parser.add_argument('--srt', default=None, help='边转录边写入的SRT文件')
+    args = parser.parse_args()
+
+    from whisper_service import load_whisper_model
+
+    transcriber = StreamingTranscriber(load_whisper_model(args.model), window=args.window)
+    writer = IncrementalSrtWriter(args.srt) if args.srt else None
+    try:
+        for segment in transcriber.iter_segments(args.audio, language=args.language):
+            print(f"[{segment['start']:8.2f} → {segment['end']:8.2f}] {segment['text'].strip()}", flush=True)
+            if writer:
+                writer.write(segment)
+    finally:
+        if writer:
+            writer.close()
+            print(f"✅ 已写入 {writer.count} 条字幕: {args.srt}")
+
+
+if __name__ == "__main__":
+    main()
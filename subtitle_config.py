@@ -13,6 +13,12 @@
 最后更新: 字幕位置下移20像素优化
 """
 
+from itertools import chain
+
+from ass_build_cache import build_ass, describe as describe_build
+from bilingual_merge import align_by_time, alignment_report, describe as describe_merge, snap_translation
+from subtitle_core import CueStore, iter_ass_events, iter_cues
+
 # 字幕配置标准 (已验证的最佳设置)
 SUBTITLE_CONFIG = {
     # 中文字幕配置
@@ -97,108 +103,35 @@ Dialogue: 0,{config['watermark']['duration_start']},{config['watermark']['durati
 """
     return template
 
-def srt_time_to_seconds(time_str):
-    """将SRT时间格式转换为秒数 - 精确处理"""
-    time_str = time_str.replace(',', '.')
-    parts = time_str.split(':')
-    hours = int(parts[0])
-    minutes = int(parts[1])
-    seconds = float(parts[2])
-    return hours * 3600 + minutes * 60 + seconds
-
-def seconds_to_ass_time(seconds):
-    """将秒数转换为ASS时间格式 - 精确同步"""
-    hours = int(seconds // 3600)
-    minutes = int((seconds % 3600) // 60)
-    secs = seconds % 60
-    return f"{hours:01d}:{minutes:02d}:{secs:05.2f}"
+def build_perfect_bilingual_ass(english_srt_path, chinese_srt_path, output_path):
+    """增量生成完美配置的双语ASS字幕，返回 build_ass 的结果（是否写入、变化的时间范围）"""
+    
+    # 处理中文和英文字幕（多行文本合并为一行）
+    english = CueStore.read(english_srt_path, line_sep=' ')
+    chinese = CueStore.read(chinese_srt_path, line_sep=' ')
+    
+    # 按时间重叠对齐：译文合并/拆分过字幕时，中文仍与对应的英文同时出现、同时消失
+    groups = align_by_time(english, chinese)
+    print(describe_merge(alignment_report(english, chinese, groups)))
+    chinese = snap_translation(english, chinese, groups)
+    
+    # 逐批格式化后写出；只有内容变化时才替换文件，并报告变化的时间范围
+    events = chain(iter_ass_events(chinese, 'Chinese'), iter_ass_events(english, 'English'))
+    result = build_ass(output_path, get_bilingual_ass_template(), events)
+    print(describe_build(result))
+    return result
 
 def create_perfect_bilingual_ass(english_srt_path, chinese_srt_path, output_path):
     """创建完美配置的双语ASS字幕"""
-    
-    # 获取模板
-    ass_content = get_bilingual_ass_template()
-    
-    # 读取并处理字幕
-    def process_subtitles(srt_path, style_name):
-        with open(srt_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        blocks = content.strip().split('\n\n')
-        lines = []
-        
-        for block in blocks:
-            block_lines = block.strip().split('\n')
-            if len(block_lines) >= 3:
-                time_line = block_lines[1]
-                text_lines = block_lines[2:]
-                text = ' '.join(text_lines).strip()
-                
-                if '-->' in time_line:
-                    start_str, end_str = time_line.split(' --> ')
-                    start_str = start_str.strip()
-                    end_str = end_str.strip()
-                    
-                    # 精确时间转换
-                    start_seconds = srt_time_to_seconds(start_str)
-                    end_seconds = srt_time_to_seconds(end_str)
-                    start_ass = seconds_to_ass_time(start_seconds)
-                    end_ass = seconds_to_ass_time(end_seconds)
-                    
-                    lines.append(f"Dialogue: 0,{start_ass},{end_ass},{style_name},,0,0,0,,{text}")
-        
-        return lines
-    
-    # 处理中文和英文字幕
-    chinese_lines = process_subtitles(chinese_srt_path, 'Chinese')
-    english_lines = process_subtitles(english_srt_path, 'English')
-    
-    # 合并字幕行
-    all_lines = chinese_lines + english_lines
-    ass_content += '\n'.join(all_lines)
-    
-    # 保存文件
-    with open(output_path, 'w', encoding='utf-8') as f:
-        f.write(ass_content)
-    
+    build_perfect_bilingual_ass(english_srt_path, chinese_srt_path, output_path)
     return output_path
 
 def create_perfect_chinese_ass(chinese_srt_path, output_path):
     """创建完美配置的中文ASS字幕"""
-    
-    # 获取模板
-    ass_content = get_chinese_ass_template()
-    
-    # 处理中文字幕
-    with open(chinese_srt_path, 'r', encoding='utf-8') as f:
-        content = f.read()
-    
-    blocks = content.strip().split('\n\n')
-    
-    for block in blocks:
-        block_lines = block.strip().split('\n')
-        if len(block_lines) >= 3:
-            time_line = block_lines[1]
-            text_lines = block_lines[2:]
-            text = ' '.join(text_lines).strip()
-            
-            if '-->' in time_line:
-                start_str, end_str = time_line.split(' --> ')
-                start_str = start_str.strip()
-                end_str = end_str.strip()
-                
-                # 精确时间转换
-                start_seconds = srt_time_to_seconds(start_str)
-                end_seconds = srt_time_to_seconds(end_str)
-                start_ass = seconds_to_ass_time(start_seconds)
-                end_ass = seconds_to_ass_time(end_seconds)
-                
-                ass_content += f"Dialogue: 0,{start_ass},{end_ass},Chinese,,0,0,0,,{text}\n"
-    
-    # 保存文件
-    with open(output_path, 'w', encoding='utf-8') as f:
-        f.write(ass_content)
-    
+    # 边读边写：不需要对齐，字幕逐块读入、逐批写出
+    events = iter_ass_events(iter_cues(chinese_srt_path, line_sep=' '), 'Chinese')
+    result = build_ass(output_path, get_chinese_ass_template(), events)
+    print(describe_build(result))
     return output_path
 
 def print_config_summary():
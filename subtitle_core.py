@@ -0,0 +1,535 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+字幕核心库 - 统一的SRT/VTT解析、时间戳换算与SRT/ASS/VTT输出
+特点：
+- 单个正则单遍扫描整份文件，不再先按空行拆块、再逐条建字典
+- CueStore：开始/结束时间为 int64 毫秒数组，全部文本拼接为一个字符串 + 偏移数组，
+  10万条字幕也只有几个数组和一个字符串
+- 时间戳按数组整体格式化：各位数字直接算进 ASCII 字节矩阵，再一次性转为字符串
+- 单值换算函数（srt_timestamp / ass_timestamp / parse_time）与数组版本的舍入规则一致：
+  秒 → 毫秒四舍五入，ASS 的厘秒由毫秒四舍五入
+- 流式读写：按约1MB的块读文件（块在空行处切开），逐块解析为小的 CueStore；
+  输出按每批4096条格式化后立即写出。数小时的直播字幕在读写时也只有一个块的临时字符串
+
+使用方法:
+python subtitle_core.py input.srt --to ass --style English    # 转换为 input.ass（也可 --to vtt / srt）
+python subtitle_core.py input.ass --to srt                     # ASS 的 Dialogue 行转回 SRT
+python subtitle_core.py --benchmark --cues 100000              # 10万条字幕与逐条字典实现对比
+"""
+
+import argparse
+import os
+import re
+import time
+from collections import namedtuple
+from itertools import islice
+
+import numpy as np
+
+# 时间戳格式: (小时最少位数, 秒与小数部分的分隔符, 小数位数)
+FORMATS = {
+    'srt': (2, ',', 3),
+    'vtt': (2, '.', 3),
+    'ass': (1, '.', 2),
+}
+
+# SRT 与 VTT 的字幕块：可选的序号行 + 时间行（VTT可省略小时、可带样式设置）+ 到空行为止的文本
+CUE_PATTERN = re.compile(r'(?:^(\d+)[ \t]*\n)?(\d[\d:]*[,.]\d+)[ \t]*-->[ \t]*(\d[\d:]*[,.]\d+)[^\n]*\n?((?:.+\n?)*)', re.M)
+CHUNK_SIZE = 1 << 20   # 流式读取时每块的字符数
+BATCH_SIZE = 4096      # 流式输出时每批格式化的字幕条数
+
+TIME_PATTERN = re.compile(r'(?:(\d+):)?(\d{1,2}):(\d{2})(?:[,.](\d{1,3}))?')
+
+
+# ---------- 单值换算 ----------
+
+def seconds_to_ms(seconds):
+    return max(0, int(seconds * 1000 + 0.5))
+
+
+def parse_time(text):
+    """'01:02:03,456' / '01:02:03.456' / '02:03.456' / '0:01:02.35'(ASS) → 毫秒"""
+    match = TIME_PATTERN.fullmatch(text.strip())
+    if not match:
+        raise ValueError(f"无法解析字幕时间: {text}")
+    hours, minutes, seconds, fraction = match.groups()
+    fraction = fraction or '0'
+    return ((int(hours or 0) * 60 + int(minutes)) * 60 + int(seconds)) * 1000 + int(fraction) * 10 ** (3 - len(fraction))
+
+
+def format_ms(ms, kind='srt'):
+    hour_digits, separator, fraction_digits = FORMATS[kind]
+    units = 10 ** fraction_digits
+    ticks = (max(0, int(ms)) * units + 500) // 1000
+    total_seconds, fraction = divmod(ticks, units)
+    minutes, seconds = divmod(total_seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:0{hour_digits}d}:{minutes:02d}:{seconds:02d}{separator}{fraction:0{fraction_digits}d}"
+
+
+def srt_timestamp(seconds):
+    return format_ms(seconds_to_ms(seconds), 'srt')
+
+
+def vtt_timestamp(seconds):
+    return format_ms(seconds_to_ms(seconds), 'vtt')
+
+
+def ass_timestamp(seconds):
+    return format_ms(seconds_to_ms(seconds), 'ass')
+
+
+# ---------- 数组换算 ----------
+
+def parse_times(values):
+    """时间戳字符串列表 → 毫秒数组
+
+    常见情况下所有时间戳同宽（'01:02:03,456' 或 '02:03.456'）：拼成一个字节矩阵后按列直接计算；
+    宽度不一致或格式不规整时逐个 parse_time
+    """
+    values = list(values)
+    if not values:
+        return np.zeros(0, dtype=np.int64)
+    width = len(values[0])
+    blob = ''.join(values).encode('ascii', 'replace')
+    if width >= 9 and len(blob) == width * len(values):
+        matrix = np.frombuffer(blob, dtype=np.uint8).reshape(-1, width)
+        separators = ((matrix[:, -4] == ord(',')) | (matrix[:, -4] == ord('.'))) & (matrix[:, -7] == ord(':'))
+        if width > 9:
+            separators &= matrix[:, -10] == ord(':')
+        digits = matrix.astype(np.int64) - 48
+        hour_digits = digits[:, :max(0, width - 10)]
+        if separators.all() and ((hour_digits >= 0) & (hour_digits <= 9)).all():
+            hours = hour_digits @ 10 ** np.arange(hour_digits.shape[1] - 1, -1, -1, dtype=np.int64)
+            minutes = digits[:, -9] * 10 + digits[:, -8]
+            seconds = digits[:, -6] * 10 + digits[:, -5]
+            fraction = digits[:, -3] * 100 + digits[:, -2] * 10 + digits[:, -1]
+            return ((hours * 60 + minutes) * 60 + seconds) * 1000 + fraction
+    return np.fromiter(map(parse_time, values), dtype=np.int64, count=len(values))
+
+
+def _digits(values, width):
+    powers = 10 ** np.arange(width - 1, -1, -1, dtype=np.int64)
+    return (values[:, None] // powers % 10 + 48).astype(np.uint8)
+
+
+def format_timestamps(ms, kind='srt'):
+    """毫秒数组 → 时间戳字符串数组（整体计算，没有逐条的字符串格式化）
+
+    小时位与 format_ms 一致按每条的最小宽度输出：超过10小时的条目不会让其他条目的小时位变宽
+    """
+    hour_digits, separator, fraction_digits = FORMATS[kind]
+    ms = np.maximum(np.asarray(ms, dtype=np.int64), 0)
+    units = 10 ** fraction_digits
+    ticks = (ms * units + 500) // 1000
+    total_seconds, fraction = np.divmod(ticks, units)
+    minutes, seconds = np.divmod(total_seconds, 60)
+    hours, minutes = np.divmod(minutes, 60)
+
+    row_digits = np.full(len(ms), hour_digits, dtype=np.int64)
+    limit = 10 ** hour_digits
+    while len(ms) and hours.max() >= limit:
+        row_digits[hours >= limit] += 1
+        limit *= 10
+    widest = int(row_digits.max()) if len(ms) else hour_digits
+    if widest == hour_digits:
+        return _timestamp_matrix(hours, minutes, seconds, fraction, hour_digits, separator, fraction_digits)
+
+    result = np.empty(len(ms), dtype=f'U{widest + 7 + fraction_digits}')
+    for digits in np.unique(row_digits):
+        rows = row_digits == digits
+        result[rows] = _timestamp_matrix(hours[rows], minutes[rows], seconds[rows], fraction[rows],
+                                         int(digits), separator, fraction_digits)
+    return result
+
+
+def _timestamp_matrix(hours, minutes, seconds, fraction, hour_digits, separator, fraction_digits):
+    """小时位宽相同的一组时间：逐列写入字节矩阵，再整体视为定长字符串"""
+    width = hour_digits + 7 + fraction_digits
+    matrix = np.empty((len(hours), width), dtype=np.uint8)
+    position = 0
+    for values, digits, suffix in ((hours, hour_digits, ':'), (minutes, 2, ':'), (seconds, 2, separator),
+                                   (fraction, fraction_digits, None)):
+        matrix[:, position:position + digits] = _digits(values, digits)
+        position += digits
+        if suffix:
+            matrix[:, position] = ord(suffix)
+            position += 1
+    return matrix.view(f'S{width}').ravel().astype(f'U{width}')
+
+
+# ---------- 字幕存储 ----------
+
+class Cue(namedtuple('Cue', 'start_ms end_ms text')):
+    __slots__ = ()
+
+    @property
+    def start(self):
+        return self.start_ms / 1000
+
+    @property
+    def end(self):
+        return self.end_ms / 1000
+
+
+class CueStore:
+    """紧凑的字幕条存储：start / end 为毫秒数组，第 i 条文本为 text[offsets[i]:offsets[i + 1]]
+
+    numbers 为文件中的字幕序号（没有序号行时为 -1），只在解析文件时记录，输出SRT时总是重新编号
+    """
+
+    def __init__(self, start, end, text='', offsets=None, numbers=None):
+        self.start = np.asarray(start, dtype=np.int64)
+        self.end = np.asarray(end, dtype=np.int64)
+        self.text = text
+        self.offsets = np.zeros(len(self.start) + 1, dtype=np.int64) if offsets is None else offsets
+        self.numbers = np.full(len(self.start), -1, dtype=np.int64) if numbers is None else numbers
+
+    @classmethod
+    def from_texts(cls, start, end, texts, numbers=None):
+        texts = list(texts)
+        offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+        if texts:
+            np.cumsum(np.fromiter(map(len, texts), dtype=np.int64, count=len(texts)), out=offsets[1:])
+        return cls(start, end, ''.join(texts), offsets, numbers)
+
+    @classmethod
+    def from_segments(cls, segments):
+        """Whisper格式的片段（秒）→ CueStore；文本去掉首尾空白"""
+        segments = list(segments)
+        start = np.fromiter((seconds_to_ms(segment['start']) for segment in segments), dtype=np.int64, count=len(segments))
+        end = np.fromiter((seconds_to_ms(segment['end']) for segment in segments), dtype=np.int64, count=len(segments))
+        return cls.from_texts(start, end, (segment['text'].strip() for segment in segments))
+
+    @classmethod
+    def parse(cls, content, line_sep='\n'):
+        """解析SRT或VTT文本；line_sep 为一条字幕内多行文本的连接符（' ' 合并为一行）"""
+        if '\r' in content:
+            content = content.replace('\r\n', '\n').replace('\r', '\n')
+        matches = CUE_PATTERN.findall(content)
+        if not matches:
+            return cls(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+
+        numbers, starts, ends, bodies = zip(*matches)
+        texts = (body.strip() for body in bodies)
+        if line_sep != '\n':
+            texts = (line_sep.join(line.strip() for line in body.split('\n')) for body in texts)
+        numbers = np.fromiter((int(number) if number else -1 for number in numbers), dtype=np.int64, count=len(numbers))
+        return cls.from_texts(parse_times(starts), parse_times(ends), texts, numbers)
+
+    @classmethod
+    def from_cues(cls, cues):
+        """Cue 序列（毫秒）→ CueStore"""
+        starts, ends, texts = [], [], []
+        for cue in cues:
+            starts.append(cue[0])
+            ends.append(cue[1])
+            texts.append(cue[2])
+        return cls.from_texts(starts, ends, texts)
+
+    @classmethod
+    def concat(cls, stores):
+        stores = list(stores)
+        if not stores:
+            return cls(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+        bases = np.cumsum([0] + [len(store.text) for store in stores[:-1]])
+        offsets = np.concatenate([stores[0].offsets[:1]] +
+                                 [store.offsets[1:] + base for store, base in zip(stores, bases)])
+        return cls(np.concatenate([store.start for store in stores]), np.concatenate([store.end for store in stores]),
+                   ''.join(store.text for store in stores), offsets,
+                   np.concatenate([store.numbers for store in stores]))
+
+    @classmethod
+    def iter_read(cls, path, line_sep='\n', chunk_size=CHUNK_SIZE):
+        """逐块解析SRT/VTT文件，每块产出一个 CueStore；内存中只有当前块的文本"""
+        with open(path, 'r', encoding='utf-8-sig') as f:
+            pending = ''
+            while True:
+                data = f.read(chunk_size)
+                if not data:
+                    break
+                pending += data
+                cut = pending.rfind('\n\n')  # 在空行处切开，字幕块不会跨块
+                if cut < 0:
+                    continue
+                store = cls.parse(pending[:cut + 1], line_sep)
+                pending = pending[cut + 2:]
+                if len(store):
+                    yield store
+            store = cls.parse(pending, line_sep)
+            if len(store):
+                yield store
+
+    @classmethod
+    def read(cls, path, line_sep='\n'):
+        return cls.concat(cls.iter_read(path, line_sep))
+
+    def __len__(self):
+        return len(self.start)
+
+    def text_at(self, index):
+        return self.text[self.offsets[index]:self.offsets[index + 1]]
+
+    def texts(self):
+        bounds = self.offsets.tolist()
+        return [self.text[begin:finish] for begin, finish in zip(bounds, bounds[1:])]
+
+    def __getitem__(self, index):
+        return Cue(int(self.start[index]), int(self.end[index]), self.text_at(index))
+
+    def __iter__(self):
+        return map(Cue, self.start.tolist(), self.end.tolist(), self.texts())
+
+    def slice(self, begin, end):
+        """第 begin..end-1 条字幕（共享数组，不复制）"""
+        low, high = int(self.offsets[begin]), int(self.offsets[end])
+        return CueStore(self.start[begin:end], self.end[begin:end], self.text[low:high],
+                        self.offsets[begin:end + 1] - low, self.numbers[begin:end])
+
+    def batches(self, size=BATCH_SIZE):
+        for begin in range(0, len(self), size):
+            yield self.slice(begin, min(begin + size, len(self)))
+
+    def with_texts(self, texts):
+        """时间不变、替换全部文本"""
+        return CueStore.from_texts(self.start, self.end, texts, self.numbers)
+
+    def segments(self):
+        """Whisper格式的片段列表（秒），供按字典处理的旧代码使用"""
+        return [{'start': cue.start, 'end': cue.end, 'text': cue.text} for cue in self]
+
+    @property
+    def nbytes(self):
+        return self.start.nbytes + self.end.nbytes + self.offsets.nbytes + self.numbers.nbytes + len(self.text.encode('utf-8'))
+
+    # ---------- 输出 ----------
+
+    def timestamps(self, kind='srt'):
+        """(开始, 结束) 时间戳字符串列表"""
+        return format_timestamps(self.start, kind).tolist(), format_timestamps(self.end, kind).tolist()
+
+    def to_srt(self, first_index=1):
+        starts, ends = self.timestamps('srt')
+        return ''.join(f"{index}\n{start} --> {end}\n{text}\n\n"
+                       for index, (start, end, text) in enumerate(zip(starts, ends, self.texts()), first_index))
+
+    def to_vtt(self, header=True):
+        starts, ends = self.timestamps('vtt')
+        return ('WEBVTT\n\n' if header else '') + ''.join(f"{start} --> {end}\n{text}\n\n"
+                                                          for start, end, text in zip(starts, ends, self.texts()))
+
+    def ass_events(self, style, layer=0):
+        """ASS Dialogue 行列表（多行文本换为 \\N）"""
+        starts, ends = self.timestamps('ass')
+        return [f"Dialogue: {layer},{start},{end},{style},,0,0,0,,{text}".replace('\n', '\\N')
+                for start, end, text in zip(starts, ends, self.texts())]
+
+    def write_srt(self, path):
+        return write_cues(path, self, 'srt')
+
+    def write_vtt(self, path):
+        return write_cues(path, self, 'vtt')
+
+
+# ---------- 流式读写 ----------
+
+def batched(items, size=BATCH_SIZE):
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def iter_batches(cues, size=BATCH_SIZE):
+    """CueStore 或 Cue 的可迭代对象 → 每批最多 size 条的 CueStore"""
+    if isinstance(cues, CueStore):
+        yield from cues.batches(size)
+        return
+    for batch in batched(cues, size):
+        yield CueStore.from_cues(batch)
+
+
+def iter_cues(path, line_sep='\n', chunk_size=CHUNK_SIZE):
+    """逐条产出文件中的字幕（Cue，毫秒）"""
+    for store in CueStore.iter_read(path, line_sep, chunk_size):
+        yield from store
+
+
+def iter_srt(cues):
+    """逐批产出SRT文本，序号跨批连续"""
+    index = 1
+    for batch in iter_batches(cues):
+        yield batch.to_srt(index)
+        index += len(batch)
+
+
+def iter_ass_events(cues, style, layer=0):
+    """逐条产出 (开始毫秒, 结束毫秒, Dialogue 行)；时间戳按批整体格式化"""
+    for batch in iter_batches(cues):
+        yield from zip(batch.start.tolist(), batch.end.tolist(), batch.ass_events(style, layer))
+
+
+def write_atomic(path, pieces):
+    """逐段写入临时文件后替换，中途失败不会留下半个文件"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for piece in pieces:
+            f.write(piece)
+    os.replace(tmp_path, path)
+    return path
+
+
+def write_cues(path, cues, kind='srt'):
+    """流式写SRT/VTT；cues 可以是 CueStore 或任何 Cue 的可迭代对象"""
+    if kind == 'vtt':
+        pieces = (batch.to_vtt(header=False) for batch in iter_batches(cues))
+        return write_atomic(path, _prefixed('WEBVTT\n\n', pieces))
+    return write_atomic(path, iter_srt(cues))
+
+
+def _prefixed(first, pieces):
+    yield first
+    yield from pieces
+
+
+def write_ass(path, header, lines):
+    """流式写ASS：header 为文件头（含 [Events] 格式行），lines 为逐条产出的 Dialogue 行"""
+    return write_atomic(path, _prefixed(header, (line + '\n' for line in lines)))
+
+
+def iter_ass_dialogues(path):
+    """逐行读取ASS文件的 Dialogue 事件，产出 (开始毫秒, 结束毫秒, 样式, 文本)"""
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        for line in f:
+            if not line.startswith('Dialogue:'):
+                continue
+            fields = line[len('Dialogue:'):].rstrip('\n').split(',', 9)
+            if len(fields) == 10:
+                yield parse_time(fields[1]), parse_time(fields[2]), fields[3], fields[9]
+
+
+def write_srt(path, segments):
+    """Whisper格式的片段写为SRT文件（逐批格式化写出）"""
+    return write_cues(path, (Cue(seconds_to_ms(segment['start']), seconds_to_ms(segment['end']), segment['text'].strip())
+                             for segment in segments))
+
+
+# ---------- 基准测试 ----------
+
+def legacy_parse(content):
+    """对照组：旧实现的按空行拆块 + 逐条字典"""
+    subtitles = []
+    for block in content.strip().split('\n\n'):
+        lines = block.strip().split('\n')
+        if len(lines) >= 3 and ' --> ' in lines[1]:
+            start_str, end_str = lines[1].split(' --> ')
+            subtitles.append({'start': legacy_time(start_str), 'end': legacy_time(end_str), 'text': ' '.join(lines[2:])})
+    return subtitles
+
+
+def legacy_time(time_str):
+    hours, minutes, seconds = time_str.replace(',', '.').split(':')
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def legacy_ass_time(seconds):
+    return f"{int(seconds // 3600):01d}:{int((seconds % 3600) // 60):02d}:{seconds % 60:05.2f}"
+
+
+def synthetic_srt(count, seed=5):
+    import random
+
+    rng = random.Random(seed)
+    words = ['the', 'president', 'said', 'groceries', 'are', 'very', 'expensive', 'today', '我们', '今天', '价格']
+    start = np.cumsum([rng.randint(500, 4000) for _ in range(count)])
+    end = start + np.array([rng.randint(400, 3000) for _ in range(count)])
+    texts = [' '.join(rng.choice(words) for _ in range(rng.randint(4, 12))) +
+             ('\n' + ' '.join(rng.choice(words) for _ in range(4)) if rng.random() < 0.3 else '')
+             for _ in range(count)]
+    return CueStore.from_texts(start, end, texts).to_srt()
+
+
+def run_benchmark(count):
+    import tracemalloc
+
+    content = synthetic_srt(count)
+    print(f"📊 字幕核心库基准测试: {count} 条字幕 ({len(content) / 1024 / 1024:.1f}MB)")
+
+    def measure(function):
+        tracemalloc.start()
+        started = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return result, elapsed, peak
+
+    legacy, legacy_seconds, legacy_peak = measure(lambda: legacy_parse(content))
+    store, store_seconds, store_peak = measure(lambda: CueStore.parse(content, line_sep=' '))
+    assert len(store) == len(legacy) and store.text_at(len(store) - 1) == legacy[-1]['text']
+    print(f"   解析   逐条字典 {legacy_seconds:.3f}秒 (峰值 {legacy_peak / 1e6:.0f}MB) → "
+          f"CueStore {store_seconds:.3f}秒 (峰值 {store_peak / 1e6:.0f}MB, 常驻 {store.nbytes / 1e6:.1f}MB)")
+
+    started = time.perf_counter()
+    legacy_times = [(legacy_ass_time(sub['start']), legacy_ass_time(sub['end'])) for sub in legacy]
+    legacy_format = time.perf_counter() - started
+    started = time.perf_counter()
+    starts, ends = store.timestamps('ass')
+    store_format = time.perf_counter() - started
+    print(f"   ASS时间 逐条格式化 {legacy_format:.3f}秒 → 数组格式化 {store_format:.3f}秒")
+    # 数组格式化与逐条的 format_ms 应逐字一致；旧实现的差异只来自浮点秒数的截断与舍入
+    assert all(new == format_ms(ms, 'ass') for new, ms in zip(starts, store.start.tolist()))
+    mismatched = sum(1 for (start, _), new in zip(legacy_times, starts) if start != new)
+    if mismatched:
+        print(f"   （{mismatched} 条旧实现的时间戳与新实现不同：旧实现对浮点秒数截断/舍入，"
+              f"在 0.005 秒边界会差一位，甚至出现 60.00 秒）")
+
+    started = time.perf_counter()
+    output = store.to_srt()
+    print(f"   SRT输出 {time.perf_counter() - started:.3f}秒 (往返一致: {CueStore.parse(output).texts() == store.texts()})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='字幕格式转换 / 基准测试')
+    parser.add_argument('input', nargs='?', help='SRT、VTT或ASS文件')
+    parser.add_argument('--to', choices=['srt', 'vtt', 'ass'], default='srt')
+    parser.add_argument('--style', default='English', help='输出ASS事件时使用的样式名；读取ASS时只取此样式（空字符串为全部）')
+    parser.add_argument('--output', default=None)
+    parser.add_argument('--benchmark', action='store_true')
+    parser.add_argument('--cues', type=int, default=100000, help='基准测试的字幕条数')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        run_benchmark(args.cues)
+        return
+    if not args.input:
+        parser.error('需要字幕文件或 --benchmark')
+
+    output = args.output or os.path.splitext(args.input)[0] + '.' + args.to
+    if args.input.lower().endswith('.ass'):
+        cues = (Cue(start, end, text.replace('\\N', '\n')) for start, end, style, text in iter_ass_dialogues(args.input)
+                if style == args.style or not args.style)
+    else:
+        cues = iter_cues(args.input)
+    count = 0
+
+    def counted(items):
+        nonlocal count
+        for item in items:
+            count += 1
+            yield item
+
+    if args.to == 'ass':
+        from subtitle_config import get_bilingual_ass_template
+
+        write_ass(output, get_bilingual_ass_template(), (line for _, _, line in iter_ass_events(counted(cues), args.style)))
+    else:
+        write_cues(output, counted(cues), args.to)
+    print(f"✅ {count} 条字幕: {output}")
+
+
+if __name__ == "__main__":
+    main()
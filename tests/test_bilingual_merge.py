@@ -0,0 +1,52 @@
+from collections import Counter
+
+import numpy as np
+
+from bilingual_merge import align_by_time, merge_bilingual, overlap_pairs
+from subtitle_core import CueStore
+
+
+def cues(starts, ends, prefix):
+    return CueStore.from_texts(starts, ends, [f"{prefix}{index}" for index in range(len(starts))])
+
+
+def test_half_cue_offset_pairs_one_to_one():
+    # 每条译文都横跨两条英文字幕：不能连成一整组
+    english = cues(np.arange(200) * 2000, np.arange(200) * 2000 + 2000, 'e')
+    chinese = cues(np.arange(199) * 2000 + 1000, np.arange(199) * 2000 + 3000, 'z')
+
+    groups = align_by_time(english, chinese)
+
+    assert max(len(group['primary']) + len(group['translation']) for group in groups) <= 3
+    assert Counter(group['kind'] for group in groups)['match'] >= 198
+    merged, _ = merge_bilingual(english, chinese, by='time')
+    assert len(merged) >= 199
+    assert int((merged.end - merged.start).max()) <= 4000
+
+
+def test_merge_and_split_detected():
+    english = cues([0, 2000, 4000, 8000], [2000, 4000, 8000, 9000], 'e')
+    chinese = cues([0, 4000, 6000, 20000], [4000, 6000, 8000, 21000], 'z')
+
+    groups = align_by_time(english, chinese)
+
+    assert [(group['kind'], group['primary'], group['translation']) for group in groups] == [
+        ('merge', [0, 1], [0]),
+        ('split', [2], [1, 2]),
+        ('unmatched', [3], []),
+        ('extra', [], [3]),
+    ]
+
+
+def test_overlap_pairs_not_sized_by_longest_cue():
+    # 一条结束时间错了一小时的译文只增加它自己实际重叠的字幕对
+    count = 3600
+    english = cues(np.arange(count) * 1000, np.arange(count) * 1000 + 900, 'e')
+    ends = np.arange(count) * 1000 + 900
+    ends[5] += 3600 * 1000
+    chinese = cues(np.arange(count) * 1000, ends, 'z')
+
+    first, _, _ = overlap_pairs(english, chinese)
+
+    assert len(first) < 2 * count
+    assert Counter(group['kind'] for group in align_by_time(english, chinese)) == {'match': count}
@@ -0,0 +1,108 @@
+import http.server
+import os
+import re
+import threading
+
+import pytest
+
+from resumable_download import DownloadIntegrityError, ResumableDownloader
+
+SOURCE = os.urandom(16 * 1024)
+
+
+class RangeHandler(http.server.BaseHTTPRequestHandler):
+    """本地测试服务器：按 Range 返回数据；可以在第 N 个范围请求中途断开，或完全忽略 Range"""
+
+    ignore_range = False
+    cut_at = None       # 第几个范围请求（从1开始）只发一半数据就断开
+    range_requests = []
+
+    def do_GET(self):
+        match = re.match(r'bytes=(\d+)-(\d+)', self.headers.get('Range') or '')
+        if match and not self.ignore_range:
+            begin, end = int(match.group(1)), min(int(match.group(2)), len(SOURCE) - 1)
+            type(self).range_requests.append((begin, end))
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {begin}-{end}/{len(SOURCE)}')
+        else:
+            begin, end = 0, len(SOURCE) - 1
+            self.send_response(200)
+        body = SOURCE[begin:end + 1]
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if match and len(type(self).range_requests) == self.cut_at:
+            self.wfile.write(body[:len(body) // 2])
+            self.wfile.flush()
+            self.connection.shutdown(2)  # 传输中途断开连接
+            return
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    handler = type('Handler', (RangeHandler,), {'range_requests': []})
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield handler, f"http://127.0.0.1:{httpd.server_address[1]}/source.bin"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_interrupted_range_download_resumes_identically(server, tmp_path):
+    handler, url = server
+    dest = str(tmp_path / 'out.bin')
+    handler.cut_at = 4  # 第1个是探测请求，之后第3个块传到一半断开
+
+    with pytest.raises(Exception):
+        ResumableDownloader(chunk_size=2048).download(url, dest)
+    assert not os.path.exists(dest)
+    assert ResumableDownloader().describe_progress(dest)[0] == 2 * 2048
+
+    handler.cut_at = None
+    handler.range_requests.clear()
+    assert read(ResumableDownloader(chunk_size=2048).download(url, dest)) == SOURCE
+    assert (0, 2047) not in handler.range_requests  # 已完成的块没有重新下载
+
+
+def test_interrupted_fragment_download_resumes_identically(server, tmp_path):
+    handler, url = server
+    dest = str(tmp_path / 'out.bin')
+    fragments = [{'url': url, 'byte_range': (offset, offset + 4095)} for offset in range(0, len(SOURCE), 4096)]
+    handler.cut_at = 3
+
+    with pytest.raises(Exception):
+        ResumableDownloader().download_fragments(fragments, dest)
+    assert not os.path.exists(dest)
+
+    handler.cut_at = None
+    handler.range_requests.clear()
+    assert read(ResumableDownloader().download_fragments(fragments, dest)) == SOURCE
+    assert handler.range_requests == [(8192, 12287), (12288, 16383)]
+
+
+def test_fragments_rejected_when_server_ignores_range(server, tmp_path):
+    handler, url = server
+    handler.ignore_range = True
+    dest = str(tmp_path / 'out.bin')
+    fragments = [{'url': url, 'byte_range': (0, 999)}, {'url': url, 'byte_range': (1000, 2999)}]
+
+    with pytest.raises(DownloadIntegrityError):
+        ResumableDownloader().download_fragments(fragments, dest)
+    assert not os.path.exists(dest)
+    assert ResumableDownloader().load_manifest(dest)['chunks'] == {}
+
+
+def test_server_ignoring_range_falls_back_to_single_stream(server, tmp_path):
+    handler, url = server
+    handler.ignore_range = True
+    dest = str(tmp_path / 'out.bin')
+
+    assert read(ResumableDownloader(chunk_size=2048).download(url, dest)) == SOURCE
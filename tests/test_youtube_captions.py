@@ -0,0 +1,30 @@
+import os
+
+from youtube_captions import parse_vtt
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, name), 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def test_rolling_auto_captions_with_blank_space_lines():
+    # YouTube 自动字幕：每段第一行前是只有一个空格的行，不能当作分块的空行
+    segments = parse_vtt(read_fixture('youtube_auto.en.vtt'))
+
+    assert [segment['text'] for segment in segments] == [" so today we're going to", " talk about the budget"]
+    assert [segment['start'] for segment in segments] == [0.0, 2.879]
+    assert [word['word'] for word in segments[0]['words']] == [' so', ' today', " we're", ' going', ' to']
+    assert segments[1]['words'][1]['start'] == 3.24
+
+
+def test_plain_vtt_cue_keeps_multiline_body():
+    text = "WEBVTT\n\n00:00:01.000 --> 00:00:02.500\nfirst line\nsecond line\n\n00:00:03.000 --> 00:00:04.000\nnext\n"
+    segments = parse_vtt(text)
+
+    assert [(segment['start'], segment['end'], segment['text']) for segment in segments] == [
+        (1.0, 2.5, ' first line second line'),
+        (3.0, 4.0, ' next'),
+    ]
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+转录推理后端 - openai-whisper(fp32/fp16) 与 CTranslate2(faster-whisper, int8量化CPU推理)
+特点：
+- 所有后端返回相同的片段结构（whisper 的 transcribe 格式：id/start/end/text/avg_logprob/no_speech_prob/words...）
+- 解码参数统一使用 openai-whisper 的参数名，各后端自行转换；不支持的参数忽略
+- 每次加载模型时可指定后端；默认取环境变量 WHISPER_BACKEND，否则为 openai
+- faster-whisper 逐段惰性解码，iter_segments 可以边解码边产出
+
+使用方法:
+python transcription_backends.py clip1.mp4 clip2.mp4 --model large-v3 --backends openai,ctranslate2
+    对比各后端的实时率(RTF)、峰值内存(RSS)与词错误率(WER)
+    参考文本取同名 .srt/.txt；没有时以第一个后端的结果作为参考
+"""
+
+import argparse
+import multiprocessing
+import os
+import queue
+import re
+import time
+
+import numpy as np
+
+from audio_artifact import SAMPLE_RATE, load_audio
+from subtitle_core import CueStore
+
+DEFAULT_BACKEND = os.environ.get('WHISPER_BACKEND', 'openai')
+
+
+def package_version(name):
+    try:
+        from importlib.metadata import version
+        return version(name)
+    except Exception:
+        return 'unknown'
+
+
+class OpenAIWhisperBackend:
+    """openai-whisper（PyTorch）"""
+
+    backend = 'openai'
+
+    def __init__(self, model_name, device=None, cpu_threads=None):
+        import whisper
+
+        if cpu_threads:
+            import torch
+            torch.set_num_threads(cpu_threads)
+        self.model_name = model_name
+        self.model = whisper.load_model(model_name, device=device)
+        self.engine_tag = engine_tag('openai')
+
+    def transcribe(self, audio, **options):
+        return self.model.transcribe(load_audio(audio), **options)
+
+
+# openai-whisper 参数名 → faster-whisper 参数名（未列出的参数不支持，忽略）
+FASTER_WHISPER_OPTIONS = {
+    'language': 'language',
+    'task': 'task',
+    'beam_size': 'beam_size',
+    'best_of': 'best_of',
+    'patience': 'patience',
+    'length_penalty': 'length_penalty',
+    'temperature': 'temperature',
+    'compression_ratio_threshold': 'compression_ratio_threshold',
+    'logprob_threshold': 'log_prob_threshold',
+    'no_speech_threshold': 'no_speech_threshold',
+    'condition_on_previous_text': 'condition_on_previous_text',
+    'initial_prompt': 'initial_prompt',
+    'word_timestamps': 'word_timestamps',
+    'suppress_tokens': 'suppress_tokens',
+    'suppress_blank': 'suppress_blank',
+    'prepend_punctuations': 'prepend_punctuations',
+    'append_punctuations': 'append_punctuations',
+}
+
+
+class CTranslate2Backend:
+    """faster-whisper（CTranslate2），CPU上默认int8量化"""
+
+    backend = 'ctranslate2'
+
+    def __init__(self, model_name, device='cpu', cpu_threads=None, compute_type='int8'):
+        try:
+            from faster_whisper import WhisperModel
+        except ImportError:
+            raise RuntimeError("CTranslate2后端需要 faster-whisper: pip install faster-whisper")
+
+        self.model_name = model_name
+        self.compute_type = compute_type
+        self.model = WhisperModel(model_name, device=device or 'cpu', compute_type=compute_type,
+                                  cpu_threads=cpu_threads or 0)
+        self.engine_tag = engine_tag('ctranslate2', compute_type)
+        self.last_language = None
+
+    def convert_options(self, options):
+        converted = {}
+        for key, value in options.items():
+            if key in FASTER_WHISPER_OPTIONS and value is not None:
+                converted[FASTER_WHISPER_OPTIONS[key]] = list(value) if isinstance(value, tuple) else value
+        return converted
+
+    @staticmethod
+    def convert_segment(index, segment):
+        converted = {
+            'id': index,
+            'seek': segment.seek,
+            'start': round(segment.start, 3),
+            'end': round(segment.end, 3),
+            'text': segment.text,
+            'tokens': list(segment.tokens),
+            'temperature': segment.temperature,
+            'avg_logprob': segment.avg_logprob,
+            'compression_ratio': segment.compression_ratio,
+            'no_speech_prob': segment.no_speech_prob,
+        }
+        if segment.words:
+            converted['words'] = [
+                {'word': word.word, 'start': round(word.start, 3), 'end': round(word.end, 3),
+                 'probability': word.probability}
+                for word in segment.words
+            ]
+        return converted
+
+    def iter_segments(self, audio, **options):
+        """逐段产出（faster-whisper 惰性解码：取到下一段时才解码下一个窗口）"""
+        segments, info = self.model.transcribe(load_audio(audio), **self.convert_options(options))
+        self.last_language = info.language
+        for index, segment in enumerate(segments):
+            yield self.convert_segment(index, segment)
+
+    def transcribe(self, audio, **options):
+        segments = list(self.iter_segments(audio, **options))
+        return {
+            'text': ''.join(segment['text'] for segment in segments),
+            'segments': segments,
+            'language': self.last_language,
+        }
+
+
+BACKENDS = {
+    'openai': OpenAIWhisperBackend,
+    'ctranslate2': CTranslate2Backend,
+}
+
+
+def engine_tag(backend=None, compute_type='int8'):
+    """推理引擎及版本标识（写入转录缓存键：不同引擎的结果不混用）"""
+    if resolve_backend(backend) == 'ctranslate2':
+        return f"faster-whisper-{package_version('faster-whisper')}-{compute_type}"
+    return f"whisper-{package_version('openai-whisper')}"
+
+
+def resolve_backend(backend=None):
+    backend = backend or DEFAULT_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"未知的转录后端: {backend}（可选: {', '.join(BACKENDS)}）")
+    return backend
+
+
+def model_label(model_name, backend=None):
+    """服务端/日志中使用的模型标识：默认后端只显示模型名"""
+    backend = resolve_backend(backend)
+    return model_name if backend == 'openai' else f"{model_name}@{backend}"
+
+
+def load_backend(model_name, backend=None, device=None, cpu_threads=None):
+    return BACKENDS[resolve_backend(backend)](model_name, device=device, cpu_threads=cpu_threads)
+
+
+# ---------- 基准测试 ----------
+
+def normalize_words(text):
+    return re.sub(r"[^a-z0-9' ]", ' ', text.lower()).split()
+
+
+def word_error_rate(reference, hypothesis):
+    """词级编辑距离 / 参考词数（按行做向量化DP，长文本也不会太慢）"""
+    reference, hypothesis = normalize_words(reference), normalize_words(hypothesis)
+    if not reference:
+        return 0.0 if not hypothesis else 1.0
+    vocabulary = {}
+    ref = np.array([vocabulary.setdefault(word, len(vocabulary)) for word in reference])
+    hyp = np.array([vocabulary.setdefault(word, len(vocabulary)) for word in hypothesis], dtype=ref.dtype)
+
+    positions = np.arange(len(hyp) + 1)
+    previous = positions.copy()
+    for index, word in enumerate(ref, 1):
+        candidates = np.empty_like(previous)
+        candidates[0] = index
+        candidates[1:] = np.minimum(previous[1:] + 1, previous[:-1] + (hyp != word))  # 删除 / 替换
+        # 插入: d[j] = min(d[j-1] + 1, candidates[j]) 等价于对 candidates[k] - k 取前缀最小值
+        previous = np.minimum.accumulate(candidates - positions) + positions
+    return float(previous[-1]) / len(ref)
+
+
+def read_reference(path):
+    """读取参考文本：.srt 去掉序号和时间轴，.txt 原样"""
+    with open(path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    if path.lower().endswith('.srt'):
+        return ' '.join(CueStore.parse(content, line_sep=' ').texts())
+    return content
+
+
+def find_reference(clip):
+    stem = os.path.splitext(clip)[0]
+    for suffix in ('.srt', '.txt'):
+        if os.path.exists(stem + suffix):
+            return read_reference(stem + suffix)
+    return None
+
+
+def _benchmark_worker(backend, model_name, clips, cpu_threads, results):
+    """子进程中运行：峰值RSS只统计这一个后端"""
+    import resource
+
+    started = time.time()
+    model = load_backend(model_name, backend, cpu_threads=cpu_threads)
+    load_seconds = time.time() - started
+    rows = []
+    for clip in clips:
+        audio = np.array(load_audio(clip))
+        started = time.time()
+        result = model.transcribe(audio, language='en', beam_size=5, temperature=0.0)
+        elapsed = time.time() - started
+        rows.append({'clip': clip, 'seconds': elapsed, 'duration': len(audio) / SAMPLE_RATE,
+                     'text': result['text']})
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # Linux 上单位为KB
+    results.put({'backend': backend, 'load_seconds': load_seconds, 'rows': rows, 'peak_rss_mb': peak_kb / 1024})
+
+
+def run_benchmark(clips, model_name, backends, cpu_threads=None):
+    for clip in clips:
+        load_audio(clip)  # 先统一解码，解码时间与内存不计入任何后端
+
+    context = multiprocessing.get_context('spawn')
+    reports = []
+    for backend in backends:
+        results = context.Queue()
+        process = context.Process(target=_benchmark_worker, args=(backend, model_name, clips, cpu_threads, results))
+        process.start()
+        report = None
+        while report is None and (process.is_alive() or not results.empty()):
+            try:
+                report = results.get(timeout=1)
+            except queue.Empty:
+                continue
+        process.join()
+        if report is None:
+            print(f"❌ {backend} 后端基准测试失败（子进程退出码 {process.exitcode}）")
+            continue
+        reports.append(report)
+    if not reports:
+        return reports
+
+    references = {clip: find_reference(clip) for clip in clips}
+    baseline = reports[0]['backend']
+    for clip, row in zip(clips, reports[0]['rows']):
+        if references[clip] is None:
+            references[clip] = row['text']
+
+    print(f"\n📊 转录后端基准测试: 模型 {model_name}, {len(clips)} 个片段, CPU {os.cpu_count()} 核")
+    if any(find_reference(clip) is None for clip in clips):
+        print(f"   （无参考字幕的片段以 {baseline} 的结果作为参考）")
+    print(f"   {'后端':<14}{'加载(秒)':>10}{'转录(秒)':>10}{'RTF':>8}{'峰值RSS(MB)':>14}{'WER':>8}")
+    for report in reports:
+        seconds = sum(row['seconds'] for row in report['rows'])
+        duration = sum(row['duration'] for row in report['rows'])
+        reference_words = sum(len(normalize_words(references[row['clip']])) for row in report['rows'])
+        errors = sum(word_error_rate(references[row['clip']], row['text']) * len(normalize_words(references[row['clip']]))
+                     for row in report['rows'])
+        wer = errors / reference_words if reference_words else 0.0
+        print(f"   {report['backend']:<14}{report['load_seconds']:>10.1f}{seconds:>10.1f}"
+              f"{seconds / duration if duration else 0:>8.3f}{report['peak_rss_mb']:>14.0f}{wer:>8.1%}")
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description='转录后端基准测试（RTF / 峰值RSS / WER）')
+    parser.add_argument('clips', nargs='+', help='音频或视频片段')
+    parser.add_argument('--model', default='base')
+    parser.add_argument('--backends', default='openai,ctranslate2', help='逗号分隔，第一个作为无参考时的基准')
+    parser.add_argument('--threads', type=int, default=None, help='每个后端使用的CPU线程数')
+    args = parser.parse_args()
+
+    backends = [resolve_backend(name.strip()) for name in args.backends.split(',') if name.strip()]
+    run_benchmark(args.clips, args.model, backends, args.threads)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+转录结果缓存 - 按解码后PCM的哈希 + 模型名/推理引擎 + 完整解码参数索引
+特点：结果(片段、词级时间戳、logprob)以zlib压缩的JSON保存；按总字节数上限做LRU淘汰；
+同一文件(路径/大小/修改时间不变)再次命中时连音频解码都可以跳过
+
+只改了某个解码参数（如 beam_size、initial_prompt）时，只有这一组参数需要重新转录
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+SAMPLE_RATE = 16000
+
+
+def whisper_version():
+    try:
+        from importlib.metadata import version
+        return version('openai-whisper')
+    except Exception:
+        return 'unknown'
+
+
+def canonical_options(options):
+    """解码参数规范化：去掉不影响结果的参数，元组转列表，键排序"""
+    cleaned = {key: value for key, value in options.items() if key not in ('verbose',)}
+    return json.dumps(cleaned, sort_keys=True, ensure_ascii=False, separators=(',', ':'),
+                      default=lambda value: list(value) if isinstance(value, tuple) else repr(value))
+
+
+class TranscriptionCache:
+    """线程/进程安全的转录结果缓存"""
+
+    def __init__(self, db_path=os.path.join("output", ".transcription_cache.sqlite3"), max_bytes=512 * 1024 * 1024):
+        self.db_path = db_path
+        self.max_bytes = max_bytes    # 压缩后结果的总字节数上限
+        self._local = threading.local()
+        self._init_schema()
+
+    def _connect(self):
+        """每个线程使用独立连接，WAL模式允许读写并发"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS transcriptions (
+                key TEXT PRIMARY KEY,
+                audio_hash TEXT NOT NULL,
+                model TEXT NOT NULL,
+                options TEXT NOT NULL,
+                payload BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            ) WITHOUT ROWID
+        """)
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_transcriptions_last_access ON transcriptions(last_access)')
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS audio_hashes (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                audio_hash TEXT NOT NULL
+            ) WITHOUT ROWID
+        """)
+
+    # ---------- 音频哈希 ----------
+
+    @staticmethod
+    def hash_pcm(audio):
+        import numpy as np
+        return hashlib.sha256(np.ascontiguousarray(audio, dtype=np.float32).tobytes()).hexdigest()
+
+    def cached_file_hash(self, path):
+        """文件未变化时直接返回上次解码得到的PCM哈希"""
+        stat = os.stat(path)
+        row = self._connect().execute(
+            'SELECT audio_hash FROM audio_hashes WHERE path = ? AND size = ? AND mtime_ns = ?',
+            (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        ).fetchone()
+        return row[0] if row else None
+
+    def remember_file_hash(self, path, audio_hash):
+        stat = os.stat(path)
+        self._connect().execute("""
+            INSERT INTO audio_hashes (path, size, mtime_ns, audio_hash) VALUES (?, ?, ?, ?)
+            ON CONFLICT(path) DO UPDATE SET size = excluded.size, mtime_ns = excluded.mtime_ns,
+                audio_hash = excluded.audio_hash
+        """, (os.path.abspath(path), stat.st_size, stat.st_mtime_ns, audio_hash))
+
+    # ---------- 结果 ----------
+
+    @staticmethod
+    def make_key(audio_hash, model, options):
+        return hashlib.sha256(f"{audio_hash}|{model}|{options}".encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        conn = self._connect()
+        row = conn.execute('SELECT payload FROM transcriptions WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        conn.execute('UPDATE transcriptions SET last_access = ? WHERE key = ?', (time.time(), key))
+        return json.loads(zlib.decompress(row[0]).decode('utf-8'))
+
+    def put(self, key, audio_hash, model, options, result):
+        """写入结果，并按总字节数上限淘汰最久未使用的条目"""
+        payload = zlib.compress(
+            json.dumps(result, ensure_ascii=False, separators=(',', ':'),
+                       default=lambda value: value.tolist() if hasattr(value, 'tolist') else repr(value)).encode('utf-8'),
+            6
+        )
+        now = time.time()
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute("""
+                INSERT INTO transcriptions (key, audio_hash, model, options, payload, size, created_at, last_access)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET
+                    payload = excluded.payload,
+                    size = excluded.size,
+                    created_at = excluded.created_at,
+                    last_access = excluded.last_access
+            """, (key, audio_hash, model, options, payload, len(payload), now, now))
+
+            total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM transcriptions').fetchone()[0]
+            if total > self.max_bytes:
+                for old_key, size in conn.execute(
+                        'SELECT key, size FROM transcriptions WHERE key != ? ORDER BY last_access', (key,)
+                ).fetchall():
+                    conn.execute('DELETE FROM transcriptions WHERE key = ?', (old_key,))
+                    total -= size
+                    if total <= self.max_bytes:
+                        break
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return len(payload)
+
+    def stats(self):
+        count, total = self._connect().execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM transcriptions'
+        ).fetchone()
+        return {'entries': count, 'bytes': total, 'max_bytes': self.max_bytes}
+
+    def clear(self):
+        conn = self._connect()
+        conn.execute('DELETE FROM transcriptions')
+        conn.execute('DELETE FROM audio_hashes')
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+_default_cache = None
+
+
+def get_default_cache():
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = TranscriptionCache()
+    return _default_cache
+
+
+class CachedWhisperModel:
+    """包装任何带 transcribe(audio, **options) 的模型对象（本地模型、服务代理、并行转录器）
+
+    variant 区分结果不同的转录方式（例如VAD并行切块），避免与整段转录的结果混用
+    """
+
+    def __init__(self, model, model_name, variant=None, cache=None):
+        self.model = model
+        self.model_name = model_name
+        self.variant = variant
+        self.cache = cache or get_default_cache()
+        self.last_hit = False
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+    def lookup(self, audio, options):
+        """返回 (audio, 缓存键信息, 缓存结果)；缓存不可用时键信息为None"""
+        path = audio if isinstance(audio, str) else None
+        try:
+            audio_hash = self.cache.cached_file_hash(path) if path else None
+            if audio_hash is None:
+                if path:
+                    from audio_artifact import load_audio
+                    audio = load_audio(path)  # 项目级PCM文件，同时用于哈希和转录
+                audio_hash = self.cache.hash_pcm(audio)
+                if path:
+                    self.cache.remember_file_hash(path, audio_hash)
+
+            options_key = canonical_options(options)
+            engine = getattr(self.model, 'engine_tag', None) or f"whisper-{whisper_version()}"
+            model_key = f"{self.model_name}|{self.variant or 'full'}|{engine}"
+            key = self.cache.make_key(audio_hash, model_key, options_key)
+            return audio, (key, audio_hash, model_key, options_key), self.cache.get(key)
+        except Exception as e:
+            print(f"⚠️ 转录缓存不可用: {str(e)[:80]}")
+            return audio, None, None
+
+    def store(self, entry, result):
+        if entry is None:
+            return
+        try:
+            self.cache.put(*entry, result)
+        except Exception as e:
+            print(f"⚠️ 写入转录缓存失败: {str(e)[:80]}")
+
+    def report_hit(self, cached):
+        self.last_hit = True
+        print(f"⚡ 命中转录缓存 ({self.model_name}, {len(cached.get('segments', []))} 个片段)，跳过识别")
+
+    def transcribe(self, audio, **options):
+        audio, entry, cached = self.lookup(audio, options)
+        if cached is not None:
+            self.report_hit(cached)
+            return cached
+
+        self.last_hit = False
+        result = self.model.transcribe(audio, **options)
+        self.store(entry, result)
+        return result
+
+    def iter_segments(self, audio, **options):
+        """流式转录：命中缓存时直接产出缓存的片段，否则边转录边产出，全部完成后写入缓存"""
+        audio, entry, cached = self.lookup(audio, options)
+        if cached is not None:
+            self.report_hit(cached)
+            yield from cached['segments']
+            return
+
+        self.last_hit = False
+        if not hasattr(self.model, 'iter_segments'):
+            result = self.model.transcribe(audio, **options)
+            self.store(entry, result)
+            yield from result['segments']
+            return
+
+        segments = []
+        for segment in self.model.iter_segments(audio, **options):
+            segments.append(segment)
+            yield segment
+        self.store(entry, {
+            'text': ''.join(segment['text'] for segment in segments),
+            'segments': segments,
+            'language': getattr(self.model, 'last_language', None),
+        })
+
+
+def main():
+    """命令行：查看或清空缓存"""
+    import sys
+
+    cache = TranscriptionCache(sys.argv[2]) if len(sys.argv) > 2 else TranscriptionCache()
+    if len(sys.argv) > 1 and sys.argv[1] == "--clear":
+        cache.clear()
+        print("🗑️ 转录缓存已清空")
+
+    stats = cache.stats()
+    print(f"📋 转录缓存: {stats['entries']} 条, {stats['bytes'] / (1024*1024):.1f}MB / "
+          f"{stats['max_bytes'] / (1024*1024):.0f}MB ({cache.db_path})")
+
+
+if __name__ == "__main__":
+    main()
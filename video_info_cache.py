@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+视频信息缓存 - 基于SQLite的索引式存储
+特点：按URL主键索引查询、精简信息投影、TTL过期、LRU容量上限、并发安全的单键原子写入
+
+替代原来的 output/.video_info_cache.json：
+- 旧方案每次未命中都要读取并重写整个JSON文件，URL越多越慢
+- 多个进程并行运行时会互相覆盖对方写入的条目
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# 顶层字段中需要保留的键（下载、命名、切片只依赖这些）
+INFO_KEYS = (
+    'id', 'title', 'fulltitle', 'duration', 'webpage_url', 'webpage_url_basename',
+    'original_url', 'extractor', 'extractor_key', 'uploader', 'channel', 'channel_id',
+    'upload_date', 'ext', 'is_live', 'was_live', 'live_status', 'http_headers', 'language',
+)
+
+# 每个格式中需要保留的键（格式选择、分片下载依赖这些）
+FORMAT_KEYS = (
+    'format_id', 'format_note', 'ext', 'protocol', 'url', 'manifest_url',
+    'fragment_base_url', 'fragments', 'width', 'height', 'fps', 'vcodec', 'acodec',
+    'abr', 'vbr', 'tbr', 'asr', 'audio_channels', 'filesize', 'filesize_approx',
+    'container', 'dynamic_range', 'quality', 'source_preference', 'language',
+    'language_preference', 'has_drm', 'http_headers', 'downloader_options',
+)
+
+# 字幕轨道只保留英文的 json3/vtt（youtube_captions 只用这些），自动字幕的上百种翻译语言不缓存
+CAPTION_EXTS = ('json3', 'vtt')
+CAPTION_KEYS = ('ext', 'url', 'name', 'http_headers')
+
+
+def is_english(language):
+    return language == 'en' or language.startswith('en-')
+
+
+def trim_captions(tracks):
+    return {
+        language: [{key: track[key] for key in CAPTION_KEYS if key in track}
+                   for track in entries if track.get('ext') in CAPTION_EXTS]
+        for language, entries in (tracks or {}).items() if is_english(language)
+    }
+
+
+def trim_video_info(info):
+    """只保留后续流程需要的字段，丢弃缩略图、描述、非英文字幕轨道等大字段"""
+    trimmed = {key: info[key] for key in INFO_KEYS if key in info}
+    trimmed['formats'] = [
+        {key: fmt[key] for key in FORMAT_KEYS if key in fmt}
+        for fmt in info.get('formats') or []
+    ]
+    trimmed['subtitles'] = trim_captions(info.get('subtitles'))
+    trimmed['automatic_captions'] = trim_captions(info.get('automatic_captions'))
+    return trimmed
+
+
+class VideoInfoCache:
+    """线程/进程安全的视频信息缓存"""
+
+    def __init__(self, db_path, ttl=300, max_entries=10000):
+        self.db_path = db_path
+        self.ttl = ttl                    # 条目有效期（秒），格式URL会过期，不宜过长
+        self.max_entries = max_entries    # LRU容量上限
+        self._local = threading.local()
+        self._init_schema()
+
+    def _connect(self):
+        """每个线程使用独立连接，WAL模式允许读写并发"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS video_info (
+                url TEXT PRIMARY KEY,
+                info TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            ) WITHOUT ROWID
+        """)
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_video_info_last_access ON video_info(last_access)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_video_info_created_at ON video_info(created_at)')
+
+    def get(self, url):
+        """按URL查询，过期条目视为未命中"""
+        conn = self._connect()
+        row = conn.execute(
+            'SELECT info, created_at FROM video_info WHERE url = ?', (url,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        now = time.time()
+        if now - row[1] >= self.ttl:
+            conn.execute('DELETE FROM video_info WHERE url = ? AND created_at = ?', (url, row[1]))
+            return None
+
+        conn.execute('UPDATE video_info SET last_access = ? WHERE url = ?', (now, url))
+        return json.loads(row[0])
+
+    def put(self, url, info, trim=True):
+        """原子写入单个URL的条目，并按TTL和容量上限清理旧条目"""
+        if trim:
+            info = trim_video_info(info)
+        payload = json.dumps(info, ensure_ascii=False, separators=(',', ':'))
+        now = time.time()
+
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute("""
+                INSERT INTO video_info (url, info, created_at, last_access)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    info = excluded.info,
+                    created_at = excluded.created_at,
+                    last_access = excluded.last_access
+            """, (url, payload, now, now))
+            conn.execute('DELETE FROM video_info WHERE created_at < ?', (now - self.ttl,))
+
+            overflow = conn.execute('SELECT COUNT(*) FROM video_info').fetchone()[0] - self.max_entries
+            if overflow > 0:
+                conn.execute("""
+                    DELETE FROM video_info WHERE url IN (
+                        SELECT url FROM video_info ORDER BY last_access LIMIT ?
+                    )
+                """, (overflow,))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return info
+
+    def purge_expired(self):
+        """清理所有过期条目，返回删除数量"""
+        conn = self._connect()
+        cursor = conn.execute('DELETE FROM video_info WHERE created_at < ?', (time.time() - self.ttl,))
+        return cursor.rowcount
+
+    def __len__(self):
+        return self._connect().execute('SELECT COUNT(*) FROM video_info').fetchone()[0]
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def main():
+    """命令行：查看或清理缓存"""
+    import sys
+
+    db_path = sys.argv[2] if len(sys.argv) > 2 else "output/.video_info_cache.sqlite3"
+    cache = VideoInfoCache(db_path)
+
+    if len(sys.argv) > 1 and sys.argv[1] == "--purge":
+        removed = cache.purge_expired()
+        print(f"🗑️ 已清理 {removed} 个过期条目")
+
+    print(f"📋 缓存条目数: {len(cache)} ({db_path})")
+
+
+if __name__ == "__main__":
+    main()
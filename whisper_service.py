@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Whisper常驻转录服务 - 通过Unix套接字在多次运行之间保持模型常驻内存
+特点：预加载可配置的模型集合、任务排队串行执行、按片段流式返回结果（逐段解码的后端边解码边返回）、套接字仅限当前用户
+
+协议（每行一个JSON）:
+  请求  {"op": "ping"} / {"op": "load", "model": "large-v3"} / {"op": "transcribe", "model": "base", "audio_path": "...", "options": {...}}
+        可选 "backend": "openai" / "ctranslate2"（默认 openai）
+        音频已解码时发送 "pcm_bytes": N，紧跟N字节 float32 16kHz 单声道PCM
+  响应  {"type": "queued", "position": n} → {"type": "segment", "segment": {...}}... → {"type": "done", "text", "language"}
+        出错时 {"type": "error", "error": "..."}
+
+使用方法:
+python whisper_service.py --models base,large-v3     # 启动服务（前台运行）
+python whisper_service.py --models large-v3@ctranslate2   # int8量化的CTranslate2后端
+python whisper_service.py --status                   # 查看服务状态
+python whisper_service.py --stop                     # 停止服务
+
+各脚本通过 load_whisper_model(name, backend=None) 获取模型：服务运行时返回远程代理，否则在本进程加载；
+两种情况都会包上转录结果缓存(transcription_cache)
+"""
+
+import argparse
+import json
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+
+from transcription_backends import engine_tag, load_backend, model_label, resolve_backend
+
+DEFAULT_SOCKET = os.environ.get('WHISPER_SERVICE_SOCKET', os.path.join("output", ".whisper_service.sock"))
+
+
+def to_jsonable(value):
+    """把 numpy 标量/数组转换为JSON可序列化的类型"""
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    raise TypeError(f"无法序列化: {type(value).__name__}")
+
+
+def send_message(stream, message):
+    stream.write((json.dumps(message, ensure_ascii=False, default=to_jsonable) + '\n').encode('utf-8'))
+    stream.flush()
+
+
+# ---------- 服务端 ----------
+
+class TranscriptionJob:
+    def __init__(self, model, backend, audio, options):
+        self.model = model
+        self.backend = backend
+        self.audio = audio
+        self.options = options
+        self.messages = queue.Queue()
+
+
+class WhisperService:
+    """持有常驻模型并串行执行转录任务"""
+
+    def __init__(self, socket_path=DEFAULT_SOCKET, models=("base",), device=None, backend=None):
+        self.socket_path = socket_path
+        self.warm_models = list(models)
+        self.device = device
+        self.backend = resolve_backend(backend)
+        self.models = {}
+        self.jobs = queue.Queue()
+        self.server = None
+        self.completed = 0
+        self.started_at = time.time()
+
+    def get_model(self, name, backend=None):
+        """模型按 名称@后端 区分，同一模型可以同时以两种后端常驻"""
+        if '@' in name:
+            name, backend = name.split('@', 1)
+        backend = resolve_backend(backend or self.backend)
+        label = model_label(name, backend)
+        if label not in self.models:
+            print(f"🔄 加载Whisper模型: {label}")
+            started = time.time()
+            self.models[label] = load_backend(name, backend, device=self.device)
+            print(f"✅ {label} 加载完成 ({time.time() - started:.1f}秒)")
+        return self.models[label]
+
+    def worker(self):
+        """单一工作线程：模型只在这里使用，任务按到达顺序执行"""
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            try:
+                model = self.get_model(job.model, job.backend)
+                if job.audio is None:
+                    job.messages.put({'type': 'done', 'text': '', 'language': None})  # 仅预加载
+                    continue
+                started = time.time()
+                if hasattr(model, 'iter_segments'):
+                    # 逐段解码的后端：每解出一段就发给客户端
+                    texts = []
+                    for segment in model.iter_segments(job.audio, **job.options):
+                        job.messages.put({'type': 'segment', 'segment': segment})
+                        texts.append(segment['text'])
+                    text, language = ''.join(texts), model.last_language
+                else:
+                    result = model.transcribe(job.audio, **job.options)
+                    for segment in result.get('segments', []):
+                        job.messages.put({'type': 'segment', 'segment': segment})
+                    text, language = result.get('text', ''), result.get('language')
+                job.messages.put({
+                    'type': 'done',
+                    'text': text,
+                    'language': language,
+                    'seconds': round(time.time() - started, 2),
+                })
+                self.completed += 1
+            except Exception as e:
+                job.messages.put({'type': 'error', 'error': str(e)})
+            finally:
+                job.audio = None
+
+    def handle(self, rfile, wfile):
+        request = json.loads(rfile.readline().decode('utf-8'))
+        op = request.get('op')
+
+        if op == 'ping':
+            send_message(wfile, {
+                'type': 'pong',
+                'models': sorted(self.models),
+                'queue': self.jobs.qsize(),
+                'completed': self.completed,
+                'uptime': round(time.time() - self.started_at, 1),
+            })
+            return
+        if op == 'shutdown':
+            send_message(wfile, {'type': 'bye'})
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+            return
+        if op not in ('transcribe', 'load'):
+            send_message(wfile, {'type': 'error', 'error': f"unknown op: {op}"})
+            return
+
+        if op == 'load':
+            audio = None
+        elif request.get('pcm_bytes'):
+            import numpy as np
+            audio = np.frombuffer(rfile.read(request['pcm_bytes']), dtype=np.float32)
+        else:
+            audio = request['audio_path']
+
+        job = TranscriptionJob(request.get('model', 'base'), request.get('backend'), audio, request.get('options') or {})
+        send_message(wfile, {'type': 'queued', 'position': self.jobs.qsize()})
+        self.jobs.put(job)
+        while True:
+            message = job.messages.get()
+            try:
+                send_message(wfile, message)
+            except (BrokenPipeError, ConnectionResetError):
+                return  # 客户端已断开，任务结果丢弃
+            if message['type'] in ('done', 'error'):
+                return
+
+    def serve(self):
+        if os.path.exists(self.socket_path):
+            if WhisperServiceClient(self.socket_path).ping():
+                print(f"⚠️ 服务已在运行: {self.socket_path}")
+                return
+            os.remove(self.socket_path)  # 上次异常退出留下的套接字文件
+        directory = os.path.dirname(self.socket_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        for name in self.warm_models:
+            self.get_model(name)
+
+        service = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                try:
+                    service.handle(self.rfile, self.wfile)
+                except Exception as e:
+                    print(f"⚠️ 请求处理失败: {e}")
+
+        worker = threading.Thread(target=self.worker, daemon=True)
+        worker.start()
+        # 请求中的 audio_path 会被服务直接打开：套接字只允许当前用户连接（创建时即为0600，没有窗口期）
+        old_umask = os.umask(0o177)
+        try:
+            self.server = socketserver.ThreadingUnixStreamServer(self.socket_path, Handler)
+        finally:
+            os.umask(old_umask)
+        self.server.daemon_threads = True
+        print(f"🎧 Whisper服务已启动: {self.socket_path} (常驻模型: {', '.join(self.warm_models)})")
+        try:
+            self.server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.server.server_close()
+            self.jobs.put(None)
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+            print("👋 Whisper服务已停止")
+
+
+# ---------- 客户端 ----------
+
+class WhisperServiceClient:
+    def __init__(self, socket_path=DEFAULT_SOCKET, timeout=None):
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    def connect(self, timeout=None):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout if timeout is not None else self.timeout)
+        sock.connect(self.socket_path)
+        return sock
+
+    def request(self, message, payload=None, timeout=None):
+        """发送请求并逐条产出响应"""
+        with self.connect(timeout) as sock, sock.makefile('rwb') as stream:
+            stream.write((json.dumps(message, default=to_jsonable) + '\n').encode('utf-8'))
+            if payload is not None:
+                stream.write(payload)
+            stream.flush()
+            for line in stream:
+                response = json.loads(line.decode('utf-8'))
+                yield response
+                if response['type'] in ('pong', 'bye', 'done', 'error'):
+                    return
+
+    def ping(self, timeout=1.0):
+        """服务可用时返回状态字典，否则返回None"""
+        if not os.path.exists(self.socket_path):
+            return None
+        try:
+            for response in self.request({'op': 'ping'}, timeout=timeout):
+                return response
+        except (OSError, ValueError):
+            return None
+
+    def load(self, model, backend=None):
+        """让服务加载模型（与转录任务同一队列），加载失败时抛出异常"""
+        for response in self.request({'op': 'load', 'model': model, 'backend': backend}):
+            if response['type'] == 'error':
+                raise RuntimeError(f"Whisper服务加载模型失败: {response['error']}")
+            if response['type'] == 'done':
+                return True
+
+    def shutdown(self):
+        for response in self.request({'op': 'shutdown'}, timeout=5):
+            return response
+
+    def iter_transcribe(self, audio, model='base', backend=None, **options):
+        """流式转录：逐个产出片段，最后产出 done 消息"""
+        message = {'op': 'transcribe', 'model': model, 'backend': backend, 'options': options}
+        payload = None
+        if isinstance(audio, str):
+            message['audio_path'] = os.path.abspath(audio)
+        else:
+            import numpy as np
+            payload = np.ascontiguousarray(audio, dtype=np.float32).tobytes()
+            message['pcm_bytes'] = len(payload)
+
+        for response in self.request(message, payload):
+            if response['type'] == 'error':
+                raise RuntimeError(f"Whisper服务转录失败: {response['error']}")
+            if response['type'] in ('segment', 'done'):
+                yield response
+
+    def transcribe(self, audio, model='base', backend=None, **options):
+        """与 whisper 模型的 transcribe 返回相同结构: {'text', 'segments', 'language'}"""
+        segments = []
+        for response in self.iter_transcribe(audio, model, backend, **options):
+            if response['type'] == 'segment':
+                segments.append(response['segment'])
+            else:
+                return {'text': response['text'], 'segments': segments, 'language': response['language']}
+        raise RuntimeError("Whisper服务连接意外中断")
+
+
+class RemoteWhisperModel:
+    """远程模型代理，接口与 whisper 模型对象的 transcribe 一致"""
+
+    def __init__(self, name, client, backend=None):
+        self.name = name
+        self.client = client
+        self.backend = resolve_backend(backend)
+        self.engine_tag = engine_tag(self.backend)
+
+    def transcribe(self, audio, **options):
+        options.pop('verbose', None)
+        return self.client.transcribe(audio, model=self.name, backend=self.backend, **options)
+
+    def __repr__(self):
+        return f"RemoteWhisperModel({model_label(self.name, self.backend)!r}, {self.client.socket_path!r})"
+
+
+def load_whisper_model(name="base", socket_path=DEFAULT_SOCKET, cache=True, backend=None):
+    """服务运行时返回远程代理（模型已常驻），否则在本进程加载；cache=True 时相同音频+参数直接复用结果
+
+    backend: openai / ctranslate2（int8量化CPU推理），默认取环境变量 WHISPER_BACKEND
+    """
+    backend = resolve_backend(backend)
+    label = model_label(name, backend)
+    client = WhisperServiceClient(socket_path)
+    status = client.ping()
+    if status is not None:
+        print(f"🎧 使用常驻Whisper服务 ({label}，已加载: {', '.join(status['models']) or '无'})")
+        if label not in status['models']:
+            client.load(name, backend)
+        model = RemoteWhisperModel(name, client, backend)
+    else:
+        model = load_backend(name, backend)
+
+    if cache:
+        from transcription_cache import CachedWhisperModel
+        model = CachedWhisperModel(model, name)  # 缓存键包含推理引擎及版本
+    return model
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Whisper常驻转录服务')
+    parser.add_argument('--models', default='base', help='预加载的模型，逗号分隔；可写作 名称@后端')
+    parser.add_argument('--socket', default=DEFAULT_SOCKET, help='Unix套接字路径')
+    parser.add_argument('--device', default=None, help='cpu / cuda')
+    parser.add_argument('--backend', default=None, help='默认推理后端: openai / ctranslate2')
+    parser.add_argument('--status', action='store_true', help='查看服务状态')
+    parser.add_argument('--stop', action='store_true', help='停止服务')
+    args = parser.parse_args()
+
+    client = WhisperServiceClient(args.socket)
+    if args.status:
+        status = client.ping()
+        if status is None:
+            print("⭕ 服务未运行")
+        else:
+            print(f"🎧 服务运行中: 模型 {', '.join(status['models'])}，排队 {status['queue']}，"
+                  f"已完成 {status['completed']}，运行 {status['uptime']}秒")
+        return
+    if args.stop:
+        if client.ping() is None:
+            print("⭕ 服务未运行")
+        else:
+            client.shutdown()
+            print("✅ 已发送停止请求")
+        return
+
+    models = [name.strip() for name in args.models.split(',') if name.strip()]
+    WhisperService(args.socket, models, args.device, args.backend).serve()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+YouTube字幕来源 - 频道已上传英文字幕时直接使用，不必运行Whisper
+特点：
+- 人工字幕优先于自动字幕；非英语视频的英文自动字幕是机器翻译，不使用
+- 格式优先 json3（自动字幕带逐词时间），其次 vtt；两种格式都单遍解析为与Whisper相同的片段结构
+  {'start', 'end', 'text', 'words'?}，滚动显示的自动字幕按行去重
+- 质量检查：覆盖到视频结尾、词密度足够、不是以 [Music] 之类的标注为主；不通过时由调用方改用Whisper
+- 请求经过 retry_policy 的主机级限速与熔断
+
+使用方法:
+python youtube_captions.py "https://www.youtube.com/watch?v=..." --srt english.srt
+python youtube_captions.py "https://www.youtube.com/watch?v=..." --start 28:23 --end 36:10
+python youtube_captions.py captions.en.json3 --srt english.srt          # 解析已下载的字幕文件
+"""
+
+import argparse
+import html
+import json
+import os
+import re
+import urllib.request
+
+from retry_policy import before_request, record_result
+from subtitle_core import parse_time
+from video_info_cache import CAPTION_EXTS, is_english
+
+# 同类轨道中的语言优先级：自动字幕的 en-orig 是原始语音识别结果
+MANUAL_LANGUAGES = ('en', 'en-US', 'en-GB')
+AUTOMATIC_LANGUAGES = ('en-orig', 'en', 'en-US', 'en-GB')
+
+MIN_COVERAGE = 0.8          # 最后一条字幕至少到视频时长的这个比例
+MIN_WORDS_PER_MINUTE = 40
+MAX_ANNOTATION_SHARE = 0.5  # [Music] [Applause] 等标注所占片段比例上限
+
+TIMESTAMP_TAG = re.compile(r'<(\d+:\d{2}:\d{2}\.\d{3})>')
+MARKUP_TAG = re.compile(r'<[^>]*>')
+ANNOTATION = re.compile(r'^[\[(♪][^\])]*[\])♪]?$')
+
+
+def clean_text(text):
+    return ' '.join(html.unescape(MARKUP_TAG.sub('', text)).split())
+
+
+def fix_overlaps(segments):
+    """滚动显示的字幕前一行会一直显示到下一行出现之后：结束时间截到下一条开始"""
+    for current, following in zip(segments, segments[1:]):
+        if following['start'] > current['start'] and current['end'] > following['start']:
+            current['end'] = following['start']
+            if current.get('words'):
+                current['words'][-1]['end'] = min(current['words'][-1]['end'], following['start'])
+    return segments
+
+
+def finish_words(words, end):
+    """逐词时间只有开始时间：每个词到下一个词开始为止"""
+    for word, following in zip(words, words[1:]):
+        word['end'] = following['start']
+    if words:
+        words[-1]['end'] = max(words[-1]['start'], end)
+    return words
+
+
+def parse_json3(data):
+    """YouTube json3：每个 event 一行，自动字幕的 segs 是带 tOffsetMs 的逐词片段"""
+    segments = []
+    for event in json.loads(data).get('events', []):
+        segs = event.get('segs')
+        if not segs or event.get('aAppend'):
+            continue
+        start = event.get('tStartMs', 0) / 1000
+        end = start + event.get('dDurationMs', 0) / 1000
+        text = clean_text(''.join(seg.get('utf8', '') for seg in segs))
+        if not text:
+            continue
+        segment = {'start': start, 'end': end, 'text': ' ' + text}
+        if len(segs) > 1 and any('tOffsetMs' in seg for seg in segs):
+            words = [{'word': ' ' + clean_text(seg['utf8']), 'start': start + seg.get('tOffsetMs', 0) / 1000}
+                     for seg in segs if clean_text(seg.get('utf8', ''))]
+            segment['words'] = finish_words(words, end)
+        segments.append(segment)
+    return fix_overlaps(segments)
+
+
+def parse_timed_line(line, start, end):
+    """自动字幕VTT的新行: 'word<00:00:01.040><c> next</c>...' → 逐词时间"""
+    pieces = TIMESTAMP_TAG.split(line)
+    words = []
+    word_start = start
+    for index, piece in enumerate(pieces):
+        if index % 2:
+            word_start = parse_time(piece) / 1000
+            continue
+        text = clean_text(piece)
+        if text:
+            words.append({'word': ' ' + text, 'start': word_start})
+    return finish_words(words, end)
+
+
+def parse_vtt(text):
+    """WebVTT；自动字幕每条同时显示上一行和带逐词时间的新行，只取新行"""
+    rolling = TIMESTAMP_TAG.search(text) is not None
+    segments = []
+    previous = None
+    for block in text.replace('\r\n', '\n').split('\n\n'):  # 只按真正的空行分块：自动字幕的换段行是单个空格
+        lines = block.strip('\n').split('\n')
+        timing = next((index for index, line in enumerate(lines) if '-->' in line), None)
+        if timing is None:
+            continue
+        start_text, end_text = lines[timing].split('-->', 1)
+        start, end = parse_time(start_text) / 1000, parse_time(end_text.split()[0]) / 1000
+        body = lines[timing + 1:]
+        if rolling:
+            body = [line for line in body if TIMESTAMP_TAG.search(line)]
+            entries = [(clean_text(line), line) for line in body]
+        else:
+            entries = [(clean_text(' '.join(body)), None)]
+        for plain, raw in entries:
+            if not plain or plain == previous:
+                continue
+            previous = plain
+            segment = {'start': start, 'end': end, 'text': ' ' + plain}
+            if raw is not None:
+                segment['words'] = parse_timed_line(raw, start, end)
+            segments.append(segment)
+    return fix_overlaps(segments)
+
+
+PARSERS = {'json3': parse_json3, 'vtt': parse_vtt}
+
+
+def select_tracks(info, formats=CAPTION_EXTS):
+    """按优先级列出可用的英文字幕轨道：人工字幕 > 自动字幕，json3 > vtt"""
+    original = info.get('language')
+    candidates = []
+    for kind, key, preferred in (('manual', 'subtitles', MANUAL_LANGUAGES),
+                                 ('automatic', 'automatic_captions', AUTOMATIC_LANGUAGES)):
+        if kind == 'automatic' and original and not is_english(original):
+            continue  # 非英语视频的英文自动字幕是机器翻译
+        tracks = info.get(key) or {}
+        languages = sorted((language for language in tracks if is_english(language)),
+                           key=lambda language: preferred.index(language) if language in preferred else len(preferred))
+        for language in languages:
+            by_ext = {track['ext']: track for track in tracks[language] if track.get('url')}
+            for ext in formats:
+                if ext in by_ext:
+                    candidates.append(dict(by_ext[ext], kind=kind, language=language))
+                    break
+    return candidates
+
+
+def fetch_track(track, timeout=30):
+    request = urllib.request.Request(track['url'], headers=track.get('http_headers') or {})
+    before_request(track['url'])  # 与视频下载共享主机级限速
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            data = response.read().decode('utf-8')
+    except Exception as e:
+        record_result(track['url'], e)
+        raise
+    record_result(track['url'])
+    return data
+
+
+def is_annotation(segment):
+    return ANNOTATION.match(segment['text'].strip()) is not None
+
+
+def clip_segments(segments, start=None, end=None):
+    """切片时只保留范围内的字幕，时间换算为切片内的时间"""
+    if start is None and end is None:
+        return segments
+    start = start or 0.0
+    clipped = []
+    for segment in segments:
+        if segment['end'] <= start or (end is not None and segment['start'] >= end):
+            continue
+        limit = (end - start) if end is not None else float('inf')
+        segment = dict(segment, start=max(0.0, segment['start'] - start), end=min(limit, segment['end'] - start))
+        if segment.get('words'):
+            segment['words'] = [dict(word, start=max(0.0, word['start'] - start), end=min(limit, word['end'] - start))
+                                for word in segment['words']
+                                if word['end'] > start and (end is None or word['start'] < end)]
+        clipped.append(segment)
+    return clipped
+
+
+def check_quality(segments, duration=None):
+    """返回 (是否可用, 原因)"""
+    if not segments:
+        return False, "字幕为空"
+    annotations = sum(1 for segment in segments if is_annotation(segment))
+    if annotations / len(segments) > MAX_ANNOTATION_SHARE:
+        return False, f"{annotations}/{len(segments)} 条是 [Music] 之类的标注"
+    if duration:
+        last_end = segments[-1]['end']
+        if last_end < duration * MIN_COVERAGE:
+            return False, f"字幕只覆盖到 {last_end:.0f}秒 / 视频 {duration:.0f}秒"
+        words = sum(len(segment['text'].split()) for segment in segments if not is_annotation(segment))
+        if words / (duration / 60) < MIN_WORDS_PER_MINUTE:
+            return False, f"字幕过于稀疏（每分钟 {words / (duration / 60):.0f} 词）"
+    return True, None
+
+
+def load_captions(info, start=None, end=None, fetch=fetch_track):
+    """返回 (片段, 轨道, 原因)：依次尝试各候选轨道，第一个通过质量检查的即采用；都不可用时片段为 None"""
+    candidates = select_tracks(info)
+    if not candidates:
+        return None, None, "没有英文字幕轨道"
+
+    if start is not None or end is not None:
+        duration = (end if end is not None else info.get('duration') or 0) - (start or 0)
+    else:
+        duration = info.get('duration')
+
+    reasons = []
+    for track in candidates:
+        label = f"{track['kind']}/{track['language']}.{track['ext']}"
+        try:
+            segments = clip_segments(PARSERS[track['ext']](fetch(track)), start, end)
+        except Exception as e:
+            reasons.append(f"{label}: 获取失败 {str(e)[:60]}")
+            continue
+        ok, reason = check_quality(segments, duration)
+        if not ok:
+            reasons.append(f"{label}: {reason}")
+            continue
+        return [segment for segment in segments if not is_annotation(segment)], track, None
+    return None, None, '; '.join(reasons)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='获取YouTube已有的英文字幕')
+    parser.add_argument('source', help='视频URL，或已下载的 .json3 / .vtt 字幕文件')
+    parser.add_argument('--start', default=None, help='切片开始时间')
+    parser.add_argument('--end', default=None, help='切片结束时间')
+    parser.add_argument('--srt', default=None, help='输出SRT文件')
+    args = parser.parse_args()
+
+    from segment_fetcher import parse_timestamp
+    from streaming_transcription import IncrementalSrtWriter
+
+    start, end = parse_timestamp(args.start), parse_timestamp(args.end)
+    if os.path.exists(args.source):
+        ext = os.path.splitext(args.source)[1].lstrip('.').lower()
+        if ext not in PARSERS:
+            parser.error(f"不支持的字幕格式: {ext}（可选: {', '.join(PARSERS)}）")
+        with open(args.source, 'r', encoding='utf-8') as f:
+            segments = clip_segments(PARSERS[ext](f.read()), start, end)
+        print(f"📝 {args.source}: {len(segments)} 条字幕")
+    else:
+        import yt_dlp
+
+        with yt_dlp.YoutubeDL({'quiet': True, 'no_warnings': True}) as ydl:
+            info = ydl.extract_info(args.source, download=False)
+        segments, track, reason = load_captions(info, start, end)
+        if segments is None:
+            print(f"❌ 没有可用的英文字幕: {reason}")
+            return
+        print(f"✅ 使用 {track['kind']} 字幕 {track['language']}.{track['ext']}: {len(segments)} 条")
+
+    if args.srt:
+        with IncrementalSrtWriter(args.srt) as writer:
+            for segment in segments:
+                writer.write(segment)
+        print(f"✅ 已写入: {args.srt}")
+
+
+if __name__ == "__main__":
+    main()